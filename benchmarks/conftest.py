@@ -0,0 +1,63 @@
+"""
+pytest-benchmark suite for the scan pipeline.
+
+    pip install pytest pytest-benchmark
+    python -m pytest benchmarks --benchmark-json=benchmarks/results/pytest-<commit>.json
+
+Model and end-to-end benchmarks use the image corpus in BENCH_CORPUS (default
+dataset_detection/images/test) and are skipped when it or the weights are
+missing; the pure-NumPy ones always run. Scans go to a throwaway test database.
+The training-data benchmarks compare loose files with the shards written by
+`python shard_dataset.py` and are skipped until those exist.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "treeid.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from detector.benchmarking import DEFAULT_CORPUS, load_corpus, stub_streetview  # noqa: E402
+from detector.backends import image_paths  # noqa: E402
+
+CORPUS = os.getenv("BENCH_CORPUS", str(ROOT / DEFAULT_CORPUS))
+CORPUS_SIZE = int(os.getenv("BENCH_CORPUS_SIZE", "20"))
+
+
+@pytest.fixture(scope="session")
+def corpus_dir():
+    if not os.path.isdir(CORPUS) or not image_paths(CORPUS, 1):
+        pytest.skip(f"no image corpus at {CORPUS}")
+    return CORPUS
+
+
+@pytest.fixture(scope="session")
+def corpus(corpus_dir):
+    return load_corpus(corpus_dir, CORPUS_SIZE)
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    yield
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+
+
+@pytest.fixture(scope="session")
+def streetview(corpus_dir, test_database):
+    with stub_streetview(corpus_dir) as server:
+        yield server
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pytest
+from django.conf import settings
+
+from detector.benchmarking import peak_rss_mb, run_scans, scan_body, summarize
+from detector.inference import decode_image, extract_detections
+from detector.profiles import get_profiles
+from detector.slicing import merge_boxes
+
+NAMES = {0: "Angsana", 1: "Coconut Palm", 2: "Rain Tree", 3: "Royal Palm"}
+PROFILES = sorted(get_profiles())
+
+
+def _synthetic_boxes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 600, size=(count, 2))
+    wh = rng.uniform(10, 120, size=(count, 2))
+    return np.column_stack([xy, xy + wh, rng.uniform(0.25, 1.0, count), rng.integers(0, 4, count)])
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = type("Boxes", (), {"data": data})()
+
+
+def _needs_weights(profile):
+    if not os.path.exists(profile.weights):
+        pytest.skip(f"weights missing: {profile.weights}")
+    pytest.importorskip("ultralytics")
+
+
+# --- Post-processing (no model needed) ---
+
+def test_serialize_detections(benchmark):
+    result = _Result(_synthetic_boxes(100).astype(np.float32))
+    detections, counts = benchmark(extract_detections, result, NAMES)
+    assert sum(counts.values()) == len(detections) == 100
+
+
+def test_slicing_merge(benchmark):
+    # 10 crops x 40 boxes, as a sliced frame produces
+    data = _synthetic_boxes(400, seed=1)
+    merged = benchmark(merge_boxes, data, 0.5, "nms")
+    assert 0 < len(merged) <= len(data)
+
+
+def test_decode(benchmark, corpus_dir):
+    with open(os.path.join(corpus_dir, sorted(os.listdir(corpus_dir))[0]), "rb") as f:
+        content = f.read()
+    image = benchmark(decode_image, content)
+    assert image.ndim == 3
+
+
+# --- Model only ---
+
+@pytest.mark.parametrize("profile_name", PROFILES)
+def test_model_throughput(benchmark, corpus, profile_name):
+    from detector.model_registry import get_model
+
+    profile = get_profiles()[profile_name]
+    _needs_weights(profile)
+    model = get_model(profile.weights)
+    params = profile.params()
+    model.predict(corpus[0], verbose=False, **params)
+
+    benchmark.pedantic(lambda: [model.predict(image, verbose=False, **params) for image in corpus],
+                       rounds=3, iterations=1)
+    benchmark.extra_info.update(
+        backend=settings.DETECTOR_BACKEND,
+        images_per_sec=len(corpus) / benchmark.stats.stats.mean,
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+# --- End to end (fake Street View -> Django -> model -> database) ---
+
+@pytest.mark.parametrize("profile_name", PROFILES)
+def test_scan_latency(benchmark, streetview, profile_name):
+    from django.test import Client
+
+    _needs_weights(get_profiles()[profile_name])
+    client = Client(SERVER_NAME="localhost")
+    counter = iter(range(10 ** 9))
+
+    def scan():
+        response = client.post("/streetview-scan/", scan_body(next(counter), profile_name),
+                               content_type="application/json")
+        assert response.status_code == 200
+
+    benchmark.pedantic(scan, rounds=30, iterations=1, warmup_rounds=2)
+    benchmark.extra_info["peak_rss_mb"] = peak_rss_mb()
+
+
+@pytest.mark.parametrize("clients", [1, 4, 8])
+def test_scan_throughput(benchmark, streetview, clients):
+    profile = get_profiles()[settings.DETECTOR_DEFAULT_PROFILE]
+    _needs_weights(profile)
+    outcome = {}
+
+    def burst():
+        outcome["latencies"], outcome["errors"], outcome["wall"] = run_scans(8 * clients, clients)
+
+    benchmark.pedantic(burst, rounds=1, iterations=1)
+    benchmark.extra_info.update(
+        summarize(outcome["latencies"]),
+        clients=clients,
+        errors=outcome["errors"],
+        throughput_rps=len(outcome["latencies"]) / outcome["wall"],
+        peak_rss_mb=peak_rss_mb(),
+    )
+    assert outcome["errors"] == 0
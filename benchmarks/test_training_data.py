@@ -0,0 +1,83 @@
+import os
+from itertools import cycle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import dataset_manifest
+import shard_dataset
+
+ROOT = Path(__file__).resolve().parent.parent
+SPLIT = os.getenv("BENCH_SHARD_SPLIT", "val")
+SAMPLES = 32
+
+
+@pytest.fixture(scope="module")
+def packed():
+    # Shard and manifest paths are relative to the repository root
+    previous = os.getcwd()
+    os.chdir(ROOT)
+    split_dir = os.path.join(shard_dataset.DEFAULT_OUT, SPLIT)
+    if not os.path.exists(os.path.join(split_dir, "index.npz")):
+        os.chdir(previous)
+        pytest.skip(f"no shards in {split_dir}; run `python shard_dataset.py` first")
+    yield split_dir, shard_dataset.load_index(split_dir)
+    os.chdir(previous)
+
+
+def _sample(index):
+    return np.random.default_rng(0).permutation(len(index["im_file"]))[:SAMPLES]
+
+
+# --- Reading training samples: loose JPEG + .txt vs. memory-mapped shards ---
+
+def test_read_loose(benchmark, packed):
+    _, index = packed
+    rows = cycle(_sample(index))
+    imgsz = int(index["imgsz"])
+
+    def read():
+        path = index["im_file"][next(rows)]
+        image, _ = shard_dataset.load_resized(path, imgsz)
+        dataset_manifest.parse_label_file(dataset_manifest.label_path_for(path))
+        return image
+
+    assert benchmark(read).shape[2] == 3
+
+
+def test_read_sharded(benchmark, packed):
+    split_dir, index = packed
+    rows = cycle(_sample(index))
+    shards = {}
+
+    def read():
+        i = next(rows)
+        shard = int(index["shard"][i])
+        if shard not in shards:
+            shards[shard] = np.load(shard_dataset.shard_path(split_dir, shard), mmap_mode="r")
+        h, w = index["shape"][i]
+        start = index["box_start"][i]
+        index["bboxes"][start:start + index["box_count"][i]].copy()
+        return np.ascontiguousarray(shards[shard][index["slot"][i], :h, :w])
+
+    assert benchmark(read).shape[2] == 3
+
+
+# --- Through the Ultralytics dataset (validation transforms) ---
+
+@pytest.mark.parametrize("sharded", [False, True], ids=["loose", "sharded"])
+def test_yolo_dataset_getitem(benchmark, packed, sharded):
+    pytest.importorskip("ultralytics")
+    from ultralytics.data.dataset import YOLODataset
+    from ultralytics.utils import DEFAULT_CFG
+
+    from sharded_dataset import ShardedYOLODataset
+
+    split_dir, index = packed
+    names = dataset_manifest.class_names()
+    kwargs = dict(img_path=os.path.join(dataset_manifest.DATASET_DIR, "images", SPLIT), imgsz=int(index["imgsz"]),
+                  augment=False, hyp=DEFAULT_CFG, data={"names": names, "nc": len(names), "channels": 3})
+    dataset = ShardedYOLODataset(shard_dir=split_dir, **kwargs) if sharded else YOLODataset(**kwargs)
+    rows = cycle(_sample(index) % len(dataset))
+    assert benchmark(lambda: dataset[next(rows)])["img"].shape[0] == 3
@@ -0,0 +1,267 @@
+"""
+A columnar manifest of the YOLO detection dataset.
+
+Every label file of every split is parsed once (in parallel across a process
+pool), together with the size from each image header, into flat numpy arrays
+saved as dataset_detection/manifest.npz:
+
+    images: image (path), label (path), split, width, height, image_mtime, label_mtime
+    boxes:  box_image (row in images), box_line, box_cls, box_xywh
+
+Re-running the build only re-parses images/labels whose mtime changed, so the
+count, validate and split scripts can rebuild it on every run and then answer
+their question with vectorized queries instead of re-reading every .txt file.
+
+    python dataset_manifest.py            # build/update and print class counts
+    python dataset_manifest.py --validate # also list bad label lines
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+from PIL import Image
+
+DATASET_DIR = "dataset_detection"
+MANIFEST_NAME = "manifest.npz"
+SPLITS = ("train", "val", "test")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# box_cls for lines that could not be parsed
+MALFORMED = -1
+
+# Below this many changed files the pool's start-up costs more than it saves
+_POOL_MIN_FILES = 64
+
+
+def class_names(dataset_dir=DATASET_DIR):
+    with open(os.path.join(dataset_dir, "data.yaml")) as f:
+        names = yaml.safe_load(f)["names"]
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    return list(names)
+
+
+def label_path_for(image_path):
+    """dataset/images/<split>/x.jpg -> dataset/labels/<split>/x.txt"""
+    image_path = Path(image_path)
+    split_dir = image_path.parent
+    return split_dir.parent.parent / "labels" / split_dir.name / (image_path.stem + ".txt")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def parse_label_file(path):
+    """(line numbers, class ids, xywh) of a YOLO label file; bad lines get class MALFORMED."""
+    lines, classes, boxes = [], [], []
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except FileNotFoundError:
+        text = ""
+    for number, line in enumerate(text.splitlines(), start=1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            cls = int(parts[0])
+            xywh = [float(v) for v in parts[1:5]]
+        except ValueError:
+            cls, xywh = MALFORMED, []
+        if len(xywh) != 4:
+            cls, xywh = MALFORMED, [np.nan] * 4
+        lines.append(number)
+        classes.append(cls)
+        boxes.append(xywh)
+    return (np.asarray(lines, dtype=np.int32), np.asarray(classes, dtype=np.int32),
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+
+
+def _parse_one(task):
+    image_path, label_path = task
+    try:
+        with Image.open(image_path) as image:  # reads the header only
+            width, height = image.size
+    except (OSError, ValueError):
+        width, height = 0, 0
+    return (width, height, _mtime(image_path), _mtime(label_path)) + parse_label_file(label_path)
+
+
+def scan_images(dataset_dir=DATASET_DIR, splits=SPLITS):
+    """(image path, split) of every image on disk, in a stable order."""
+    found = []
+    for split in splits:
+        image_dir = Path(dataset_dir) / "images" / split
+        if image_dir.is_dir():
+            paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            found.extend((str(p), split) for p in paths)
+    return found
+
+
+class Manifest:
+    """Column arrays of images and boxes, plus a few vectorized queries."""
+
+    def __init__(self, columns, names=None):
+        self.columns = columns
+        self.names = names or []
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.image)
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls({
+            "image": np.array([], dtype=str), "label": np.array([], dtype=str),
+            "split": np.array([], dtype=str),
+            "width": np.zeros(0, np.int32), "height": np.zeros(0, np.int32),
+            "image_mtime": np.zeros(0, np.int64), "label_mtime": np.zeros(0, np.int64),
+            "box_image": np.zeros(0, np.int32), "box_line": np.zeros(0, np.int32),
+            "box_cls": np.zeros(0, np.int32), "box_xywh": np.zeros((0, 4), np.float32),
+        }, names)
+
+    @classmethod
+    def load(cls, path, names=None):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files}, names)
+
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, **self.columns)
+        os.replace(tmp, path)
+
+    def image_mask(self, split=None):
+        return np.ones(len(self), bool) if split is None else self.split == split
+
+    def box_mask(self, split=None, valid_only=True):
+        mask = self.image_mask(split)[self.box_image]
+        if valid_only:
+            mask &= self.valid_boxes()
+        return mask
+
+    def valid_boxes(self):
+        cls, xywh = self.box_cls, self.box_xywh
+        in_range = np.all((xywh >= 0.0) & (xywh <= 1.0), axis=1) & np.all(xywh[:, 2:] > 0.0, axis=1)
+        return (cls >= 0) & (cls < len(self.names)) & in_range
+
+    def instance_counts(self, split=None):
+        """Boxes per class name."""
+        counts = np.bincount(self.box_cls[self.box_mask(split)], minlength=len(self.names))
+        return dict(zip(self.names, counts.tolist()))
+
+    def image_class_matrix(self, split=None):
+        """(images, classes) box counts; rows follow the manifest order."""
+        mask = self.box_mask(None)
+        matrix = np.zeros((len(self), len(self.names)), np.int32)
+        np.add.at(matrix, (self.box_image[mask], self.box_cls[mask]), 1)
+        return matrix[self.image_mask(split)] if split is not None else matrix
+
+    def images_with_class(self, cls, split=None):
+        """Image paths in `split` with at least one box of class id `cls`."""
+        mask = self.box_mask(split) & (self.box_cls == cls)
+        return self.image[np.unique(self.box_image[mask])].tolist()
+
+    def problems(self, split=None):
+        """(label path, line, reason) for every bad box, plus images that could not be read."""
+        found = []
+        cls, xywh = self.box_cls, self.box_xywh
+        in_split = self.box_mask(split, valid_only=False)
+        reasons = [
+            (cls == MALFORMED, "malformed line"),
+            ((cls >= len(self.names)) | (cls < MALFORMED), "invalid class index"),
+            ((cls >= 0) & ~np.all((xywh >= 0.0) & (xywh <= 1.0), axis=1), "coordinates outside 0-1"),
+            ((cls >= 0) & np.any(xywh[:, 2:] <= 0.0, axis=1), "zero-sized box"),
+        ]
+        for mask, reason in reasons:
+            for i in np.flatnonzero(mask & in_split):
+                detail = reason if cls[i] == MALFORMED else f"{reason} (class {int(cls[i])})"
+                found.append((self.label[self.box_image[i]], int(self.box_line[i]), detail))
+        for i in np.flatnonzero((self.width == 0) & self.image_mask(split)):
+            found.append((self.image[i], 0, "unreadable image"))
+        return sorted(found)
+
+
+def build(dataset_dir=DATASET_DIR, path=None, workers=None, verbose=False):
+    """Builds or incrementally updates the manifest and returns it."""
+    names = class_names(dataset_dir)
+    path = path or os.path.join(dataset_dir, MANIFEST_NAME)
+    previous = Manifest.load(path, names) if os.path.exists(path) else Manifest.empty(names)
+    known = {image: i for i, image in enumerate(previous.image.tolist())}
+    box_starts = np.searchsorted(previous.box_image, np.arange(len(previous) + 1))
+
+    images = scan_images(dataset_dir)
+    labels = [str(label_path_for(image)) for image, _ in images]
+    rows, pending = [None] * len(images), []
+    for row, ((image, split), label) in enumerate(zip(images, labels)):
+        i = known.get(image)
+        if (i is not None and previous.label[i] == label
+                and previous.image_mtime[i] == _mtime(image) and previous.label_mtime[i] == _mtime(label)):
+            start, stop = box_starts[i], box_starts[i + 1]
+            rows[row] = (int(previous.width[i]), int(previous.height[i]), int(previous.image_mtime[i]),
+                         int(previous.label_mtime[i]), previous.box_line[start:stop],
+                         previous.box_cls[start:stop], previous.box_xywh[start:stop])
+        else:
+            pending.append(row)
+
+    tasks = [(images[row][0], labels[row]) for row in pending]
+    if len(tasks) >= _POOL_MIN_FILES:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse_one, tasks, chunksize=64))
+    else:
+        parsed = [_parse_one(task) for task in tasks]
+    for row, result in zip(pending, parsed):
+        rows[row] = result
+    if verbose:
+        print(f"🗂️ {len(images)} images, {len(pending)} new or changed label/image files parsed")
+
+    manifest = Manifest.empty(names)
+    if images:
+        widths, heights, image_mtimes, label_mtimes, lines, classes, boxes = zip(*rows)
+        manifest.columns.update({
+            "image": np.array([image for image, _ in images]),
+            "label": np.array(labels),
+            "split": np.array([split for _, split in images]),
+            "width": np.array(widths, np.int32), "height": np.array(heights, np.int32),
+            "image_mtime": np.array(image_mtimes, np.int64), "label_mtime": np.array(label_mtimes, np.int64),
+            "box_image": np.repeat(np.arange(len(images), dtype=np.int32), [len(c) for c in classes]),
+            "box_line": np.concatenate(lines).astype(np.int32),
+            "box_cls": np.concatenate(classes).astype(np.int32),
+            "box_xywh": np.concatenate(boxes).astype(np.float32).reshape(-1, 4),
+        })
+    manifest.save(path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_DIR)
+    parser.add_argument("--workers", type=int, help="Parser processes (default: one per CPU)")
+    parser.add_argument("--validate", action="store_true", help="List malformed or out-of-range label lines")
+    args = parser.parse_args()
+
+    manifest = build(args.dataset, workers=args.workers, verbose=True)
+    for split in SPLITS:
+        count = int(manifest.image_mask(split).sum())
+        if count:
+            print(f"📊 {split}: {count} images, instances per class: {manifest.instance_counts(split)}")
+    if args.validate:
+        problems = manifest.problems()
+        for path, line, reason in problems:
+            print(f"❌ {path}, line {line}: {reason}")
+        print(f"{'✅ No' if not problems else len(problems)} label problems found")
+
+
+if __name__ == "__main__":
+    main()
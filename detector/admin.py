@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Detection, Scan, Tree
+
+
+class DetectionInline(admin.TabularInline):
+    model = Detection
+    extra = 0
+
+
+@admin.register(Scan)
+class ScanAdmin(admin.ModelAdmin):
+    list_display = ("timestamp", "latitude", "longitude", "total_trees")
+    list_filter = ("timestamp",)
+    inlines = [DetectionInline]
+
+
+@admin.register(Tree)
+class TreeAdmin(admin.ModelAdmin):
+    list_display = ("species", "latitude", "longitude", "observations", "last_seen")
+    list_filter = ("species",)
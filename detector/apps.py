@@ -1,6 +1,25 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class DetectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'detector'
+
+    def ready(self):
+        # Opt-in startup hook for web workers; manage.py commands and tests
+        # leave it off so they never load YOLOv10x.
+        if settings.DETECTOR_PRELOAD:
+            from .model_registry import preload
+            from .profiles import get_profile
+            # The default tier and the one scans degrade to under load
+            for name in {settings.DETECTOR_DEFAULT_PROFILE, settings.DETECTOR_FALLBACK_PROFILE}:
+                profile = get_profile(name)
+                if profile.available():
+                    preload(profile.weights)
+                else:
+                    logger.warning("Not preloading the %r profile: %s not found", name, profile.weights)
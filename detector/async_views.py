@@ -0,0 +1,110 @@
+"""
+Async versions of the scan/save API, for ASGI deployments (treeid/asgi.py).
+
+The event loop only coordinates: the image fetch runs on a thread, CPU work
+(decode, inference, post-processing) goes to a dedicated pool sized to the CPU
+cores, and batched inference is awaited without holding any thread. One
+process, holding one copy of YOLOv10x, can then serve many concurrent scanners.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .inference import decode_image
+from .metrics import stage
+from .scanning import (
+    ScanError, fetch_image, finish_panorama, finish_scan, lookup_cached, parse_pose, parse_scan_request,
+    postprocess, predict, run_panorama, save_for_training, submit_batched,
+)
+from .views import scan_error_response
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool():
+    """Process-wide pool for CPU-bound scan steps (DETECTOR_INFERENCE_WORKERS threads)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.DETECTOR_INFERENCE_WORKERS, thread_name_prefix="detector-inference"
+                )
+    return _pool
+
+
+async def run_in_pool(fn, *args):
+    # Carry the request's context (request ID, stage timings) into the pool thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_inference_pool(), context.run, fn, *args)
+
+
+async def detect(content, annotate, profile, slicing=False):
+    """Async counterpart of scanning.run_detection()."""
+    cache_key, outcome = await run_in_pool(lookup_cached, content, annotate, profile, slicing)
+    if outcome is not None:
+        return outcome
+
+    image = await run_in_pool(decode_image, content)
+    with stage("predict"):
+        if settings.DETECTOR_BATCHING and not slicing:
+            future = submit_batched(image, profile)
+            try:
+                # Shielded: a timeout or disconnect must not cancel the scheduler's future from
+                # the loop; it is cancelled below, which only drops it if it is still queued
+                results = [await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), timeout=settings.DETECTOR_PREDICT_TIMEOUT
+                )]
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                future.cancel()
+                raise
+        else:
+            results = await run_in_pool(predict, image, profile, slicing)
+    return await run_in_pool(postprocess, results, cache_key, annotate, profile)
+
+
+@csrf_exempt
+async def streetview_save(request):
+    """Async variant of views.streetview_save."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Only POST method is allowed"}, status=405)
+
+    try:
+        data = parse_pose(request.body, require_label=True)
+        content = await asyncio.to_thread(fetch_image, data)
+        filepath, duplicates = await asyncio.to_thread(save_for_training, data, content)
+    except ScanError as e:
+        return scan_error_response(e)
+
+    return JsonResponse({"message": "Saved", "filename": filepath, "near_duplicates": duplicates})
+
+
+@csrf_exempt
+async def streetview_scan(request):
+    """Async variant of views.streetview_scan."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Only POST method is allowed"}, status=405)
+
+    try:
+        data = parse_scan_request(request.body)
+        if data["mode"] == "panorama":
+            # Concurrent fetches + one batch; blocks a pool thread, not the loop
+            view_headings, outcomes, errors = await run_in_pool(run_panorama, data)
+            payload = await sync_to_async(finish_panorama)(data, view_headings, outcomes, errors)
+            return JsonResponse(payload)
+        content = await asyncio.to_thread(fetch_image, data)
+        outcome = await detect(content, data["annotate"], data["profile"], data["slicing"])
+    except ScanError as e:
+        return scan_error_response(e)
+    except asyncio.TimeoutError:
+        return JsonResponse({"error": "Inference timed out"}, status=504)
+
+    payload = await sync_to_async(finish_scan)(data, outcome)
+    return JsonResponse(payload)
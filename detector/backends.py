@@ -0,0 +1,240 @@
+"""
+Inference backends for the detector.
+
+The PyTorch `best.pt` is the source of truth; ONNX (ONNX Runtime), OpenVINO
+and TorchScript exports of it sit next to it and are selected with the
+DETECTOR_BACKEND setting (DETECTOR_INT8 picks the quantized export). Ultralytics
+loads every format through the same YOLO() interface, so the rest of the
+pipeline doesn't change. Weights without that export (say, one profile's) keep
+running on PyTorch, and test-time augmentation is only applied on PyTorch.
+
+Exports are checked against the PyTorch model before use: detections are
+matched per image by class and IoU, and the match rate and confidence drift
+must stay within tolerance (see `manage.py export_detector`).
+"""
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .inference import result_arrays
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("pytorch", "onnx", "openvino", "torchscript")
+
+_warned = set()  # missing exports / ignored TTA already logged by this process
+
+
+def _warn_once(key, message, *args):
+    if key not in _warned:
+        _warned.add(key)
+        logger.warning(message, *args)
+
+
+def exported_path(pt_path, backend, int8=False):
+    """Where ultralytics (or our ONNX quantizer) writes the export of `pt_path`."""
+    pt_path = Path(pt_path)
+    stem = pt_path.with_suffix("")
+    if backend == "pytorch":
+        return pt_path
+    if backend == "onnx":
+        return Path(f"{stem}_int8.onnx") if int8 else pt_path.with_suffix(".onnx")
+    if backend == "openvino":
+        return Path(f"{stem}_int8_openvino_model") if int8 else Path(f"{stem}_openvino_model")
+    if backend == "torchscript":
+        return pt_path.with_suffix(".torchscript")
+    raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def resolve_weights(weights=None, backend=None, int8=None):
+    """The file/directory the registry should load for `weights` on `backend`.
+
+    Falls back to the PyTorch weights (with a warning) when that export of
+    them doesn't exist, e.g. a profile whose weights were never exported.
+    """
+    weights = Path(weights or settings.DETECTOR_WEIGHTS)
+    if weights.suffix != ".pt":
+        return str(weights)  # already an exported model
+    backend = backend or settings.DETECTOR_BACKEND
+    int8 = settings.DETECTOR_INT8 if int8 is None else int8
+    exported = exported_path(weights, backend, int8=int8)
+    if backend != "pytorch" and not exported.exists():
+        _warn_once(("missing", str(exported)), "%s not found; using %s (create it with "
+                   "`manage.py export_detector --format %s`)", exported, weights, backend)
+        return str(weights)
+    return str(exported)
+
+
+def weights_exist(weights=None):
+    """Whether the file/directory `weights` resolves to on this backend is on disk."""
+    return Path(resolve_weights(weights)).exists()
+
+
+def supports_augment(weights=None):
+    """Test-time augmentation only runs on the PyTorch model; exported backends ignore it."""
+    resolved = resolve_weights(weights)
+    if resolved.endswith(".pt"):
+        return True
+    _warn_once(("augment", resolved), "%s is not a PyTorch model; test-time augmentation is off for it", resolved)
+    return False
+
+
+# --- Export ---
+
+def image_paths(directory, limit=None):
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    return paths[:limit] if limit else paths
+
+
+def load_images(paths):
+    """BGR arrays, as the model expects them."""
+    from PIL import Image
+
+    return [np.ascontiguousarray(np.asarray(Image.open(p).convert("RGB"))[:, :, ::-1]) for p in paths]
+
+
+def export(pt_path, backend, imgsz=640, int8=False, data=None, calib_dir=None, calib_images=100):
+    """Exports `pt_path` to `backend` and returns the path of the export."""
+    from ultralytics import YOLO
+
+    if backend == "pytorch":
+        return Path(pt_path)
+    model = YOLO(str(pt_path))
+
+    if backend == "onnx":
+        onnx_path = Path(model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+        if not int8:
+            return onnx_path
+        calib = image_paths(calib_dir, calib_images)
+        if not calib:
+            raise ValueError(f"No calibration images found in {calib_dir}")
+        return quantize_onnx(onnx_path, exported_path(pt_path, "onnx", int8=True), calib, imgsz)
+
+    if backend == "openvino":
+        # NNCF calibrates on the `val` split of the data.yaml
+        return Path(model.export(format="openvino", imgsz=imgsz, int8=int8, data=data))
+
+    if backend == "torchscript":
+        if int8:
+            raise ValueError("INT8 is only available for the onnx and openvino backends")
+        return Path(model.export(format="torchscript", imgsz=imgsz))
+
+    raise ValueError(f"Unknown backend {backend!r}")
+
+
+def quantize_onnx(onnx_path, output_path, calib_paths, imgsz=640):
+    """Static INT8 quantization (QDQ) with activations calibrated on real frames."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from ultralytics.data.augment import LetterBox
+
+    letterbox = LetterBox((imgsz, imgsz), auto=False)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            import onnxruntime
+
+            session = onnxruntime.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+            self.input_name = session.get_inputs()[0].name
+            self.paths = iter(calib_paths)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            image = letterbox(image=load_images([path])[0])
+            tensor = image[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            return {self.input_name: np.ascontiguousarray(tensor)}
+
+    quantize_static(
+        str(onnx_path), str(output_path), FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        # Only the heavy ops; the end-to-end top-k head stays in float
+        op_types_to_quantize=["Conv", "MatMul"],
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    # Keep the ultralytics metadata (class names, stride, imgsz) on the quantized model
+    source, quantized = onnx.load(str(onnx_path)), onnx.load(str(output_path))
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, str(output_path))
+    return Path(output_path)
+
+
+# --- Parity and throughput ---
+
+def box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def match_results(reference, candidate, iou_threshold=0.5):
+    """Greedy same-class IoU matching of one image's detections.
+
+    Returns (reference boxes, candidate boxes, matched pairs, [conf diffs], [ious]).
+    """
+    ref_xyxy, ref_conf, ref_cls = result_arrays(reference)
+    cand_xyxy, cand_conf, cand_cls = result_arrays(candidate)
+    used = np.zeros(len(cand_xyxy), dtype=bool)
+    conf_diffs, ious = [], []
+    for i in np.argsort(-ref_conf):
+        if not len(cand_xyxy):
+            break
+        overlap = box_iou(ref_xyxy[i], cand_xyxy)
+        overlap[(cand_cls != ref_cls[i]) | used] = 0.0
+        j = int(np.argmax(overlap))
+        if overlap[j] >= iou_threshold:
+            used[j] = True
+            conf_diffs.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+            ious.append(float(overlap[j]))
+    return len(ref_xyxy), len(cand_xyxy), len(ious), conf_diffs, ious
+
+
+def parity_report(reference_model, candidate_model, images, conf=0.25, imgsz=640):
+    """Compares a candidate backend against the PyTorch reference on `images`."""
+    ref_total = cand_total = matched = 0
+    conf_diffs, ious = [], []
+    for image in images:
+        ref = reference_model.predict(image, conf=conf, imgsz=imgsz, verbose=False)[0]
+        cand = candidate_model.predict(image, conf=conf, imgsz=imgsz, verbose=False)[0]
+        n_ref, n_cand, n_match, diffs, overlaps = match_results(ref, cand)
+        ref_total += n_ref
+        cand_total += n_cand
+        matched += n_match
+        conf_diffs += diffs
+        ious += overlaps
+    return {
+        "images": len(images),
+        "reference_boxes": ref_total,
+        "candidate_boxes": cand_total,
+        # Share of reference boxes found by the candidate, and vice versa
+        "recall": matched / ref_total if ref_total else 1.0,
+        "precision": matched / cand_total if cand_total else 1.0,
+        "max_conf_diff": max(conf_diffs) if conf_diffs else 0.0,
+        "mean_conf_diff": float(np.mean(conf_diffs)) if conf_diffs else 0.0,
+        "mean_iou": float(np.mean(ious)) if ious else 1.0,
+    }
+
+
+def throughput(model, images, warmup=2, **params):
+    """Images per second for single-image predict calls (after warm-up)."""
+    params.setdefault("verbose", False)
+    for image in images[:warmup]:
+        model.predict(image, **params)
+    start = time.perf_counter()
+    for image in images:
+        model.predict(image, **params)
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed if elapsed > 0 else float("inf")
@@ -0,0 +1,207 @@
+"""
+Dynamic micro-batching for scan inference.
+
+Concurrent requests drop their decoded image into a bounded queue. A single
+worker thread per process collects them into batches (up to
+DETECTOR_BATCH_MAX_SIZE images, or whatever arrived within
+DETECTOR_BATCH_MAX_WAIT_MS of the oldest one), runs one batched
+`model.predict`, and hands each request its own result through a Future.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .model_registry import get_model
+
+logger = logging.getLogger(__name__)
+
+_EWMA_ALPHA = 0.2  # weight of the newest queue wait in the smoothed estimate
+
+
+class QueueFull(Exception):
+    """Raised when the inference queue is at capacity (surfaced as HTTP 429)."""
+
+
+class _Item:
+    __slots__ = ("image", "key", "future", "enqueued")
+
+    def __init__(self, image, key):
+        self.image = image
+        self.key = key
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class BatchScheduler:
+    def __init__(self, max_batch_size=8, max_wait_ms=20, max_queue=64):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.max_queue = int(max_queue)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._submitted = 0
+        self._rejected = 0
+        self._batches = 0
+        self._images = 0
+        self._failures = 0
+        self._batch_sizes = Counter()
+        self._wait_seconds_total = 0.0
+        self._predict_seconds_total = 0.0
+        self._last_wait_seconds = 0.0
+        self._wait_ewma_seconds = 0.0  # smoothed queue wait, drives profile degrading
+
+    # --- Public API ---
+
+    def submit(self, image, weights=None, **params):
+        """Queues one image; returns a Future resolving to its YOLO result."""
+        self._ensure_started()
+        item = _Item(image, (weights, tuple(sorted(params.items()))))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._metrics_lock:
+                self._rejected += 1
+            raise QueueFull(f"Inference queue is full ({self.max_queue} pending)")
+        with self._metrics_lock:
+            self._submitted += 1
+        return item.future
+
+    def predict(self, image, weights=None, timeout=None, **params):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(image, weights=weights, **params).result(timeout=timeout)
+
+    def queue_latency_ms(self):
+        """Current queue wait estimate: the smoothed wait of recent batches, or how
+        long the oldest pending image has already waited if that is longer."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0].enqueued if self._queue.queue else None
+        with self._metrics_lock:
+            wait = self._wait_ewma_seconds
+        if oldest is not None:
+            wait = max(wait, time.perf_counter() - oldest)
+        return 1000.0 * wait
+
+    def metrics(self):
+        with self._metrics_lock:
+            batches = self._batches
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "failures": self._failures,
+                "batches": batches,
+                "images": self._images,
+                "avg_batch_size": self._images / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": 1000.0 * self._wait_seconds_total / self._images if self._images else 0.0,
+                "last_queue_wait_ms": 1000.0 * self._last_wait_seconds,
+                "ewma_queue_wait_ms": 1000.0 * self._wait_ewma_seconds,
+                "avg_batch_predict_ms": 1000.0 * self._predict_seconds_total / batches if batches else 0.0,
+            }
+
+    # --- Worker ---
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    logger.error("Batch worker thread died; starting a new one")
+                self._thread = threading.Thread(target=self._run, name="detector-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            # Callers that gave up (timeout, disconnect) cancelled their future while it was queued
+            batch = [item for item in self._collect() if item.future.set_running_or_notify_cancel()]
+            # One predict call per distinct (weights, params) combination
+            groups = {}
+            for item in batch:
+                groups.setdefault(item.key, []).append(item)
+            for items in groups.values():
+                try:
+                    self._run_batch(items)
+                except Exception:
+                    logger.exception("Batch worker failed on %d image(s)", len(items))
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, items):
+        weights, params = items[0].key
+        started = time.perf_counter()
+        try:
+            model = get_model(weights)
+            results = model.predict([item.image for item in items], verbose=False, **dict(params))
+        except Exception as e:
+            logger.exception("Batched inference failed for %d image(s)", len(items))
+            with self._metrics_lock:
+                self._failures += len(items)
+            for item in items:
+                _deliver(item.future.set_exception, e)
+            return
+
+        finished = time.perf_counter()
+        waits = [started - item.enqueued for item in items]
+        with self._metrics_lock:
+            self._batches += 1
+            self._images += len(items)
+            self._batch_sizes[len(items)] += 1
+            self._wait_seconds_total += sum(waits)
+            self._last_wait_seconds = waits[-1]
+            for wait in waits:
+                self._wait_ewma_seconds += _EWMA_ALPHA * (wait - self._wait_ewma_seconds)
+            self._predict_seconds_total += finished - started
+
+        for item, result in zip(items, results):
+            _deliver(item.future.set_result, result)
+
+
+def _deliver(resolve, value):
+    """Resolves one caller's future; a future that can no longer take a value must not stop the worker."""
+    try:
+        resolve(value)
+    except Exception:
+        logger.exception("Could not deliver a batched inference result")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns this process's scheduler, built from the DETECTOR_BATCH_* settings."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BatchScheduler(
+                    max_batch_size=settings.DETECTOR_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.DETECTOR_BATCH_MAX_WAIT_MS,
+                    max_queue=settings.DETECTOR_QUEUE_DEPTH,
+                )
+    return _scheduler
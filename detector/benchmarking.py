@@ -0,0 +1,201 @@
+"""
+Benchmark harness shared by `manage.py benchmark` and the pytest-benchmark
+suite in benchmarks/.
+
+Scans run against a fixed local image corpus served by the fake Street View
+server, with the image and detection caches off so every request pays for the
+fetch, the model and the database write. Reports are plain JSON (tagged with
+the git commit) so runs can be compared across commits.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.test.utils import override_settings
+
+from .backends import BACKENDS, exported_path, image_paths, load_images, throughput
+from .fake_streetview import start_server
+
+DEFAULT_CORPUS = os.path.join("dataset_detection", "images", "test")
+
+# Benchmark scans are logged out in the open Pacific, away from any surveyed
+# street, and removed again afterwards (see scratch_inventory)
+BENCH_ORIGIN = (-10.0, -140.0)
+
+
+def summarize(seconds):
+    """Latency percentiles (ms) of a list of durations in seconds."""
+    if not len(seconds):
+        return {"count": 0}
+    ms = 1000.0 * np.asarray(seconds)
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+@contextmanager
+def scratch_inventory(origin=BENCH_ORIGIN, radius_deg=0.5):
+    """Deletes the scans and trees that the benchmark logged.
+
+    Only rows created while the block ran *and* within `radius_deg` of `origin`
+    go, so scans that real clients log meanwhile are kept.
+    """
+    from .models import Scan, Tree
+
+    lat, lng = origin
+    near = {"latitude__range": (lat - radius_deg, lat + radius_deg),
+            "longitude__range": (lng - radius_deg, lng + radius_deg)}
+    last_scan = Scan.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    last_tree = Tree.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    try:
+        yield
+    finally:
+        Scan.objects.filter(id__gt=last_scan, **near).delete()
+        Tree.objects.filter(id__gt=last_tree, **near).delete()
+
+
+@contextmanager
+def stub_streetview(image_dir=None, **behaviour):
+    """Fake Street View server over `image_dir`, with the imagery/detection caches off.
+
+    `behaviour` (latency_ms, errors, ...) is passed on to the fake server."""
+    server = start_server(image_dir=image_dir, **behaviour)
+    try:
+        with override_settings(STREETVIEW_API_URL=server.base_url, STREETVIEW_CACHE_ENABLED=False,
+                               DETECTION_CACHE_ENABLED=False, STREETVIEW_RATE_LIMIT=1e6):
+            yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def scan_body(i, profile=None, annotate="none"):
+    """A distinct pose per request, so the fake server cycles through the corpus."""
+    lat, lng = BENCH_ORIGIN
+    body = {"lat": lat + i * 1e-4, "lng": lng, "heading": (i * 37) % 360, "pitch": 0, "fov": 90,
+            "annotate": annotate}
+    if profile:
+        body["profile"] = profile
+    return json.dumps(body)
+
+
+def run_scans(count, clients=1, profile=None, path="/streetview-scan/"):
+    """POSTs `count` scans from `clients` concurrent threads through the Django stack.
+
+    Returns (latencies in seconds, error count, wall-clock seconds).
+    """
+    from django.test import Client
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = Client(SERVER_NAME="localhost")
+        start = time.perf_counter()
+        response = local.client.post(path, scan_body(i, profile), content_type="application/json")
+        elapsed = time.perf_counter() - start
+        with lock:
+            (latencies if response.status_code == 200 else errors).append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(count)))
+    return latencies, len(errors), time.perf_counter() - started
+
+
+def bench_end_to_end(requests_count, client_counts, profile=None):
+    """Scan latency percentiles and throughput at each concurrency level."""
+    results = {}
+    for clients in client_counts:
+        latencies, errors, wall = run_scans(requests_count, clients, profile)
+        results[str(clients)] = dict(summarize(latencies), errors=errors,
+                                     throughput_rps=len(latencies) / wall if wall else 0.0)
+    return results
+
+
+def available_backends(weights):
+    """Backends that have an export of `weights` on disk (pytorch always)."""
+    found = []
+    for backend in BACKENDS:
+        for int8 in (False, True):
+            if backend == "pytorch" and int8:
+                continue
+            if os.path.exists(exported_path(weights, backend, int8=int8)):
+                found.append((backend, int8))
+    return found
+
+
+def bench_models(images, profiles, backends=None):
+    """Model-only images/sec for every profile x available backend."""
+    from ultralytics import YOLO
+
+    results = {}
+    for profile in profiles:
+        for backend, int8 in available_backends(profile.weights):
+            if backends and backend not in backends:
+                continue
+            model = YOLO(str(exported_path(profile.weights, backend, int8=int8)), task="detect")
+            name = f"{profile.name}/{backend}{'-int8' if int8 else ''}"
+            results[name] = {"images_per_sec": throughput(model, images, **profile.params())}
+    return results
+
+
+def load_corpus(image_dir=DEFAULT_CORPUS, limit=None):
+    return load_images(image_paths(image_dir, limit))
+
+
+def compare(report, baseline):
+    """Relative change of the headline numbers against a previous report."""
+    changes = {}
+    for clients, current in report.get("end_to_end", {}).items():
+        previous = baseline.get("end_to_end", {}).get(clients)
+        if previous and previous.get("count") and current.get("count"):
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                changes[f"end_to_end[{clients}].{key}"] = current[key] / previous[key] - 1.0
+    for name, current in report.get("models", {}).items():
+        previous = baseline.get("models", {}).get(name)
+        if previous:
+            changes[f"models[{name}].images_per_sec"] = current["images_per_sec"] / previous["images_per_sec"] - 1.0
+    return changes
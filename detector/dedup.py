@@ -0,0 +1,378 @@
+"""
+Near-duplicate detection for collected and training frames.
+
+Each image gets two 64-bit perceptual hashes: a pHash (signs of the low
+frequencies of a 32x32 DCT) and a dHash (signs of horizontal gradients of a
+9x8 thumbnail). Two frames are near-duplicates when both hashes are within
+DEDUP_MAX_DISTANCE bits. Lookups go through a BK-tree over the pHash, which
+only visits the branches that can hold a hash within the radius.
+
+A HashIndex keeps the path, mtime and both hashes of every image in a
+directory tree as four numpy columns (an .npz next to the images), and only
+hashes files that are new or changed since the last sync.
+
+The collected frames (dataset_collection/) are indexed in the CollectedImage
+table instead, so every worker process sees the frames the others saved:
+each process keeps a HashIndex in memory and catches up on new rows before
+every lookup.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * k * (2 * np.arange(n)[None, :] + 1) / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+_BITS = 1 << np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def _pack(bits):
+    return int(np.bitwise_or.reduce(_BITS[bits.ravel()]) if bits.any() else 0)
+
+
+def phash(image):
+    """64-bit DCT hash of a PIL image."""
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    # The DC term only says how bright the frame is, so leave it out of the median
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def dhash(image):
+    """64-bit gradient hash of a PIL image."""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_hashes(source):
+    """(phash, dhash) of image bytes or an image file path."""
+    with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as image:
+        image.draft("L", (64, 64))  # JPEGs decode at a fraction of full size
+        return phash(image), dhash(image)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes under Hamming distance."""
+
+    def __init__(self):
+        self._root = None  # [hash, item, {distance: child}]
+
+    def add(self, value, item):
+        node = [value, item, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, radius):
+        """[(distance, item)] for every hash within `radius` bits of `value`."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, item))
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda match: match[0])
+
+
+def _hash_file(path):
+    try:
+        return image_hashes(path)
+    except (OSError, ValueError):
+        return None
+
+
+def hash_files(paths, workers=None, processes=False):
+    """[(phash, dhash) or None] for each path, hashed in parallel."""
+    if not paths:
+        return []
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        return list(executor.map(_hash_file, paths, chunksize=32 if processes else 1))
+
+
+def image_files(root):
+    """Every image under `root`, sorted."""
+    return sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+class HashIndex:
+    """Paths, mtimes and hashes of a set of images, with near-duplicate lookup."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rows = {}  # image path -> (mtime_ns, phash, dhash)
+        self._tree = None
+        self._tree_items = set()
+        if path and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                for image, mtime, p, d in zip(data["path"].tolist(), data["mtime"].tolist(),
+                                              data["phash"].tolist(), data["dhash"].tolist()):
+                    self._rows[image] = (mtime, p, d)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def sync(self, paths, workers=None, processes=False):
+        """Hashes new or changed `paths` and forgets images that are not in `paths`; returns how many were hashed."""
+        stamps = {}
+        for image in paths:
+            try:
+                stamps[image] = os.stat(image).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            stale = [image for image, mtime in stamps.items()
+                     if image not in self._rows or self._rows[image][0] != mtime]
+        hashes = hash_files(stale, workers, processes)
+        with self._lock:
+            self._rows = {image: row for image, row in self._rows.items() if image in stamps}
+            for image, value in zip(stale, hashes):
+                if value is not None:
+                    self._rows[image] = (stamps[image],) + value
+            self._tree = None
+        return len(stale)
+
+    def hashes(self, image):
+        """(phash, dhash) of an indexed image, or None."""
+        row = self._rows.get(image)
+        return row[1:] if row is not None else None
+
+    def remove(self, image):
+        with self._lock:
+            if self._rows.pop(image, None) is not None and image in self._tree_items:
+                self._tree = None  # BK-trees can't delete: rebuild on the next query
+
+    def add(self, image, hashes, mtime=0):
+        with self._lock:
+            self._rows[image] = (mtime,) + tuple(hashes)
+            if self._tree is None:
+                return
+            if image in self._tree_items:
+                self._tree = None  # re-hashed: rebuild on the next query
+            else:
+                self._tree.add(hashes[0], image)
+                self._tree_items.add(image)
+
+    def _get_tree(self):
+        if self._tree is None:
+            self._tree = BKTree()
+            self._tree_items = set()
+            for image, (_, p, _) in self._rows.items():
+                self._tree.add(p, image)
+                self._tree_items.add(image)
+        return self._tree
+
+    def query(self, hashes, max_distance, exclude=None):
+        """[(distance, path)] of indexed images within `max_distance` bits on both hashes."""
+        p, d = hashes
+        with self._lock:
+            found = []
+            for distance, image in self._get_tree().search(p, max_distance):
+                if image != exclude and hamming(self._rows[image][2], d) <= max_distance:
+                    found.append((distance, image))
+        return found
+
+    def save(self):
+        with self._lock:  # also keeps concurrent saves off the same temporary file
+            images = list(self._rows)
+            rows = [self._rows[image] for image in images]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp.npz"
+            np.savez_compressed(
+                tmp,
+                path=np.array(images, dtype=str),
+                mtime=np.array([r[0] for r in rows], dtype=np.int64),
+                phash=np.array([r[1] for r in rows], dtype=np.uint64),
+                dhash=np.array([r[2] for r in rows], dtype=np.uint64),
+            )
+            os.replace(tmp, self.path)
+
+
+def collection_dir():
+    return os.path.join(settings.BASE_DIR, "dataset_collection")
+
+
+def _to_db(value):
+    """Unsigned 64-bit hash -> signed, as stored in a BigIntegerField."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _from_db(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class CollectionIndex:
+    """Near-duplicate lookup over the frames in the CollectedImage table."""
+
+    def __init__(self):
+        self.index = HashIndex()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _catch_up(self):
+        # New and re-saved frames are rows with higher ids. Deleted rows (a sync
+        # after frames were removed, or a re-save) are not seen here; _live()
+        # drops them when they come up as matches.
+        from .models import CollectedImage
+
+        rows = (CollectedImage.objects.filter(id__gt=self._last_id).order_by("id")
+                .values_list("id", "path", "mtime_ns", "phash", "dhash"))
+        for row_id, path, mtime, p, d in rows.iterator():
+            self.index.add(path, (_from_db(p), _from_db(d)), mtime)
+            self._last_id = row_id
+
+    def _live(self, found):
+        """`found` without images whose row was deleted or whose file is gone (forgotten for good)."""
+        from .models import CollectedImage
+
+        if not found:
+            return found
+        rows = set(CollectedImage.objects.filter(path__in=[image for _, image in found])
+                   .values_list("path", flat=True))
+        live, missing = [], []
+        for distance, image in found:
+            if image in rows and os.path.exists(image):
+                live.append((distance, image))
+            else:
+                self.index.remove(image)
+                if image in rows:
+                    missing.append(image)
+        if missing:
+            CollectedImage.objects.filter(path__in=missing).delete()
+        return live
+
+    def sync(self, root, workers=None):
+        """Brings the table in line with the images under `root`; returns how many were hashed."""
+        from .models import CollectedImage
+
+        known = dict(CollectedImage.objects.values_list("path", "mtime_ns"))
+        stamps = {}
+        for image in image_files(root):
+            try:
+                stamps[image] = os.stat(image).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        stale = [image for image, mtime in stamps.items() if known.get(image) != mtime]
+        removed = [image for image in known if image not in stamps]
+        if not stale and not removed:
+            return 0
+
+        rows = [
+            CollectedImage(path=image, mtime_ns=stamps[image], phash=_to_db(value[0]), dhash=_to_db(value[1]))
+            for image, value in zip(stale, hash_files(stale, workers)) if value is not None
+        ]
+        with transaction.atomic():
+            CollectedImage.objects.filter(path__in=stale + removed).delete()
+            CollectedImage.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        with self._lock:
+            # Forget removed images; everything else is re-read from the table
+            self.index = HashIndex()
+            self._last_id = 0
+        return len(stale)
+
+    def query(self, hashes, max_distance, exclude=None):
+        with self._lock:
+            self._catch_up()
+            return self._live(self.index.query(hashes, max_distance, exclude))
+
+    def save_unless_duplicate(self, path, hashes, max_distance, write, reject=False):
+        """Near-duplicates of `hashes` already collected; unless `reject` finds some,
+        calls write() and records `path` as collected.
+
+        The lookup and the insert are one transaction that starts with a write, so
+        SQLite serializes it against every other worker's save: two concurrent saves
+        of the same frame can't both miss each other.
+        """
+        from .models import CollectedImage
+
+        with self._lock, transaction.atomic():
+            # Replacing the row for this path (if any) takes the database write lock up front
+            CollectedImage.objects.filter(path=path).delete()
+            self._catch_up()
+            duplicates = [image for _, image in self._live(self.index.query(hashes, max_distance, exclude=path))]
+            if duplicates and reject:
+                transaction.set_rollback(True)  # keep the existing row of a file we don't overwrite
+                return duplicates, False
+            write()
+            CollectedImage.objects.create(path=path, mtime_ns=os.stat(path).st_mtime_ns,
+                                          phash=_to_db(hashes[0]), dhash=_to_db(hashes[1]))
+        return duplicates, True
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_collection_index():
+    """The index of the CollectedImage table.
+
+    Frames saved through the app are added as they are written; frames copied
+    in or deleted by hand are picked up by `manage.py index_collection`, so no
+    request ever hashes the whole folder.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CollectionIndex()
+    return _index
+
+
+def find_leaks(split_paths, max_distance, workers=None, index_path=None):
+    """Near-duplicate pairs across splits: [(split_a, path_a, split_b, path_b, distance)].
+
+    `split_paths` maps split name -> image paths; every image is compared with
+    the images of the splits listed before its own.
+    """
+    index = HashIndex(index_path)
+    index.sync([image for paths in split_paths.values() for image in paths], workers, processes=True)
+    if index_path:
+        index.save()
+
+    leaks = []
+    earlier = HashIndex()
+    owner = {}
+    for split, paths in split_paths.items():
+        current = [(image, index.hashes(image)) for image in paths if index.hashes(image) is not None]
+        for image, hashes in current:
+            for distance, match in earlier.query(hashes, max_distance):
+                leaks.append((owner[match], match, split, image, distance))
+        for image, hashes in current:
+            earlier.add(image, hashes)
+            owner[image] = split
+    return leaks
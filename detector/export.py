@@ -0,0 +1,174 @@
+"""
+Streaming exports of the tree inventory as CSV, GeoJSON or Parquet.
+
+Every exporter is a generator of byte chunks that reads the database in
+fixed-size batches, so memory use stays flat regardless of inventory size.
+Per-species counts are written as separate columns/properties so GIS tools
+don't have to parse the "Angsana: 2, Rain Tree: 1" string.
+"""
+import io
+import json
+import zlib
+from itertools import islice
+
+from .inventory import csv_lines
+from .models import Detection
+
+EXPORT_FORMATS = {
+    # format: (content type, file extension)
+    "csv": ("text/csv", "csv"),
+    "geojson": ("application/geo+json", "geojson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+FIELDS = ["id", "timestamp", "latitude", "longitude", "heading", "pitch", "fov", "total_trees", "counts"]
+
+
+class ExportError(Exception):
+    pass
+
+
+def species_columns():
+    """Every species present in the inventory, for the per-species count columns."""
+    return sorted(Detection.objects.values_list("species", flat=True).distinct())
+
+
+def _batches(queryset, chunk_size):
+    batch = []
+    for row in queryset.order_by("timestamp", "id").values_list(*FIELDS).iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_rows(queryset, species, chunk_size):
+    for batch in _batches(queryset, chunk_size):
+        for *fields, counts in batch:
+            fields[1] = fields[1].isoformat()
+            yield fields + [counts.get(name, 0) for name in species]
+
+
+def iter_csv(queryset, chunk_size=2000):
+    species = species_columns()
+    lines = csv_lines(FIELDS[:-1] + species, _csv_rows(queryset, species, chunk_size))
+    # One bytes chunk per batch of rows rather than per line
+    while True:
+        chunk = "".join(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk.encode("utf-8")
+
+
+def iter_geojson(queryset, chunk_size=2000):
+    yield b'{"type": "FeatureCollection", "features": ['
+    first = True
+    for batch in _batches(queryset, chunk_size):
+        features = []
+        for scan_id, timestamp, lat, lng, heading, pitch, fov, total, counts in batch:
+            features.append(json.dumps({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lng, lat]},
+                "properties": {
+                    "id": scan_id,
+                    "timestamp": timestamp.isoformat(),
+                    "heading": heading,
+                    "pitch": pitch,
+                    "fov": fov,
+                    "total_trees": total,
+                    **counts,
+                },
+            }))
+        chunk = ",".join(features)
+        yield (chunk if first else "," + chunk).encode("utf-8")
+        first = False
+    yield b"]}"
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out (and dropped) chunk by chunk."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(queryset, chunk_size=10000):
+    # Optional dependency, only needed for this format
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    species = species_columns()
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("heading", pa.float64()),
+            ("pitch", pa.float64()),
+            ("fov", pa.float64()),
+            ("total_trees", pa.int32()),
+        ]
+        + [(name, pa.int32()) for name in species]
+    )
+
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    # One row group per batch; bytes are handed out as soon as each group is written
+    for batch in _batches(queryset, chunk_size):
+        columns = list(zip(*batch))
+        arrays = [list(column) for column in columns[:-1]]
+        arrays += [[counts.get(name, 0) for counts in columns[-1]] for name in species]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {"csv": iter_csv, "geojson": iter_geojson, "parquet": iter_parquet}
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(queryset, fmt, gzip=False):
+    """Returns a generator of bytes for `queryset` in `fmt`, optionally gzipped."""
+    if fmt not in EXPORTERS:
+        raise ExportError(f"format must be one of {', '.join(EXPORTERS)}")
+    if fmt == "parquet":
+        # Fail before the response starts streaming if pyarrow is missing
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+    stream = EXPORTERS[fmt](queryset)
+    return gzip_stream(stream) if gzip else stream
+
+
+def export_filename(fmt, gzip=False):
+    return f"treeInventory.{EXPORT_FORMATS[fmt][1]}" + (".gz" if gzip else "")
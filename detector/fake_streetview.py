@@ -0,0 +1,151 @@
+"""
+A local stand-in for the Street View Static API.
+
+Serves JPEGs from a directory (or a generated placeholder) for any
+`?location=...&heading=...` query, so the scan pipeline, the imagery cache and
+batch tooling can run offline. Point STREETVIEW_API_URL at it, e.g.
+`http://127.0.0.1:8765/maps/api/streetview`.
+
+For load tests it can behave like a slow or flaky upstream: every response is
+delayed by latency_ms (+- jitter_ms), and a share of requests fails with the
+configured HTTP statuses, with a 200 text answer ("not_image", like the real
+API's key/quota errors) or by hanging ("hang", to trip client read timeouts).
+"""
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _placeholder_jpeg(size=(640, 640)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (96, 128, 96)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _load_images(image_dir):
+    if image_dir is None:
+        return []
+    paths = sorted(p for p in Path(image_dir).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    images = []
+    for path in paths:
+        if path.suffix.lower() == ".png":
+            buffer = BytesIO()
+            Image.open(path).convert("RGB").save(buffer, format="JPEG")
+            images.append(buffer.getvalue())
+        else:
+            images.append(path.read_bytes())
+    return images
+
+
+def parse_errors(spec):
+    """"503:0.02,429:0.01,hang:0.005" -> {"503": 0.02, "429": 0.01, "hang": 0.005}."""
+    errors = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        kind, _, rate = part.partition(":")
+        kind = kind.strip()
+        if not (kind.isdigit() or kind in ("hang", "not_image")):
+            raise ValueError(f"Unknown error kind {kind!r}: use an HTTP status, 'hang' or 'not_image'")
+        errors[kind] = float(rate)
+    if sum(errors.values()) > 1.0:
+        raise ValueError("Error rates add up to more than 1")
+    return errors
+
+
+class FakeStreetViewServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, image_dir=None, latency_ms=0.0, jitter_ms=0.0, errors=None,
+                 hang_seconds=30.0, seed=None):
+        super().__init__(address, _Handler)
+        self.images = _load_images(image_dir) or [_placeholder_jpeg()]
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.jitter = max(0.0, jitter_ms) / 1000.0
+        self.errors = dict(errors or {})
+        self.hang_seconds = hang_seconds
+        self._random = random.Random(seed)
+        self.requests_served = 0
+        self.responses = {}  # status or failure kind -> count
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/maps/api/streetview"
+
+    def image_for(self, query):
+        # Same query -> same image, so repeated poses look like the real API
+        digest = hashlib.sha1(query.encode("utf-8")).digest()
+        return self.images[int.from_bytes(digest[:4], "big") % len(self.images)]
+
+    def plan(self):
+        """(delay in seconds, failure kind or None) for the next request."""
+        with self._count_lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            roll = self._random.random()
+        for kind, rate in self.errors.items():
+            if roll < rate:
+                return max(0.0, delay), kind
+            roll -= rate
+        return max(0.0, delay), None
+
+    def count(self, outcome):
+        with self._count_lock:
+            self.requests_served += 1
+            self.responses[outcome] = self.responses.get(outcome, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        _, _, query = self.path.partition("?")
+        delay, failure = self.server.plan()
+        if delay:
+            time.sleep(delay)
+
+        if failure == "hang":
+            self.server.count("hang")
+            time.sleep(self.server.hang_seconds)
+            return
+        if failure == "not_image":
+            self._send(200, "text/plain", b"The provided API key is invalid.")
+            self.server.count("not_image")
+            return
+        if failure is not None:
+            headers = {"Retry-After": "1"} if failure == "429" else {}
+            self._send(int(failure), "text/plain", b"Injected failure", headers)
+            self.server.count(failure)
+            return
+
+        self._send(200, "image/jpeg", self.server.image_for(query))
+        self.server.count("200")
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host="127.0.0.1", port=0, image_dir=None, **behaviour):
+    """Starts the fake server on a background thread and returns it.
+
+    `behaviour` takes FakeStreetViewServer's latency_ms, jitter_ms, errors,
+    hang_seconds and seed."""
+    server = FakeStreetViewServer((host, port), image_dir=image_dir, **behaviour)
+    threading.Thread(target=server.serve_forever, name="fake-streetview", daemon=True).start()
+    return server
@@ -0,0 +1,357 @@
+"""
+Street View Static API access: a pooled HTTP client and a disk-backed image cache.
+
+The client keeps one keep-alive connection pool per process, applies
+connect/read timeouts, retries transient failures (connection errors, 429,
+5xx) with jittered exponential backoff, and rate-limits requests per API key.
+
+Requests are keyed by the normalized pose (lat, lng, heading, pitch, fov,
+size), so panning back to a view that was fetched recently is served from
+disk instead of costing another API call. The cache is size-bounded with LRU
+eviction, entries expire after STREETVIEW_CACHE_TTL seconds, and hit/miss
+counters are kept per process.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import STREETVIEW_ERRORS
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class StreetViewError(Exception):
+    """The Street View API did not return an image."""
+
+
+class StreetViewUnavailable(StreetViewError):
+    """The Street View API could not be reached (after retries)."""
+
+
+def normalize_pose(lat, lng, heading, pitch, fov, size="640x640"):
+    """Rounds a pose so that views which render identically share a cache key."""
+    decimals = settings.STREETVIEW_CACHE_COORD_DECIMALS
+    try:
+        return (
+            round(float(lat), decimals),
+            round(float(lng), decimals),
+            round(float(heading) % 360.0) % 360,
+            round(float(pitch)),
+            round(float(fov)),
+            size,
+        )
+    except (TypeError, ValueError):
+        raise StreetViewError("lat, lng, heading, pitch and fov must be numbers")
+
+
+def pose_key(lat, lng, heading, pitch, fov, size="640x640"):
+    pose = normalize_pose(lat, lng, heading, pitch, fov, size)
+    return hashlib.sha1(repr(pose).encode("utf-8")).hexdigest()
+
+
+def streetview_url(lat, lng, heading, pitch, fov, size="640x640", api_key=None):
+    return (
+        f"{settings.STREETVIEW_API_URL}"
+        f"?size={size}&location={lat},{lng}"
+        f"&heading={heading}&pitch={pitch}&fov={fov}&key={api_key or settings.GOOGLE_API_KEY}"
+    )
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(value):
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP date), or None if unparseable."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class StreetViewClient:
+    """Pooled, rate-limited HTTP client for the Street View Static API."""
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, retries=3, backoff=0.5,
+                 rate_per_key=50.0, pool_size=16, max_retry_after=30.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.rate_per_key = rate_per_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def _limiter(self, api_key):
+        with self._limiters_lock:
+            limiter = self._limiters.get(api_key)
+            if limiter is None:
+                limiter = self._limiters[api_key] = TokenBucket(self.rate_per_key)
+            return limiter
+
+    def _sleep_before_retry(self, attempt, retry_after=None):
+        asked = retry_after_seconds(retry_after) if retry_after is not None else None
+        if asked is not None:
+            # At least what the server asked for (capped), jittered upwards only
+            time.sleep(min(asked, self.max_retry_after) + random.uniform(0, self.backoff))
+            return
+        # Full jitter so concurrent workers don't retry in lockstep
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def get_image(self, lat, lng, heading, pitch, fov, size="640x640", api_key=None):
+        """Returns the JPEG bytes for one pose.
+
+        Raises StreetViewError for a non-image answer, StreetViewUnavailable
+        when the API can't be reached or keeps failing.
+        """
+        api_key = api_key or settings.GOOGLE_API_KEY
+        url = streetview_url(lat, lng, heading, pitch, fov, size, api_key)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self._limiter(api_key).acquire()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                STREETVIEW_ERRORS.inc(reason="timeout" if isinstance(e, requests.Timeout) else "connection")
+                if attempt < self.retries:
+                    self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                last_error = f"HTTP {response.status_code}"
+                STREETVIEW_ERRORS.inc(reason=f"http_{response.status_code}")
+                if attempt < self.retries:
+                    self._sleep_before_retry(attempt, response.headers.get("Retry-After"))
+                continue
+
+            if "image" not in response.headers.get("Content-Type", ""):
+                STREETVIEW_ERRORS.inc(reason="not_an_image")
+                raise StreetViewError("Google API did not return an image. Check API key and service activation.")
+            return response.content
+
+        logger.warning("Street View request failed after %d attempts: %s", self.retries + 1, last_error)
+        raise StreetViewUnavailable(f"Street View API unavailable ({last_error})")
+
+
+_client = None
+_executor = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide Street View client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = StreetViewClient(
+                    connect_timeout=settings.STREETVIEW_CONNECT_TIMEOUT,
+                    read_timeout=settings.STREETVIEW_READ_TIMEOUT,
+                    retries=settings.STREETVIEW_RETRIES,
+                    backoff=settings.STREETVIEW_BACKOFF,
+                    rate_per_key=settings.STREETVIEW_RATE_LIMIT,
+                    pool_size=settings.STREETVIEW_POOL_SIZE,
+                    max_retry_after=settings.STREETVIEW_MAX_RETRY_AFTER,
+                )
+    return _client
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.STREETVIEW_FETCH_WORKERS, thread_name_prefix="streetview-fetch"
+                )
+    return _executor
+
+
+class StreetViewCache:
+    """Size-bounded LRU + TTL cache of Street View JPEGs on disk.
+
+    LRU order is tracked with file access times (bumped on every hit), TTL with
+    modification times (set when the image was fetched), so the cache survives
+    restarts and can be shared by every worker on the host.
+    """
+
+    def __init__(self, root, max_bytes, ttl_seconds):
+        self.root = str(root)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._index = None  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.jpg")
+
+    def _load_index(self):
+        entries = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not name.endswith(".jpg"):
+                        continue
+                    st = os.stat(os.path.join(dirpath, name))
+                    entries.append((st.st_atime, name[:-4], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def get(self, key):
+        """Returns the cached JPEG bytes for `key`, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+
+        # Disk I/O outside the lock, so cache hits don't queue behind each other
+        content = None
+        try:
+            st = os.stat(path)
+            expired = time.time() - st.st_mtime > self.ttl
+            if not expired:
+                with open(path, "rb") as f:
+                    content = f.read()
+                os.utime(path, (time.time(), st.st_mtime))
+        except FileNotFoundError:
+            # Evicted by another thread or worker process
+            with self._lock:
+                if key in self._index:
+                    self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if expired:
+                self._discard(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            if key not in self._index:
+                self._total_bytes += st.st_size
+                self._index[key] = st.st_size
+            self._index.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def put(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            os.replace(tmp_path, path)
+
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = len(content)
+            self._total_bytes += len(content)
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                oldest = next(iter(self._index))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def _discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        if key in self._index:
+            self._total_bytes -= self._index.pop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": len(self._index) if self._index is not None else None,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide image cache, or None when caching is disabled."""
+    global _cache
+    if not settings.STREETVIEW_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StreetViewCache(
+                    settings.STREETVIEW_CACHE_DIR,
+                    max_bytes=settings.STREETVIEW_CACHE_MAX_MB * 1024 * 1024,
+                    ttl_seconds=settings.STREETVIEW_CACHE_TTL,
+                )
+    return _cache
+
+
+def fetch_streetview(lat, lng, heading, pitch, fov, size="640x640"):
+    """Returns the JPEG bytes for a pose, from the cache when possible.
+
+    Raises StreetViewError if the API answers with anything but an image,
+    StreetViewUnavailable if it can't be reached.
+    """
+    cache = get_cache()
+    key = pose_key(lat, lng, heading, pitch, fov, size)
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+    content = get_client().get_image(lat, lng, heading, pitch, fov, size)
+    if cache is not None:
+        cache.put(key, content)
+    return content
+
+
+def fetch_many(poses, size="640x640"):
+    """Fetches several (lat, lng, heading, pitch, fov) poses concurrently.
+
+    Returns one entry per pose, in order: the JPEG bytes, or the
+    StreetViewError raised for that pose.
+    """
+    futures = [_get_executor().submit(fetch_streetview, *pose, size=size) for pose in poses]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except StreetViewError as e:
+            results.append(e)
+    return results
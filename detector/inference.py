@@ -0,0 +1,74 @@
+"""
+In-memory helpers for the scan pipeline.
+
+The Street View response is decoded once into an array that goes straight to
+the model, and annotated images are only encoded when a caller asks for them.
+"""
+import base64
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from .metrics import timed
+
+ANNOTATE_MODES = ("url", "inline", "none")
+
+
+@timed("decode")
+def decode_image(content):
+    """Decodes JPEG/PNG bytes into a contiguous BGR array (what YOLO expects)."""
+    image = Image.open(BytesIO(content)).convert("RGB")
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+
+def result_arrays(result):
+    """(xyxy, conf, cls) of one YOLO result as NumPy arrays.
+
+    boxes.data is copied off the device once; indexing per box would sync with
+    the device three times for every tree.
+    """
+    data = result.boxes.data
+    data = data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+    return data[:, :4], data[:, 4], data[:, 5].astype(np.intp)
+
+
+def serialize_detections(xyxy, conf, cls, names):
+    """JSON-ready detection dicts built from whole arrays."""
+    labels = np.array([names[i] for i in range(len(names))], dtype=object)[cls]
+    return [
+        {"class": c, "label": label, "confidence": p, "xyxy": box}
+        for c, label, p, box in zip(cls.tolist(), labels.tolist(), conf.tolist(), xyxy.tolist())
+    ]
+
+
+def class_counts(cls, names):
+    """{label: count} for an array of class ids, in class-id order."""
+    counts = np.bincount(cls, minlength=len(names))
+    return {names[int(i)]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+
+def label_counts(detections):
+    """{label: count} for already-serialized detections (merged or loaded ones)."""
+    if not detections:
+        return {}
+    labels, counts = np.unique(np.array([d["label"] for d in detections]), return_counts=True)
+    return dict(zip(labels.tolist(), counts.tolist()))
+
+
+def extract_detections(result, names):
+    """The detections of one YOLO result as JSON-ready dicts, plus per-label counts."""
+    xyxy, conf, cls = result_arrays(result)
+    return serialize_detections(xyxy, conf, cls, names), class_counts(cls, names)
+
+
+def encode_annotated(result, quality=85):
+    """Draws the detections of one YOLO result and returns JPEG bytes."""
+    plotted = result.plot()  # BGR array
+    buffer = BytesIO()
+    Image.fromarray(plotted[:, :, ::-1]).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def to_data_uri(jpeg_bytes):
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode("ascii")
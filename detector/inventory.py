@@ -0,0 +1,187 @@
+"""
+Tree inventory store: writes scans to the database and renders them in the
+column layout of the original treeInventory.csv.
+"""
+import base64
+import csv
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .inference import label_counts
+from .metrics import DETECTIONS
+from .models import Detection, Scan
+from .spatial import locate_detections
+
+CSV_HEADER = ["Timestamp", "Latitude", "Longitude", "Total_Trees", "Counts"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+
+def record_scan(lat, lng, detections, heading=None, pitch=None, fov=None, timestamp=None, counts=None):
+    """Stores one scan and its per-box detections in a single transaction.
+
+    `counts` ({label: count}) is computed from the detections when not given.
+    The returned Scan carries `new_trees`: how many detections were not
+    already known trees.
+    """
+    if counts is None:
+        counts = label_counts(detections)
+    with transaction.atomic():
+        scan = Scan.objects.create(
+            timestamp=timestamp or timezone.now(),
+            latitude=float(lat),
+            longitude=float(lng),
+            heading=heading,
+            pitch=pitch,
+            fov=fov,
+            total_trees=len(detections),
+            counts=counts,
+        )
+        rows = Detection.objects.bulk_create([
+            Detection(
+                scan=scan,
+                species=d["label"],
+                class_id=d.get("class"),
+                confidence=d.get("confidence"),
+                x1=d["xyxy"][0], y1=d["xyxy"][1], x2=d["xyxy"][2], y2=d["xyxy"][3],
+            )
+            for d in detections
+        ])
+        # Merge each box into a physical Tree so repeat sightings aren't re-counted
+        scan.new_trees = locate_detections(scan, rows)
+    for label, count in counts.items():
+        DETECTIONS.inc(count, species=label)
+    return scan
+
+
+def counts_string(counts):
+    """{"Angsana": 2, "Rain Tree": 1} -> "Angsana: 2, Rain Tree: 1" (the CSV format)."""
+    return ", ".join(f"{label}: {count}" for label, count in counts.items())
+
+
+def parse_counts_string(text):
+    """Inverse of counts_string(), for importing the legacy CSV."""
+    counts = {}
+    for part in (text or "").split(","):
+        label, sep, count = part.rpartition(":")
+        if sep and label.strip():
+            counts[label.strip()] = counts.get(label.strip(), 0) + int(count)
+    return counts
+
+
+def log_row(scan):
+    """One scan as a dict keyed like the CSV header (what the scanner page renders)."""
+    return {
+        "id": scan.id,
+        "Timestamp": timezone.localtime(scan.timestamp).strftime(TIMESTAMP_FORMAT),
+        "Latitude": scan.latitude,
+        "Longitude": scan.longitude,
+        "Total_Trees": scan.total_trees,
+        "Counts": counts_string(scan.counts),
+    }
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer streaming."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """Yields `header` and then each of `rows` as a CSV line (str), one at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_csv(queryset, chunk_size=2000):
+    """Yields the inventory as CSV lines without materializing the table."""
+    rows = (log_row(scan) for scan in queryset.iterator(chunk_size=chunk_size))
+    return csv_lines(CSV_HEADER, ([row[column] for column in CSV_HEADER] for row in rows))
+
+
+# --- Querying ---
+
+def _parse_when(value, end_of_day=False):
+    """Accepts an ISO date or datetime; bare dates cover the whole day."""
+    # Dates first: parse_datetime also accepts a bare date (as midnight) on Python 3.11+
+    try:
+        day = parse_date(value)
+        parsed = parse_datetime(value) if day is None else datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_scans(params, queryset=None):
+    """Applies the inventory filters in `params` (a QueryDict or dict).
+
+    since / until   ISO date or datetime (inclusive)
+    species         one or more comma-separated species names
+    bbox            min_lng,min_lat,max_lng,max_lat
+
+    Raises ValueError on malformed input.
+    """
+    queryset = Scan.objects.all() if queryset is None else queryset
+
+    if params.get("since"):
+        queryset = queryset.filter(timestamp__gte=_parse_when(params["since"]))
+    if params.get("until"):
+        queryset = queryset.filter(timestamp__lte=_parse_when(params["until"], end_of_day=True))
+
+    if params.get("species"):
+        species = [name.strip() for name in params["species"].split(",") if name.strip()]
+        queryset = queryset.filter(Exists(
+            Detection.objects.filter(scan=OuterRef("pk"), species__in=species)
+        ))
+
+    if params.get("bbox"):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in params["bbox"].split(","))
+        except ValueError:
+            raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+        queryset = queryset.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lng, longitude__lte=max_lng,
+        )
+
+    return queryset
+
+
+def encode_cursor(scan):
+    raw = f"{scan.timestamp.isoformat()}|{scan.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        stamp, scan_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(stamp), int(scan_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_scans(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Keyset pagination, newest first. Returns (scans, next_cursor or None)."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    queryset = queryset.order_by("-timestamp", "-id")
+    if cursor:
+        stamp, scan_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=stamp) | Q(timestamp=stamp, id__lt=scan_id))
+
+    # Fetch one extra row to know whether another page exists
+    scans = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(scans[limit - 1]) if len(scans) > limit else None
+    return scans[:limit], next_cursor
@@ -0,0 +1,194 @@
+"""
+Open-loop load generation against the scan API (see the loadgen management
+command).
+
+A sequence is a list of {"path", "body"} requests, either read from a JSONL
+file or generated as a number of interleaved user sessions: each session walks
+down a street in small steps, scanning both kerbs, occasionally re-scanning
+the same pose (a cache hit) or asking for a full panorama, like someone
+driving the scanner page.
+
+Requests are sent on a fixed schedule (request i at start + i / rps) whether or
+not earlier ones have finished, and latency is measured from the scheduled
+time, so a slow server shows up as latency instead of silently lowering the
+offered load.
+"""
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .benchmarking import BENCH_ORIGIN, summarize
+from .spatial import METERS_PER_DEGREE
+
+SCAN_PATH = "/streetview-scan/"
+
+# Dispatches later than this behind schedule count as generator lag
+LATE_SECONDS = 0.01
+
+
+def load_sequence(path):
+    """Requests from a JSONL file: {"path": ..., "body": {...}} or a bare scan body per line."""
+    sequence = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "body" in entry:
+                sequence.append({"path": entry.get("path", SCAN_PATH), "body": entry["body"]})
+            else:
+                sequence.append({"path": SCAN_PATH, "body": entry})
+    return sequence
+
+
+def _session(rng, origin, steps, profile=None):
+    lat, lng = origin
+    bearing = rng.uniform(0.0, 360.0)
+    step_m = rng.uniform(8.0, 15.0)
+    requests = []
+    for _ in range(steps):
+        roll = rng.random()
+        if roll < 0.05:
+            body = {"mode": "panorama", "heading": round(bearing, 1)}
+        else:
+            # Look at one kerb; now and then the same view twice (a cache hit)
+            side = rng.choice((-90.0, 90.0))
+            body = {"heading": round((bearing + side + rng.uniform(-20.0, 20.0)) % 360.0, 1)}
+            if roll > 0.9:
+                requests.append({"path": SCAN_PATH, "body": dict(body, lat=round(lat, 6), lng=round(lng, 6),
+                                                                  pitch=0, fov=90, annotate="none")})
+        body.update(lat=round(lat, 6), lng=round(lng, 6), pitch=0, fov=90,
+                    annotate="url" if rng.random() < 0.5 else "none")
+        if profile:
+            body["profile"] = profile
+        requests.append({"path": SCAN_PATH, "body": body})
+
+        d = step_m / METERS_PER_DEGREE
+        lat += d * math.cos(math.radians(bearing))
+        lng += d * math.sin(math.radians(bearing)) / math.cos(math.radians(lat))
+        bearing = (bearing + rng.uniform(-5.0, 5.0)) % 360.0
+    return requests
+
+
+def generate_sequence(count, sessions=4, origin=BENCH_ORIGIN, profile=None, seed=0):
+    """`count` requests from `sessions` users scanning nearby streets, interleaved."""
+    rng = random.Random(seed)
+    streams = []
+    for _ in range(sessions):
+        start = (origin[0] + rng.uniform(-0.005, 0.005), origin[1] + rng.uniform(-0.005, 0.005))
+        streams.append(_session(rng, start, count, profile))
+    sequence = []
+    while len(sequence) < count:
+        stream = rng.choice([s for s in streams if s])
+        sequence.append(stream.pop(0))
+    return sequence
+
+
+class HTTPTarget:
+    """Sends requests to a running server over HTTP, one keep-alive session per thread."""
+
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, body):
+        import requests
+
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        try:
+            response = self._local.session.post(self.base_url + path, json=body, timeout=self.timeout)
+        except requests.Timeout:
+            return "timeout", None
+        except requests.ConnectionError:
+            return "connection", None
+        return response.status_code, _json(response.headers.get("Content-Type", ""), response.content)
+
+
+class ClientTarget:
+    """Sends requests through the Django stack in this process (no server needed)."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def post(self, path, body):
+        from django.test import Client
+
+        if not hasattr(self._local, "client"):
+            self._local.client = Client(SERVER_NAME="localhost", raise_request_exception=False)
+        response = self._local.client.post(path, json.dumps(body), content_type="application/json")
+        return response.status_code, _json(response.get("Content-Type", ""), response.content)
+
+
+def _json(content_type, content):
+    if "json" not in content_type:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def run_load(sequence, target, rps, concurrency=16):
+    """Replays `sequence` at `rps` and returns the latency/error report."""
+    interval = 1.0 / rps
+    records = []
+    lock = threading.Lock()
+
+    def one(scheduled, request):
+        try:
+            status, payload = target.post(request["path"], request["body"])
+        except Exception as e:
+            # Nobody reads the pool's futures: record it here or it vanishes from the report
+            status, payload = type(e).__name__, None
+        finished = time.perf_counter()
+        mode = request["body"].get("mode", "single")
+        with lock:
+            records.append((mode, status, finished - scheduled,
+                            bool(payload and payload.get("degraded")),
+                            bool(payload and payload.get("cached"))))
+
+    started = time.perf_counter()
+    lag = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, request in enumerate(sequence):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > LATE_SECONDS:
+                lag.append(-delay)
+            pool.submit(one, scheduled, request)
+    wall = time.perf_counter() - started
+    return report(records, len(sequence), rps, wall, lag)
+
+
+def report(records, sent, rps, wall, lag=()):
+    ok = [r for r in records if r[1] == 200]
+    errors = {}
+    for _, status, _, _, _ in records:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    by_mode = {}
+    for mode in sorted({r[0] for r in ok}):
+        by_mode[mode] = summarize([r[2] for r in ok if r[0] == mode])
+    return {
+        "sent": sent,
+        "target_rps": rps,
+        "achieved_rps": len(ok) / wall if wall else 0.0,
+        "wall_seconds": wall,
+        "latency": summarize([r[2] for r in ok]),
+        "latency_by_mode": by_mode,
+        "error_latency": summarize([r[2] for r in records if r[1] != 200]),
+        "errors": errors,
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "degraded": sum(1 for r in ok if r[3]),
+        "cached": sum(1 for r in ok if r[4]),
+        # Requests dispatched late because the generator itself fell behind
+        "late_dispatches": len(lag),
+        "max_dispatch_lag_ms": 1000.0 * max(lag, default=0.0),
+    }
@@ -0,0 +1,211 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from detector.dedup import image_files
+from detector.inference import result_arrays
+from detector.model_registry import get_model
+from detector.profiles import get_profile
+
+
+def decode_for_model(path, imgsz):
+    """BGR array of an image file; JPEGs are decoded at reduced size when far larger than imgsz."""
+    with Image.open(path) as image:
+        image.draft("RGB", (imgsz, imgsz))
+        return np.ascontiguousarray(np.asarray(image.convert("RGB"))[:, :, ::-1])
+
+
+def yolo_lines(xyxy, conf, cls, width, height, save_conf=False):
+    """YOLO label lines (class cx cy w h, normalized) for one image."""
+    scale = np.array([width, height, width, height], dtype=np.float64)
+    box = (xyxy / scale).clip(0.0, 1.0)
+    xywh = np.column_stack([(box[:, 0] + box[:, 2]) / 2, (box[:, 1] + box[:, 3]) / 2,
+                            box[:, 2] - box[:, 0], box[:, 3] - box[:, 1]])
+    rows = np.column_stack([xywh, conf]) if save_conf else xywh
+    return [f"{c} " + " ".join(f"{v:.6f}" for v in row) + "\n" for c, row in zip(cls.tolist(), rows)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-annotates a folder of images with the detector: YOLO-format pseudo-labels mirrored "
+        "into --out, plus a per-image confidence summary. Images that already have an up-to-date "
+        "label are skipped, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", default=None, help="Image folder (default: dataset_collection/)")
+        parser.add_argument("--out", default=None, help="Label folder (default: <images>_labels/)")
+        parser.add_argument("--profile", choices=sorted(settings.DETECTOR_PROFILES),
+                            help="Inference profile (default: DETECTOR_DEFAULT_PROFILE)")
+        parser.add_argument("--conf", type=float, help="Override the profile's confidence threshold")
+        parser.add_argument("--batch-size", type=int, default=8, help="Images per model.predict call")
+        parser.add_argument("--workers", type=int, default=4, help="Decoding threads")
+        parser.add_argument("--prefetch", type=int, default=32, help="Most decoded images held in memory")
+        parser.add_argument("--review-conf", type=float, default=0.5,
+                            help="Images with a box below this confidence are marked for review")
+        parser.add_argument("--save-conf", action="store_true", help="Append each box's confidence to its label line")
+        parser.add_argument("--limit", type=int, help="Label at most this many images this run")
+        parser.add_argument("--force", action="store_true", help="Re-label images that already have labels")
+
+    def handle(self, *args, **options):
+        images_dir = os.path.normpath(options["images"] or os.path.join(settings.BASE_DIR, "dataset_collection"))
+        out_dir = options["out"] or f"{images_dir}_labels"
+        if not os.path.isdir(images_dir):
+            raise CommandError(f"No such folder: {images_dir}")
+        if options["prefetch"] < options["batch_size"]:
+            raise CommandError("--prefetch must be at least --batch-size")
+
+        paths = image_files(images_dir)
+        pending = [path for path in paths if options["force"] or not self._is_labelled(path, images_dir, out_dir)]
+        done = len(paths) - len(pending)
+        if options["limit"]:
+            pending = pending[:options["limit"]]
+        self.stdout.write(f"🏷️ {len(paths)} images in {images_dir}, {done} already labelled, "
+                          f"{len(pending)} to do → {out_dir}")
+        if not pending:
+            self._write_summary(out_dir, options["review_conf"])
+            return
+
+        profile = get_profile(options["profile"])
+        self.model = get_model(profile.weights)
+        self.params = profile.params()
+        if options["conf"] is not None:
+            self.params["conf"] = options["conf"]
+        self.options = options
+        self.images_dir, self.out_dir = images_dir, out_dir
+        self.stats = {"labelled": 0, "boxes": 0, "review": 0, "failed": 0}
+        os.makedirs(out_dir, exist_ok=True)
+
+        started = time.perf_counter()
+        batch = []
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool, \
+                self._open_log(os.path.join(out_dir, "summary.jsonl")) as self.log:
+            for path, image in self._decode_all(pool, pending, window=options["prefetch"] - options["batch_size"]):
+                if image is None:
+                    # No label written, so the next run retries it
+                    self.stats["failed"] += 1
+                    continue
+                batch.append((path, image))
+                if len(batch) >= options["batch_size"]:
+                    self._process(batch, len(pending))
+                    batch = []
+            if batch:
+                self._process(batch, len(pending))
+
+        elapsed = time.perf_counter() - started
+        self._write_summary(out_dir, options["review_conf"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Labelled {self.stats['labelled']} images in {elapsed:.1f}s "
+            f"({self.stats['labelled'] / elapsed:.2f}/s): {self.stats['boxes']} boxes, "
+            f"{self.stats['review']} to review, {self.stats['failed']} unreadable"
+        ))
+
+    # --- Decoding ---
+
+    def _label_path(self, path, images_dir, out_dir):
+        return os.path.join(out_dir, os.path.splitext(os.path.relpath(path, images_dir))[0] + ".txt")
+
+    def _is_labelled(self, path, images_dir, out_dir):
+        label = self._label_path(path, images_dir, out_dir)
+        return os.path.exists(label) and os.path.getmtime(label) >= os.path.getmtime(path)
+
+    def _decode_one(self, path):
+        try:
+            return decode_for_model(path, self.params["imgsz"])
+        except (OSError, ValueError) as e:
+            self.stderr.write(f"⚠️ Could not read {path}: {e}")
+            return None
+
+    def _decode_all(self, pool, paths, window):
+        """Yields (path, image) as decodes finish, keeping at most `window` decoded or in flight."""
+        paths = iter(paths)
+        in_flight = {}
+        for path in paths:
+            in_flight[pool.submit(self._decode_one, path)] = path
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield in_flight.pop(future), future.result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    in_flight[pool.submit(self._decode_one, next_path)] = next_path
+
+    # --- Detection + labels ---
+
+    def _process(self, batch, total):
+        results = self.model.predict([image for _, image in batch], verbose=False, **self.params)
+        for (path, image), result in zip(batch, results):
+            xyxy, conf, cls = result_arrays(result)
+            height, width = image.shape[:2]
+            names = self.model.names
+            review = bool(len(conf)) and float(conf.min()) < self.options["review_conf"]
+            entry = {
+                "image": os.path.relpath(path, self.images_dir),
+                "boxes": int(len(conf)),
+                "min_conf": round(float(conf.min()), 4) if len(conf) else None,
+                "mean_conf": round(float(conf.mean()), 4) if len(conf) else None,
+                "counts": {names[int(c)]: int(n) for c, n in zip(*np.unique(cls, return_counts=True))},
+                "review": review,
+            }
+            # Summary first: a crash in between re-labels the image and logs it twice,
+            # which _write_summary tolerates (last entry wins), instead of losing it
+            self.log.write(json.dumps(entry) + "\n")
+            self.log.flush()
+
+            label_path = self._label_path(path, self.images_dir, self.out_dir)
+            os.makedirs(os.path.dirname(label_path), exist_ok=True)
+            tmp_path = label_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(yolo_lines(xyxy, conf, cls, width, height, self.options["save_conf"]))
+            os.replace(tmp_path, label_path)
+
+            self.stats["labelled"] += 1
+            self.stats["boxes"] += len(conf)
+            self.stats["review"] += review
+        self.stdout.write(f"  {self.stats['labelled']}/{total} images, {self.stats['boxes']} boxes")
+
+    def _open_log(self, path):
+        f = open(path, "a+", encoding="utf-8")
+        if f.tell():
+            f.seek(f.tell() - 1)
+            if f.read(1) != "\n":
+                f.write("\n")  # don't glue the next entry onto a line cut short by a crash
+        return f
+
+    def _write_summary(self, out_dir, review_conf):
+        """Folds summary.jsonl (latest entry per image) into summary.json."""
+        log_path = os.path.join(out_dir, "summary.jsonl")
+        if not os.path.exists(log_path):
+            return
+        latest = {}
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    latest[entry["image"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    pass  # blank, or cut short by a crash: that image's label was never written
+        counts = {}
+        for entry in latest.values():
+            for name, n in entry["counts"].items():
+                counts[name] = counts.get(name, 0) + n
+        mean_confs = [e["mean_conf"] for e in latest.values() if e["mean_conf"] is not None]
+        summary = {
+            "images": len(latest),
+            "empty": sum(1 for e in latest.values() if not e["boxes"]),
+            "boxes": sum(e["boxes"] for e in latest.values()),
+            "counts": counts,
+            "mean_conf": float(np.mean(mean_confs)) if mean_confs else None,
+            "review_conf": review_conf,
+            "review": sorted(e["image"] for e in latest.values() if e["review"]),
+        }
+        with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,83 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.benchmarking import (
+    DEFAULT_CORPUS, bench_end_to_end, bench_models, compare, environment, image_paths, load_corpus, peak_rss_mb,
+    scratch_inventory, stub_streetview,
+)
+from detector.profiles import get_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the scan pipeline on a fixed image corpus behind the fake Street View "
+        "server: end-to-end latency p50/p95/p99, throughput at N concurrent clients, "
+        "model-only images/sec per profile and backend, and peak RSS. Writes JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", default=DEFAULT_CORPUS, help="Image corpus")
+        parser.add_argument("--limit", type=int, default=50, help="Images used from the corpus")
+        parser.add_argument("--requests", type=int, default=50, help="Scans per concurrency level")
+        parser.add_argument("--clients", default="1,4,8", help="Comma-separated concurrency levels")
+        parser.add_argument("--profiles", help="Comma-separated profiles (default: all)")
+        parser.add_argument("--backends", help="Comma-separated backends for the model benchmark "
+                                               "(default: every export on disk)")
+        parser.add_argument("--skip-end-to-end", action="store_true")
+        parser.add_argument("--skip-models", action="store_true")
+        parser.add_argument("--output", "-o", help="Report file (default: benchmarks/results/<commit>.json)")
+        parser.add_argument("--baseline", help="Earlier report to compare against")
+
+    def handle(self, *args, **options):
+        if not image_paths(options["images"], 1):
+            raise CommandError(f"No images found in {options['images']}")
+        profiles = get_profiles()
+        if options["profiles"]:
+            unknown = set(options["profiles"].split(",")) - set(profiles)
+            if unknown:
+                raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+            profiles = {name: profiles[name] for name in options["profiles"].split(",")}
+        client_counts = [int(n) for n in options["clients"].split(",")]
+
+        report = {"environment": environment(), "corpus": options["images"], "limit": options["limit"]}
+
+        if not options["skip_models"]:
+            self.stdout.write(f"🧠 Model throughput on {options['limit']} images...")
+            images = load_corpus(options["images"], options["limit"])
+            backends = options["backends"].split(",") if options["backends"] else None
+            report["models"] = bench_models(images, profiles.values(), backends)
+            for name, result in report["models"].items():
+                self.stdout.write(f"  {name}: {result['images_per_sec']:.2f} img/s")
+
+        if not options["skip_end_to_end"]:
+            report["end_to_end"] = {}
+            with stub_streetview(options["images"]), scratch_inventory():
+                for profile in profiles.values():
+                    self.stdout.write(f"🌐 End-to-end scans ({profile.name})...")
+                    results = bench_end_to_end(options["requests"], client_counts, profile.name)
+                    report["end_to_end"].update({f"{profile.name}/{c}": r for c, r in results.items()})
+                    for clients, r in results.items():
+                        self.stdout.write(
+                            f"  {clients} client(s): p50 {r.get('p50_ms', 0):.0f} ms, p95 {r.get('p95_ms', 0):.0f} ms, "
+                            f"p99 {r.get('p99_ms', 0):.0f} ms, {r['throughput_rps']:.2f} scans/s, "
+                            f"{r['errors']} errors"
+                        )
+
+        report["peak_rss_mb"] = peak_rss_mb()
+        self.stdout.write(f"💾 Peak RSS {report['peak_rss_mb']:.0f} MB")
+
+        if options["baseline"]:
+            with open(options["baseline"], "r", encoding="utf-8") as f:
+                report["vs_baseline"] = compare(report, json.load(f))
+            for key, change in sorted(report["vs_baseline"].items()):
+                self.stdout.write(f"  {key}: {change:+.1%}")
+
+        output = options["output"] or os.path.join(
+            "benchmarks", "results", f"{report['environment']['commit'] or 'unknown'}.json"
+        )
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Benchmark report written to {output}"))
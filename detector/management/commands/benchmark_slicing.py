@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.backends import box_iou, image_paths, load_images
+from detector.model_registry import get_model
+from detector.profiles import get_profile
+from detector.slicing import MERGE_METHODS, merge_results, slice_frame
+
+SMALL_BOX_PX = 32  # boxes under 32x32 px count as "small" (COCO convention)
+
+
+def load_labels(image_path, width, height):
+    """YOLO-format ground truth next to the image (images/ -> labels/), in pixels."""
+    images_dir, labels_dir = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    label_path = os.path.splitext(labels_dir.join(str(image_path).rsplit(images_dir, 1)))[0] + ".txt"
+    if not os.path.exists(label_path):
+        return None
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 5))
+    cls, cx, cy, w, h = rows[:, 0], rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, cls], axis=1)
+
+
+def matched(truth, result, iou_threshold=0.5):
+    """Which ground-truth boxes were found (same class, IoU >= threshold)."""
+    data = result.boxes.data.cpu().numpy()
+    found = np.zeros(len(truth), dtype=bool)
+    for i, row in enumerate(truth):
+        same = data[data[:, 5] == row[4]]
+        if len(same):
+            found[i] = box_iou(row[:4], same[:, :4]).max() >= iou_threshold
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares sliced (tiled) inference with the full-frame path on a folder of "
+        "images: latency, merge cost, box counts and, where YOLO labels exist, recall "
+        "on all and on small trees."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", default=os.path.join("dataset_detection", "images", "test"))
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument("--profile", help="Inference profile (default: DETECTOR_DEFAULT_PROFILE)")
+        parser.add_argument("--tile", type=int, default=settings.SLICING_TILE)
+        parser.add_argument("--overlap", type=float, default=settings.SLICING_OVERLAP)
+        parser.add_argument("--iou", type=float, default=settings.SLICING_IOU)
+        parser.add_argument("--merge", choices=MERGE_METHODS, default=settings.SLICING_MERGE)
+        parser.add_argument("--output", "-o", help="Also write the report as JSON")
+
+    def handle(self, *args, **options):
+        paths = image_paths(options["images"], options["limit"])
+        if not paths:
+            raise CommandError(f"No images found in {options['images']}")
+        profile = get_profile(options["profile"])
+        model = get_model(profile.weights)
+        params = dict(profile.params(), verbose=False)
+        model.predict(load_images(paths[:1])[0], **params)  # warm-up
+
+        rows = {"full": [], "sliced": []}
+        merge_seconds = []
+        found = {"full": [], "sliced": []}
+        small = []
+        for path in paths:
+            image = load_images([path])[0]
+
+            start = time.perf_counter()
+            full = model.predict(image, **params)[0]
+            rows["full"].append((time.perf_counter() - start, len(full.boxes)))
+
+            start = time.perf_counter()
+            crops, offsets = slice_frame(image, options["tile"], options["overlap"])
+            results = model.predict(crops, **params)
+            merge_start = time.perf_counter()
+            sliced = merge_results(image, results, offsets, options["iou"], options["merge"])
+            finished = time.perf_counter()
+            rows["sliced"].append((finished - start, len(sliced.boxes)))
+            merge_seconds.append(finished - merge_start)
+
+            truth = load_labels(path, image.shape[1], image.shape[0])
+            if truth is not None and len(truth):
+                found["full"].append(matched(truth, full))
+                found["sliced"].append(matched(truth, sliced))
+                small.append(np.minimum(truth[:, 2] - truth[:, 0], truth[:, 3] - truth[:, 1]) < SMALL_BOX_PX)
+
+        report = {"images": len(paths), "profile": profile.name, "tile": options["tile"],
+                  "overlap": options["overlap"], "merge": options["merge"], "tiles_per_image": len(offsets)}
+        for mode, timings in rows.items():
+            seconds = np.array([t for t, _ in timings])
+            report[mode] = {
+                "mean_ms": 1000.0 * seconds.mean(),
+                "p95_ms": 1000.0 * np.percentile(seconds, 95),
+                "boxes_per_image": float(np.mean([n for _, n in timings])),
+            }
+            if found[mode]:
+                hits, is_small = np.concatenate(found[mode]), np.concatenate(small)
+                report[mode]["recall"] = float(hits.mean())
+                report[mode]["small_recall"] = float(hits[is_small].mean()) if is_small.any() else None
+        report["sliced"]["merge_ms"] = 1000.0 * float(np.mean(merge_seconds))
+
+        for mode in ("full", "sliced"):
+            r = report[mode]
+            recall = f", recall {r['recall']:.3f} (small {r['small_recall'] or 0:.3f})" if "recall" in r else ""
+            self.stdout.write(f"  {mode:>6}: {r['mean_ms']:.1f} ms/img (p95 {r['p95_ms']:.1f}), "
+                              f"{r['boxes_per_image']:.1f} boxes/img{recall}")
+        self.stdout.write(f"  merge: {report['sliced']['merge_ms']:.2f} ms/img over {len(offsets)} crops")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Sliced inference is {report['sliced']['mean_ms'] / report['full']['mean_ms']:.1f}x the "
+            f"full-frame latency on {len(paths)} images"
+        ))
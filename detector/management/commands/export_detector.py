@@ -0,0 +1,100 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.backends import BACKENDS, export, image_paths, load_images, parity_report, throughput
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the detector weights for a CPU runtime (ONNX Runtime, OpenVINO or "
+        "TorchScript), optionally INT8-quantized, then checks the export against the "
+        "PyTorch model and reports the throughput gain. Select it with DETECTOR_BACKEND."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=[b for b in BACKENDS if b != "pytorch"], default="onnx")
+        parser.add_argument("--weights", help="PyTorch weights (default: DETECTOR_WEIGHTS)")
+        parser.add_argument("--int8", action="store_true", help="INT8 quantization (onnx, openvino)")
+        parser.add_argument("--imgsz", type=int, default=640)
+        parser.add_argument("--data", default=os.path.join("dataset_detection", "data.yaml"),
+                            help="data.yaml whose val split calibrates OpenVINO INT8")
+        parser.add_argument("--images", default=os.path.join("dataset_detection", "images", "val"),
+                            help="Calibration and parity-check images")
+        parser.add_argument("--calib-images", type=int, default=200, help="Images used for INT8 calibration")
+        parser.add_argument("--check-images", type=int, default=50, help="Images used for the parity check")
+        parser.add_argument("--min-recall", type=float, help="Share of PyTorch boxes the export must find "
+                                                             "(default 0.98, INT8 0.90)")
+        parser.add_argument("--max-conf-diff", type=float, help="Largest allowed confidence drift on a matched "
+                                                                "box (default 0.05, INT8 0.15)")
+        parser.add_argument("--skip-check", action="store_true", help="Export only")
+
+    def handle(self, *args, **options):
+        weights = options["weights"] or settings.DETECTOR_WEIGHTS
+        if not os.path.exists(weights):
+            raise CommandError(f"Weights not found: {weights}")
+
+        self.stdout.write(f"📦 Exporting {weights} to {options['format']}{' (INT8)' if options['int8'] else ''}...")
+        try:
+            exported = export(weights, options["format"], imgsz=options["imgsz"], int8=options["int8"],
+                              data=options["data"], calib_dir=options["images"],
+                              calib_images=options["calib_images"])
+        except (ValueError, ImportError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"   -> {exported}")
+        if options["skip_check"]:
+            return
+
+        from ultralytics import YOLO
+
+        paths = image_paths(options["images"], options["check_images"])
+        if not paths:
+            raise CommandError(f"No images to check parity on in {options['images']}")
+        images = load_images(paths)
+        reference = YOLO(weights)
+        candidate = YOLO(str(exported), task="detect")
+
+        report = parity_report(reference, candidate, images, imgsz=options["imgsz"])
+        reference_ips = throughput(reference, images, imgsz=options["imgsz"])
+        candidate_ips = throughput(candidate, images, imgsz=options["imgsz"])
+        report.update({
+            "backend": options["format"],
+            "int8": options["int8"],
+            "reference_images_per_sec": reference_ips,
+            "images_per_sec": candidate_ips,
+            "speedup": candidate_ips / reference_ips if reference_ips else None,
+        })
+
+        min_recall = options["min_recall"] if options["min_recall"] is not None else (0.90 if options["int8"] else 0.98)
+        max_conf_diff = options["max_conf_diff"] if options["max_conf_diff"] is not None else (
+            0.15 if options["int8"] else 0.05)
+        report["passed"] = (
+            report["recall"] >= min_recall
+            and report["precision"] >= min_recall
+            and report["max_conf_diff"] <= max_conf_diff
+        )
+
+        report_path = f"{str(exported).rstrip(os.sep)}.parity.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(
+            f"🔍 Parity on {report['images']} images: recall {report['recall']:.3f}, "
+            f"precision {report['precision']:.3f}, max conf diff {report['max_conf_diff']:.3f}, "
+            f"mean IoU {report['mean_iou']:.3f}"
+        )
+        self.stdout.write(
+            f"⏱️ PyTorch {reference_ips:.2f} img/s -> {options['format']} {candidate_ips:.2f} img/s "
+            f"({report['speedup']:.2f}x), report: {report_path}"
+        )
+        if not report["passed"]:
+            raise CommandError(
+                f"Export is outside tolerance (recall/precision >= {min_recall}, conf diff <= {max_conf_diff}); "
+                f"keep DETECTOR_BACKEND=pytorch"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {exported} matches the PyTorch model; set DETECTOR_BACKEND={options['format']}"
+            f"{' DETECTOR_INT8=1' if options['int8'] else ''} to use it"
+        ))
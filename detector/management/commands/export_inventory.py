@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.export import EXPORT_FORMATS, ExportError, export_stream
+from detector.inventory import filter_scans
+
+
+class Command(BaseCommand):
+    help = "Streams the tree inventory to a CSV, GeoJSON or Parquet file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+        parser.add_argument("--since", help="ISO date/datetime, inclusive")
+        parser.add_argument("--until", help="ISO date/datetime, inclusive")
+        parser.add_argument("--species", help="Comma-separated species names")
+        parser.add_argument("--bbox", help="min_lng,min_lat,max_lng,max_lat")
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ("since", "until", "species", "bbox") if options[key]}
+        try:
+            stream = export_stream(filter_scans(filters), options["format"], gzip=options["gzip"])
+        except (ValueError, ExportError) as e:
+            raise CommandError(str(e))
+
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"✅ Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.fake_streetview import FakeStreetViewServer, parse_errors
+
+
+class Command(BaseCommand):
+    help = "Serves local images in place of the Google Street View Static API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--images", help="Directory of JPEG/PNG images to serve (default: a placeholder frame)")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +- variation of the delay")
+        parser.add_argument("--errors", help='Injected failures, e.g. "503:0.02,429:0.01,not_image:0.005,hang:0.001"')
+        parser.add_argument("--hang-seconds", type=float, default=30.0, help="How long a 'hang' failure stalls")
+        parser.add_argument("--seed", type=int, help="Seed for reproducible latency/error sequences")
+
+    def handle(self, *args, **options):
+        try:
+            errors = parse_errors(options["errors"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        server = FakeStreetViewServer(
+            (options["host"], options["port"]), image_dir=options["images"],
+            latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"], errors=errors,
+            hang_seconds=options["hang_seconds"], seed=options["seed"],
+        )
+        self.stdout.write(f"Fake Street View serving {len(server.images)} image(s) at {server.base_url}")
+        if options["latency_ms"] or errors:
+            self.stdout.write(f"Injecting {options['latency_ms']:.0f}+-{options['jitter_ms']:.0f} ms latency, "
+                              f"errors: {errors or 'none'}")
+        self.stdout.write(f"Run Django with STREETVIEW_API_URL={server.base_url} to use it.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Responses: {server.responses}")
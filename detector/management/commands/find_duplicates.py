@@ -0,0 +1,55 @@
+import csv
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.dedup import find_leaks, image_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports near-duplicate images across the splits of a YOLO dataset (train/val/test "
+        "leakage) using perceptual hashes. Hashes are cached in <dataset>/hash_index.npz."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", default="dataset_detection", help="Dataset root with images/<split>/")
+        parser.add_argument("--splits", default="train,val,test", help="Splits to compare, in order")
+        parser.add_argument("--max-distance", type=int, default=None,
+                            help="Hamming bits on both hashes (default: DEDUP_MAX_DISTANCE)")
+        parser.add_argument("--workers", type=int, help="Hashing processes (default: one per CPU)")
+        parser.add_argument("--output", "-o", help="Write every leaking pair to this CSV")
+
+    def handle(self, *args, **options):
+        max_distance = options["max_distance"]
+        if max_distance is None:
+            max_distance = settings.DEDUP_MAX_DISTANCE
+        split_paths = {
+            split: image_files(os.path.join(options["dataset"], "images", split))
+            for split in options["splits"].split(",")
+        }
+        if not any(split_paths.values()):
+            raise CommandError(f"No images found under {options['dataset']}/images/")
+        self.stdout.write("🔎 Hashing " + ", ".join(f"{len(p)} {s}" for s, p in split_paths.items()) + " images...")
+
+        leaks = find_leaks(split_paths, max_distance, options["workers"],
+                           index_path=os.path.join(options["dataset"], "hash_index.npz"))
+
+        pairs = Counter((a, b) for a, _, b, _, _ in leaks)
+        for (a, b), count in sorted(pairs.items()):
+            leaked = len({path for sa, _, sb, path, _ in leaks if (sa, sb) == (a, b)})
+            self.stdout.write(f"  {b} → {a}: {leaked} {b} image(s) near-duplicate a {a} image ({count} pairs)")
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["split_a", "image_a", "split_b", "image_b", "distance"])
+                writer.writerows(leaks)
+            self.stdout.write(f"📄 Pairs written to {options['output']}")
+
+        if leaks:
+            self.stdout.write(self.style.WARNING(f"⚠️ {len(leaks)} cross-split near-duplicate pairs "
+                                                 f"within {max_distance} bits"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ No cross-split near-duplicates within {max_distance} bits"))
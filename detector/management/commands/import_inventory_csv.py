@@ -0,0 +1,68 @@
+import csv
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from detector.inventory import TIMESTAMP_FORMAT, parse_counts_string
+from detector.models import Detection, Scan
+
+
+class Command(BaseCommand):
+    help = "One-shot migration of media/logs/treeInventory.csv into the inventory database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?",
+            default=os.path.join(settings.MEDIA_ROOT, "logs", "treeInventory.csv"),
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"CSV not found: {path}")
+
+        # Rows already imported (same timestamp + position) are skipped, so re-running is safe
+        existing = set(Scan.objects.values_list("timestamp", "latitude", "longitude"))
+        imported = skipped = 0
+        batch = []
+
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                timestamp = timezone.make_aware(datetime.strptime(row["Timestamp"], TIMESTAMP_FORMAT))
+                lat, lng = float(row["Latitude"]), float(row["Longitude"])
+                if (timestamp, lat, lng) in existing:
+                    skipped += 1
+                    continue
+                existing.add((timestamp, lat, lng))
+
+                counts = parse_counts_string(row["Counts"])
+                batch.append((
+                    Scan(timestamp=timestamp, latitude=lat, longitude=lng,
+                         total_trees=int(row["Total_Trees"]), counts=counts),
+                    counts,
+                ))
+                if len(batch) >= options["batch_size"]:
+                    imported += self._flush(batch)
+                    batch = []
+        imported += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Imported {imported} scans ({skipped} already present)"))
+
+    def _flush(self, batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            scans = Scan.objects.bulk_create([scan for scan, _ in batch])
+            # The CSV only has per-species counts, so each tree becomes a box without geometry
+            Detection.objects.bulk_create([
+                Detection(scan=scan, species=label)
+                for scan, counts in zip(scans, (counts for _, counts in batch))
+                for label, count in counts.items()
+                for _ in range(count)
+            ])
+        return len(batch)
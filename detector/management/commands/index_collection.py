@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from detector.dedup import CollectionIndex, collection_dir
+from detector.models import CollectedImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Hashes dataset_collection/ into the table behind the save-time near-duplicate check. "
+        "Run it once before serving, and again after frames are copied in or deleted by hand; "
+        "only new or changed files are hashed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Hashing threads")
+
+    def handle(self, *args, **options):
+        root = collection_dir()
+        self.stdout.write(f"🔎 Indexing {root}...")
+        start = time.perf_counter()
+        hashed = CollectionIndex().sync(root, options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {CollectedImage.objects.count()} collected frames indexed "
+            f"({hashed} hashed in {time.perf_counter() - start:.1f}s)"
+        ))
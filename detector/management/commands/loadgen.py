@@ -0,0 +1,104 @@
+import json
+import os
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.benchmarking import BENCH_ORIGIN, scratch_inventory, stub_streetview
+from detector.fake_streetview import parse_errors
+from detector.loadgen import ClientTarget, HTTPTarget, generate_sequence, load_sequence, run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays scan requests against the app at a target rate and reports latency "
+        "percentiles, errors and achieved RPS. Targets a running server (--url) or the "
+        "Django stack in this process, optionally behind an in-process fake Street View server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sequence", help="JSONL of requests ({\"path\", \"body\"} or bare scan bodies)")
+        parser.add_argument("--generate", type=int, default=200, help="Requests to generate when no --sequence")
+        parser.add_argument("--sessions", type=int, default=4, help="Simulated users in a generated sequence")
+        parser.add_argument("--origin", help="lat,lng around which generated sessions scan")
+        parser.add_argument("--profile", help="Inference profile for generated requests")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--rps", type=float, default=5.0, help="Target requests per second")
+        parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000 "
+                                          "(default: in-process Django test client)")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout with --url")
+        parser.add_argument("--fake-streetview", action="store_true",
+                            help="In-process only: serve imagery from a local fake server with the caches off")
+        parser.add_argument("--images", help="Images for --fake-streetview")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake server latency")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Fake server latency jitter")
+        parser.add_argument("--errors", help='Fake server failures, e.g. "503:0.02,429:0.01"')
+        parser.add_argument("--keep-scans", action="store_true",
+                            help="In-process only: keep the scans and trees the run logs (by default the "
+                                 "ones within 0.5° of its first pose are deleted afterwards)")
+        parser.add_argument("--output", "-o", help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        if options["rps"] <= 0:
+            raise CommandError("--rps must be positive")
+        if options["url"] and (options["fake_streetview"] or options["keep_scans"]):
+            raise CommandError("--fake-streetview and --keep-scans only apply to in-process runs; "
+                               "start `manage.py fake_streetview` and point the server's STREETVIEW_API_URL at it")
+        try:
+            errors = parse_errors(options["errors"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["sequence"]:
+            sequence = load_sequence(options["sequence"])
+        else:
+            origin = tuple(float(v) for v in options["origin"].split(",")) if options["origin"] else BENCH_ORIGIN
+            sequence = generate_sequence(options["generate"], options["sessions"], origin,
+                                         options["profile"], options["seed"])
+        if not sequence:
+            raise CommandError("Empty request sequence")
+
+        self.stdout.write(f"🚦 {len(sequence)} requests at {options['rps']:g} req/s "
+                          f"against {options['url'] or 'the in-process app'}...")
+        if options["url"]:
+            report = run_load(sequence, HTTPTarget(options["url"], options["timeout"]), options["rps"],
+                              options["concurrency"])
+        else:
+            report = self._run_in_process(sequence, options, errors)
+
+        latency = report["latency"]
+        if latency["count"]:
+            self.stdout.write(f"  latency p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, "
+                              f"p99 {latency['p99_ms']:.0f} ms, max {latency['max_ms']:.0f} ms")
+        self.stdout.write(f"  achieved {report['achieved_rps']:.2f} req/s, errors {report['error_rate']:.1%} "
+                          f"{report['errors'] or ''}, degraded {report['degraded']}, cached {report['cached']}")
+        if report["late_dispatches"]:
+            self.stdout.write(self.style.WARNING(
+                f"  {report['late_dispatches']} requests were sent late (max {report['max_dispatch_lag_ms']:.0f} ms): "
+                f"the generator could not keep up, raise --concurrency"
+            ))
+
+        if options["output"]:
+            os.makedirs(os.path.dirname(options["output"]) or ".", exist_ok=True)
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Load report written to {options['output']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Load test finished"))
+
+    def _run_in_process(self, sequence, options, errors):
+        target = ClientTarget()
+        # Scans logged near where the sequence starts are the run's own
+        origin = next(((float(r["body"]["lat"]), float(r["body"]["lng"])) for r in sequence
+                       if "lat" in r["body"] and "lng" in r["body"]), BENCH_ORIGIN)
+        cleanup = nullcontext() if options["keep_scans"] else scratch_inventory(origin)
+        with cleanup:
+            if not options["fake_streetview"]:
+                return run_load(sequence, target, options["rps"], options["concurrency"])
+            with stub_streetview(options["images"], latency_ms=options["latency_ms"],
+                                 jitter_ms=options["jitter_ms"], errors=errors, seed=options["seed"]) as server:
+                report = run_load(sequence, target, options["rps"], options["concurrency"])
+                report["streetview_responses"] = dict(server.responses)
+                return report
+
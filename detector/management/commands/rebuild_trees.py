@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from detector.models import Detection, Scan, Tree
+from detector.spatial import locate_detections
+
+
+class Command(BaseCommand):
+    help = "Re-derives de-duplicated trees from every logged detection (e.g. after changing TREE_MERGE_RADIUS_M)."
+
+    def handle(self, *args, **options):
+        new_trees = 0
+        with transaction.atomic():
+            Detection.objects.update(tree=None, est_latitude=None, est_longitude=None)
+            Tree.objects.all().delete()
+
+            # Chronological replay, so first_seen/last_seen come out right
+            scans = Scan.objects.exclude(heading=None).order_by("timestamp", "id")
+            for scan in scans.iterator(chunk_size=500):
+                new_trees += locate_detections(scan, list(scan.detections.all()))
+
+        total = Detection.objects.exclude(tree=None).count()
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} detections merged into {new_trees} trees"))
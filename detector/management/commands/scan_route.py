@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.imagery import StreetViewError, fetch_streetview, pose_key
+from detector.inference import decode_image, extract_detections
+from detector.inventory import record_scan
+from detector.model_registry import get_model
+from detector.profiles import get_profile
+from detector.ratelimit import TokenBucket
+from detector.routes import parse_polyline, route_poses, sample_bbox, sample_polyline
+
+
+class Command(BaseCommand):
+    help = (
+        "Scans every Street View pose along a polyline or over a bounding box and logs "
+        "the detections to the inventory. Progress is checkpointed, so an interrupted "
+        "job resumes where it stopped when re-run with the same arguments."
+    )
+
+    def add_arguments(self, parser):
+        area = parser.add_mutually_exclusive_group(required=True)
+        area.add_argument("--polyline", help='"lat,lng;lat,lng;..." route to sweep')
+        area.add_argument("--bbox", help="min_lng,min_lat,max_lng,max_lat area to sweep")
+        parser.add_argument("--spacing", type=float, default=20.0, help="Metres between sample points")
+        parser.add_argument("--heading-step", type=float, default=90.0, help="Degrees between headings at each point")
+        parser.add_argument("--pitch", type=float, default=0.0)
+        parser.add_argument("--fov", type=float, default=90.0)
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent image fetches")
+        parser.add_argument("--rps", type=float, default=10.0, help="Max Street View requests per second")
+        parser.add_argument("--batch-size", type=int, default=8, help="Images per model.predict call")
+        parser.add_argument("--conf", type=float, default=0.25)
+        parser.add_argument("--augment", action="store_true", help="Test-time augmentation (slower)")
+        parser.add_argument("--profile", choices=sorted(settings.DETECTOR_PROFILES),
+                            help="Inference profile; overrides --conf/--augment and picks its weights")
+        parser.add_argument("--checkpoint", help="Progress file (default: media/route_jobs/<job id>.jsonl)")
+        parser.add_argument("--dry-run", action="store_true", help="Only print how many poses would be scanned")
+
+    def handle(self, *args, **options):
+        try:
+            if options["polyline"]:
+                points = sample_polyline(parse_polyline(options["polyline"]), options["spacing"])
+            else:
+                min_lng, min_lat, max_lng, max_lat = (float(v) for v in options["bbox"].split(","))
+                points = sample_bbox(min_lng, min_lat, max_lng, max_lat, options["spacing"])
+        except ValueError as e:
+            raise CommandError(f"Invalid area: {e}")
+        poses = route_poses(points, options["heading_step"], options["pitch"], options["fov"])
+
+        checkpoint_path = options["checkpoint"] or self._default_checkpoint(options)
+        done = self._load_checkpoint(checkpoint_path)
+        pending = [pose for pose in poses if pose_key(*pose) not in done]
+        self.stdout.write(
+            f"📍 {len(points)} points x {len(poses) // max(len(points), 1)} headings = {len(poses)} poses "
+            f"({len(poses) - len(pending)} already done, checkpoint: {checkpoint_path})"
+        )
+        if options["dry_run"] or not pending:
+            return
+
+        if options["profile"]:
+            profile = get_profile(options["profile"])
+            self.model = get_model(profile.weights)
+            self.params = profile.params()
+        else:
+            self.model = get_model()
+            self.params = {"conf": options["conf"], "imgsz": 640, "augment": options["augment"]}
+        self.stats = {"scanned": 0, "logged": 0, "detections": 0, "new_trees": 0, "failed": 0}
+        limiter = TokenBucket(options["rps"])
+
+        started = time.perf_counter()
+        batch = []
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool, \
+                self._open_checkpoint(checkpoint_path) as self.checkpoint:
+            for pose, image in self._fetch_all(pool, pending, limiter, window=options["workers"] * 2):
+                if image is None:
+                    # Left out of the checkpoint so a re-run retries it
+                    self.stats["failed"] += 1
+                    continue
+                batch.append((pose, image))
+                if len(batch) >= options["batch_size"]:
+                    self._process(batch, len(pending))
+                    batch = []
+            if batch:
+                self._process(batch, len(pending))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Scanned {self.stats['scanned']} poses in {elapsed:.1f}s "
+            f"({self.stats['scanned'] / elapsed:.2f}/s): {self.stats['detections']} detections, "
+            f"{self.stats['new_trees']} new trees, {self.stats['failed']} failed fetches"
+        ))
+
+    # --- Fetching ---
+
+    def _fetch_one(self, pose, limiter):
+        limiter.acquire()
+        try:
+            return decode_image(fetch_streetview(*pose))
+        except (StreetViewError, requests.RequestException, OSError) as e:
+            self.stderr.write(f"⚠️ Fetch failed for {pose}: {e}")
+            return None
+
+    def _fetch_all(self, pool, poses, limiter, window):
+        """Yields (pose, image) as fetches finish, keeping at most `window` in flight."""
+        poses = iter(poses)
+        in_flight = {}
+        for pose in poses:
+            in_flight[pool.submit(self._fetch_one, pose, limiter)] = pose
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield in_flight.pop(future), future.result()
+                next_pose = next(poses, None)
+                if next_pose is not None:
+                    in_flight[pool.submit(self._fetch_one, next_pose, limiter)] = next_pose
+
+    # --- Detection + logging ---
+
+    def _process(self, batch, total):
+        results = self.model.predict([image for _, image in batch], verbose=False, **self.params)
+        keys = []
+        for (pose, _), result in zip(batch, results):
+            lat, lng, heading, pitch, fov = pose
+            detections, counts = extract_detections(result, self.model.names)
+            if detections:
+                scan = record_scan(lat, lng, detections, heading=heading, pitch=pitch, fov=fov, counts=counts)
+                self.stats["logged"] += 1
+                self.stats["detections"] += len(detections)
+                self.stats["new_trees"] += scan.new_trees
+            keys.append(pose_key(*pose))
+        self.stats["scanned"] += len(batch)
+        self._save_checkpoint(keys)
+        self.stdout.write(f"  {self.stats['scanned']}/{total} poses, {self.stats['detections']} detections")
+
+    # --- Checkpoints ---
+
+    def _default_checkpoint(self, options):
+        job = json.dumps(
+            {k: options[k] for k in ("polyline", "bbox", "spacing", "heading_step", "pitch", "fov")},
+            sort_keys=True,
+        )
+        job_id = hashlib.sha1(job.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(settings.MEDIA_ROOT, "route_jobs", f"{job_id}.jsonl")
+
+    def _load_checkpoint(self, path):
+        """Pose keys of every batch logged so far (one JSON line per batch)."""
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.update(json.loads(line)["done"])
+                except (ValueError, KeyError):
+                    pass  # a line cut short by a crash: those poses are simply redone
+        return done
+
+    def _open_checkpoint(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        f = open(path, "a+", encoding="utf-8")
+        if f.tell():
+            f.seek(f.tell() - 1)
+            if f.read(1) != "\n":
+                f.write("\n")  # don't glue the next batch onto a line cut short by a crash
+        return f
+
+    def _save_checkpoint(self, keys):
+        # Append only this batch, so the cost per batch doesn't grow with the route
+        self.checkpoint.write(json.dumps({"done": keys, "stats": self.stats}) + "\n")
+        self.checkpoint.flush()
@@ -0,0 +1,207 @@
+"""
+Process-wide scan metrics in the Prometheus text format (served on /metrics).
+
+Counters and histograms are plain in-memory objects behind a lock: recording
+a sample is a dict lookup, a bisect and two additions, so they stay on in
+production. Numbers that other modules already keep (cache hit/miss counts,
+batching queue stats, model load times) are not double-counted on the hot
+path; collectors read them when /metrics is scraped.
+
+Each worker process reports its own numbers; scrape every worker (or put the
+workers behind a multiprocess-aware exporter) for a host-wide view.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Stage durations of the request being handled ({stage: seconds}), for the
+# per-request structured log line written by RequestIDMiddleware
+request_stages = contextvars.ContextVar("request_stages", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def _samples(self):
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_collector(fn):
+    """Registers fn() -> [(name, kind, help, [(labels dict, value), ...]), ...], read on scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    for collector in _collectors:
+        for name, kind, documentation, samples in collector():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Scan pipeline metrics ---
+
+STAGE_SECONDS = Histogram(
+    "treeid_stage_seconds", "Time spent in each scan pipeline stage.", ["stage"],
+)
+REQUESTS = Counter(
+    "treeid_http_requests_total", "HTTP requests handled, by view and status.", ["view", "method", "status"],
+)
+REQUEST_SECONDS = Histogram(
+    "treeid_http_request_seconds", "End-to-end request latency, by view.", ["view"],
+)
+STREETVIEW_ERRORS = Counter(
+    "treeid_streetview_errors_total", "Failed Street View API calls, by reason.", ["reason"],
+)
+DETECTIONS = Counter(
+    "treeid_detections_total", "Trees logged to the inventory, by species.", ["species"],
+)
+
+
+@contextmanager
+def stage(name):
+    """Times a block as pipeline stage `name` (histogram + the request's log line)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@register_collector
+def _component_metrics():
+    """Counters the caches, the batcher and the model registry already keep."""
+    from .batching import get_scheduler
+    from .imagery import get_cache
+    from .model_registry import stats as model_stats
+    from .result_cache import get_result_cache
+
+    families = []
+    cache_samples = []
+    for cache_name, cache in (("streetview", get_cache()), ("detections", get_result_cache())):
+        if cache is not None:
+            cache_stats = cache.stats()
+            cache_samples += [({"cache": cache_name, "result": "hit"}, cache_stats["hits"]),
+                              ({"cache": cache_name, "result": "miss"}, cache_stats["misses"])]
+    families.append(("treeid_cache_lookups_total", "counter", "Cache lookups, by cache and result.", cache_samples))
+
+    batching = get_scheduler().metrics()
+    families += [
+        ("treeid_inference_queue_depth", "gauge", "Images waiting for batched inference.",
+         [({}, batching["queue_depth"])]),
+        ("treeid_inference_rejected_total", "counter", "Scans turned away with HTTP 429 (queue full).",
+         [({}, batching["rejected"])]),
+        ("treeid_inference_batches_total", "counter", "Batched predict calls.", [({}, batching["batches"])]),
+        ("treeid_inference_images_total", "counter", "Images run through batched inference.",
+         [({}, batching["images"])]),
+    ]
+
+    loaded = model_stats()
+    families += [
+        ("treeid_model_load_seconds", "gauge", "Time to load each detector model.",
+         [({"weights": path}, timings["load_seconds"]) for path, timings in loaded.items()]),
+        ("treeid_model_warmup_seconds", "gauge", "Time to warm up each detector model.",
+         [({"weights": path}, timings["warmup_seconds"]) for path, timings in loaded.items()]),
+    ]
+    return families
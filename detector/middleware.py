@@ -0,0 +1,110 @@
+"""
+Request IDs, request metrics and structured request logs.
+
+Every request gets an ID (the caller's X-Request-ID, or a new one), echoed in
+the response and attached to every log record written while it is handled
+(RequestIDFilter). When the request finishes, one JSON log line records the
+view, status, total time and the time spent in each scan stage.
+"""
+import contextvars
+import json
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import REQUEST_SECONDS, REQUESTS, request_stages
+
+logger = logging.getLogger("detector.requests")
+
+request_id = contextvars.ContextVar("request_id", default="-")
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIDMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        tokens, started = self._start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, tokens, started)
+
+    async def _acall(self, request):
+        tokens, started = self._start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, tokens, started)
+
+    def _start(self, request):
+        incoming = request.headers.get("X-Request-ID", "")
+        request.request_id = incoming if _VALID_ID.match(incoming) else uuid.uuid4().hex
+        tokens = (request_id.set(request.request_id), request_stages.set({}))
+        return tokens, time.perf_counter()
+
+    def _finish(self, request, response, tokens, started):
+        elapsed = time.perf_counter() - started
+        # URL names keep the label set small (no raw paths in the metrics)
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match is not None and match.url_name else "other"
+        status = response.status_code if response is not None else 500
+        REQUESTS.inc(view=view, method=request.method, status=status)
+        REQUEST_SECONDS.observe(elapsed, view=view)
+
+        if response is not None:
+            response["X-Request-ID"] = request.request_id
+        if view != "metrics":
+            logger.info("request", extra={"fields": {
+                "method": request.method,
+                "path": request.path,
+                "view": view,
+                "status": status,
+                "duration_ms": round(1000.0 * elapsed, 1),
+                "stages_ms": {name: round(1000.0 * s, 1) for name, s in request_stages.get().items()},
+            }})
+
+        id_token, stages_token = tokens
+        request_stages.reset(stages_token)
+        request_id.reset(id_token)
+
+
+class RequestIDFilter(logging.Filter):
+    """Adds `request_id` to every log record ("-" outside a request)."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request_id, message and any `fields`."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
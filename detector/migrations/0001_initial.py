@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Scan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('pitch', models.FloatField(blank=True, null=True)),
+                ('fov', models.FloatField(blank=True, null=True)),
+                ('total_trees', models.PositiveIntegerField(default=0)),
+                ('counts', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='detector_sc_timesta_ed60c6_idx'), models.Index(fields=['latitude', 'longitude'], name='detector_sc_latitud_dcbc1b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Detection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('species', models.CharField(max_length=64)),
+                ('class_id', models.SmallIntegerField(blank=True, null=True)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('x1', models.FloatField(blank=True, null=True)),
+                ('y1', models.FloatField(blank=True, null=True)),
+                ('x2', models.FloatField(blank=True, null=True)),
+                ('y2', models.FloatField(blank=True, null=True)),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detections', to='detector.scan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['species', 'scan'], name='detector_de_species_7de53c_idx')],
+            },
+        ),
+    ]
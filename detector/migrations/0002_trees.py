@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='est_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='est_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Tree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('species', models.CharField(max_length=64)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('observations', models.PositiveIntegerField(default=1)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cell_x', 'cell_y', 'species'], name='detector_tr_cell_x_28dcb6_idx'), models.Index(fields=['species'], name='detector_tr_species_141900_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='tree',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='detections', to='detector.tree'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0002_trees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=512, unique=True)),
+                ('mtime_ns', models.BigIntegerField(default=0)),
+                ('phash', models.BigIntegerField()),
+                ('dhash', models.BigIntegerField()),
+            ],
+        ),
+    ]
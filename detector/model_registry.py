@@ -0,0 +1,93 @@
+"""
+Per-process registry for the YOLOv10 detector.
+
+Weights are loaded on first use (or from the startup hook in apps.py when
+DETECTOR_PRELOAD is on), warmed up with a dummy inference, and then shared by
+every request handled by this worker.
+
+`weights` is always the PyTorch best.pt path; DETECTOR_BACKEND decides which
+export of it is actually loaded (see backends.py).
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .backends import resolve_weights
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_models = {}  # weights path -> loaded YOLO model
+_stats = {}   # weights path -> {"load_seconds": ..., "warmup_seconds": ...}
+
+
+def get_model(weights=None):
+    """Returns the shared model for `weights`, loading it on first use."""
+    path = resolve_weights(weights)
+    model = _models.get(path)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited on the lock
+        model = _models.get(path)
+        if model is None:
+            model = _load(path)
+            _models[path] = model
+    return model
+
+
+def preload(weights=None):
+    """Startup hook: loads and warms up the model before the first request."""
+    return get_model(weights)
+
+
+def is_loaded(weights=None):
+    return resolve_weights(weights) in _models
+
+
+def stats():
+    """Load and warm-up timings for every model loaded in this process."""
+    return {path: dict(timings) for path, timings in _stats.items()}
+
+
+def _load(path):
+    if not os.path.exists(path):
+        if path.endswith(".pt"):
+            raise FileNotFoundError(f"{path} not found; train it or point the profile's weights elsewhere")
+        raise FileNotFoundError(
+            f"{path} not found; create it with `manage.py export_detector --format {settings.DETECTOR_BACKEND}`"
+        )
+
+    # Imported here so manage.py commands and tests never pay for torch/ultralytics
+    from ultralytics import YOLO
+
+    start = time.perf_counter()
+    # Exported models don't always carry the task in their metadata
+    model = YOLO(path, task="detect")
+    load_seconds = time.perf_counter() - start
+
+    warmup_seconds = _warm_up(model)
+    _stats[path] = {"load_seconds": load_seconds, "warmup_seconds": warmup_seconds}
+    logger.info("Loaded detector %s in %.2fs (warm-up %.2fs)", path, load_seconds, warmup_seconds)
+    return model
+
+
+def _warm_up(model):
+    """Runs dummy inferences so the first real scan doesn't pay kernel set-up."""
+    runs = settings.DETECTOR_WARMUP_RUNS
+    if runs <= 0:
+        return 0.0
+
+    import numpy as np
+
+    imgsz = settings.DETECTOR_WARMUP_IMGSZ
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(dummy, imgsz=imgsz, verbose=False)
+    return time.perf_counter() - start
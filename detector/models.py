@@ -1,3 +1,83 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class Scan(models.Model):
+    """One logged scan (a row of the old treeInventory.csv)."""
+    timestamp = models.DateTimeField(default=timezone.now)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    heading = models.FloatField(null=True, blank=True)
+    pitch = models.FloatField(null=True, blank=True)
+    fov = models.FloatField(null=True, blank=True)
+    total_trees = models.PositiveIntegerField(default=0)
+    # Per-species counts, e.g. {"Angsana": 2, "Rain Tree": 1}
+    counts = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["-timestamp", "-id"]
+        indexes = [
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["latitude", "longitude"]),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M:%S} ({self.latitude}, {self.longitude}): {self.total_trees} trees"
+
+
+class Tree(models.Model):
+    """A physical tree, merged from every sighting of the same species nearby."""
+    species = models.CharField(max_length=64)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    # Grid cell of (latitude, longitude), see detector/spatial.py
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    observations = models.PositiveIntegerField(default=1)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cell_x", "cell_y", "species"]),
+            models.Index(fields=["species"]),
+        ]
+
+    def __str__(self):
+        return f"{self.species} at ({self.latitude:.6f}, {self.longitude:.6f})"
+
+
+class Detection(models.Model):
+    """A single detected box. Boxes imported from the CSV have no geometry."""
+    scan = models.ForeignKey(Scan, related_name="detections", on_delete=models.CASCADE)
+    species = models.CharField(max_length=64)
+    class_id = models.SmallIntegerField(null=True, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    x1 = models.FloatField(null=True, blank=True)
+    y1 = models.FloatField(null=True, blank=True)
+    x2 = models.FloatField(null=True, blank=True)
+    y2 = models.FloatField(null=True, blank=True)
+    # Approximate ground position of the box and the tree it was merged into
+    est_latitude = models.FloatField(null=True, blank=True)
+    est_longitude = models.FloatField(null=True, blank=True)
+    tree = models.ForeignKey(Tree, related_name="detections", null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["species", "scan"]),
+        ]
+
+    def __str__(self):
+        return f"{self.species} ({self.confidence or 0:.2f})"
+
+
+class CollectedImage(models.Model):
+    """Perceptual hashes of a frame saved into dataset_collection/ (see detector/dedup.py)."""
+    path = models.CharField(max_length=512, unique=True)
+    mtime_ns = models.BigIntegerField(default=0)
+    # 64-bit hashes, stored as signed integers
+    phash = models.BigIntegerField()
+    dhash = models.BigIntegerField()
+
+    def __str__(self):
+        return self.path
@@ -0,0 +1,67 @@
+"""
+Panorama scans: N headings around one location in a single request.
+
+Views overlap whenever heading_step < fov, so a tree near a seam shows up in
+two frames. Every box is mapped to the compass bearings its left and right
+edges span; boxes of the same class from different views whose bearing
+intervals overlap by at least PANORAMA_MERGE_IOU are one tree, and only the
+most confident box is kept.
+"""
+import numpy as np
+
+
+def bearing_intervals(detections, headings, fov, width=640):
+    """(start, end) bearings of each box, unwrapped so that end >= start.
+
+    Same projection as spatial.box_bearing, over all boxes at once."""
+    views = np.fromiter((d["view"] for d in detections), dtype=np.intp, count=len(detections))
+    xyxy = np.array([d["xyxy"] for d in detections], dtype=np.float64).reshape(-1, 4)
+    heading = np.asarray(headings, dtype=np.float64)[views]
+    half = np.tan(np.radians(fov) / 2.0)
+    starts = (heading + np.degrees(np.arctan((2.0 * xyxy[:, 0] / width - 1.0) * half))) % 360.0
+    ends = (heading + np.degrees(np.arctan((2.0 * xyxy[:, 2] / width - 1.0) * half))) % 360.0
+    ends = np.where(ends < starts, ends + 360.0, ends)
+    return starts, ends
+
+
+def _angular_iou(start, end, starts, ends):
+    """IoU of one interval against many, trying the +-360 shifts for wrap-around."""
+    best = np.zeros(len(starts))
+    for shift in (-360.0, 0.0, 360.0):
+        s, e = starts + shift, ends + shift
+        inter = np.clip(np.minimum(end, e) - np.maximum(start, s), 0.0, None)
+        union = (end - start) + (e - s) - inter
+        best = np.maximum(best, np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0))
+    return best
+
+
+def merge_views(detections, headings, fov, iou_threshold=0.3, width=640):
+    """Drops seam duplicates from per-view detections (each tagged with "view").
+
+    Returns the kept detections, each annotated with its "bearing" (centre)."""
+    if not detections:
+        return []
+
+    starts, ends = bearing_intervals(detections, headings, fov, width)
+    classes = np.array([d["class"] for d in detections])
+    views = np.array([d["view"] for d in detections])
+    order = np.argsort(-np.array([d["confidence"] for d in detections]), kind="stable")
+
+    suppressed = np.zeros(len(detections), dtype=bool)
+    kept = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        kept.append(i)
+        # Same class, different view (boxes within one view were already NMS'd by the model)
+        candidates = (~suppressed) & (classes == classes[i]) & (views != views[i])
+        iou = _angular_iou(starts[i], ends[i], starts, ends)
+        suppressed |= candidates & (iou >= iou_threshold)
+        suppressed[i] = True
+
+    merged = []
+    for i in kept:
+        d = dict(detections[i])
+        d["bearing"] = round(float(((starts[i] + ends[i]) / 2.0) % 360.0), 1)
+        merged.append(d)
+    return merged
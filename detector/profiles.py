@@ -0,0 +1,96 @@
+"""
+Inference profiles: named accuracy/latency tiers.
+
+Each profile fixes the weights and the predict parameters (imgsz, conf,
+test-time augmentation). A scan picks one with "profile"; otherwise the
+server's DETECTOR_DEFAULT_PROFILE is used. Under load (the batching queue wait
+is over DETECTOR_SLO_MS) scans that asked for a slower tier are served with
+DETECTOR_FALLBACK_PROFILE instead, and the response says so (unless the
+fallback's weights are missing, in which case scans keep their tier).
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+from .backends import supports_augment, weights_exist
+
+logger = logging.getLogger(__name__)
+
+
+class Profile:
+    __slots__ = ("name", "weights", "imgsz", "conf", "augment")
+
+    def __init__(self, name, weights, imgsz=640, conf=0.25, augment=False):
+        self.name = name
+        self.weights = str(weights)
+        self.imgsz = int(imgsz)
+        self.conf = float(conf)
+        self.augment = bool(augment)
+
+    def params(self):
+        """Keyword arguments for model.predict() (TTA only when the PyTorch weights are served)."""
+        augment = self.augment and supports_augment(self.weights)
+        return {"conf": self.conf, "imgsz": self.imgsz, "augment": augment}
+
+    def available(self):
+        """Whether this profile's weights are on disk, so the registry can load them."""
+        return weights_exist(self.weights)
+
+    def __repr__(self):
+        return f"Profile({self.name!r}, {self.weights!r}, {self.params()})"
+
+
+def get_profiles():
+    return {name: Profile(name, **options) for name, options in settings.DETECTOR_PROFILES.items()}
+
+
+def get_profile(name=None):
+    """The named profile (default: DETECTOR_DEFAULT_PROFILE); KeyError if unknown."""
+    return get_profiles()[name or settings.DETECTOR_DEFAULT_PROFILE]
+
+
+_lock = threading.Lock()
+_served = {}    # profile name -> scans served with it
+_degraded = 0   # scans moved to the fallback profile
+_missing = set()  # fallback profiles already reported as having no weights
+
+
+def queue_latency_ms():
+    from .batching import get_scheduler
+
+    return get_scheduler().queue_latency_ms()
+
+
+def choose_profile(requested=None):
+    """(profile, degraded) for one scan, degrading to the fallback tier when over the SLO."""
+    global _degraded
+    profile = get_profile(requested)
+    degraded = False
+
+    fallback = settings.DETECTOR_FALLBACK_PROFILE
+    if (settings.DETECTOR_BATCHING and settings.DETECTOR_SLO_MS > 0 and profile.name != fallback
+            and queue_latency_ms() > settings.DETECTOR_SLO_MS):
+        candidate = get_profile(fallback)
+        if candidate.available():
+            profile, degraded = candidate, True
+        elif fallback not in _missing:
+            _missing.add(fallback)
+            logger.warning("Over the SLO but the %r profile's weights (%s) are missing; "
+                           "scans keep their requested profile", fallback, candidate.weights)
+
+    with _lock:
+        _served[profile.name] = _served.get(profile.name, 0) + 1
+        _degraded += degraded
+    return profile, degraded
+
+
+def stats():
+    with _lock:
+        return {
+            "default": settings.DETECTOR_DEFAULT_PROFILE,
+            "fallback": settings.DETECTOR_FALLBACK_PROFILE,
+            "slo_ms": settings.DETECTOR_SLO_MS,
+            "served": dict(_served),
+            "degraded": _degraded,
+        }
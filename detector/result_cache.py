@@ -0,0 +1,150 @@
+"""
+In-process cache of detection results.
+
+Entries are keyed by the image content hash, a fingerprint of the weights file
+and the inference parameters, so re-scanning an identical frame skips the
+model entirely. Retraining (a new best.pt) or re-exporting changes the
+fingerprint, so old entries can no longer match; the first lookup that sees
+the new fingerprint also drops every entry computed with the old weights.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .inference import label_counts
+
+_fingerprints = {}  # weights path -> ((mtime_ns, size), sha1 hex)
+_fingerprint_lock = threading.Lock()
+
+
+def _weights_files(path):
+    """The weights file, or every file of an exported model directory (OpenVINO)."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(path) for name in names)
+    return [path]
+
+
+def weights_fingerprint(path):
+    """SHA-1 of the weights file(s), recomputed only when their mtime/size change."""
+    path = str(path)
+    try:
+        files = _weights_files(path)
+        stamp = tuple((os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+    except FileNotFoundError:
+        return "missing"
+
+    with _fingerprint_lock:
+        known = _fingerprints.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+
+        digest = hashlib.sha1()
+        for name in files:
+            with open(name, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        _fingerprints[path] = (stamp, digest.hexdigest())
+        return digest.hexdigest()
+
+
+def result_key(content, weights, params):
+    """Cache key for one image (raw bytes) run through `weights` with `params`."""
+    digest = hashlib.sha1(content)
+    digest.update(weights_fingerprint(weights).encode("ascii"))
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CachedResult:
+    __slots__ = ("weights", "fingerprint", "detections", "annotated", "counts")
+
+    def __init__(self, weights, fingerprint, detections, annotated, counts):
+        self.weights = weights
+        self.fingerprint = fingerprint
+        self.detections = detections
+        self.annotated = annotated  # list of JPEG bytes, or None if never rendered
+        self.counts = counts  # {label: count}
+
+
+class ResultCache:
+    def __init__(self, max_entries):
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._fingerprints = {}  # weights path -> fingerprint of the entries cached for it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, weights):
+        weights = str(weights)
+        fingerprint = weights_fingerprint(weights)
+        with self._lock:
+            self._check_fingerprint(weights, fingerprint)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, weights, detections, annotated=None, counts=None):
+        weights = str(weights)
+        if counts is None:
+            counts = label_counts(detections)
+        fingerprint = weights_fingerprint(weights)
+        entry = CachedResult(weights, fingerprint, detections, annotated, counts)
+        with self._lock:
+            self._check_fingerprint(weights, fingerprint)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _check_fingerprint(self, weights, fingerprint):
+        if self._fingerprints.get(weights, fingerprint) != fingerprint:
+            # best.pt changed: the old entries' keys can't match any more, so free them now
+            self._invalidate(weights, fingerprint)
+        self._fingerprints[weights] = fingerprint
+
+    def _invalidate(self, weights, fingerprint):
+        stale = [k for k, e in self._entries.items() if e.weights == weights and e.fingerprint != fingerprint]
+        for k in stale:
+            del self._entries[k]
+        self.invalidations += len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Returns the process-wide result cache, or None when it is disabled."""
+    global _cache
+    if not settings.DETECTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(settings.DETECTION_CACHE_SIZE)
+    return _cache
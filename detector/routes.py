@@ -0,0 +1,55 @@
+"""
+Sampling of Street View poses along a polyline or over a bounding box, for
+unattended route scans (see the scan_route management command).
+"""
+import math
+
+from .spatial import METERS_PER_DEGREE, distance_m
+
+
+def parse_polyline(text):
+    """"lat,lng;lat,lng;..." -> [(lat, lng), ...]"""
+    points = []
+    for pair in text.strip().split(";"):
+        if pair.strip():
+            lat, lng = (float(v) for v in pair.split(","))
+            points.append((lat, lng))
+    if len(points) < 2:
+        raise ValueError("A polyline needs at least two lat,lng points")
+    return points
+
+
+def sample_polyline(points, spacing_m):
+    """Points every `spacing_m` metres along the polyline, including both ends."""
+    samples = [points[0]]
+    carried = 0.0  # distance walked since the last sample
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        length = distance_m(lat1, lng1, lat2, lng2)
+        position = spacing_m - carried
+        while position <= length:
+            t = position / length
+            samples.append((lat1 + (lat2 - lat1) * t, lng1 + (lng2 - lng1) * t))
+            position += spacing_m
+        carried = (carried + length) % spacing_m
+    if samples[-1] != points[-1]:
+        samples.append(points[-1])
+    return samples
+
+
+def sample_bbox(min_lng, min_lat, max_lng, max_lat, spacing_m):
+    """A regular grid of points `spacing_m` apart covering the box."""
+    dlat = spacing_m / METERS_PER_DEGREE
+    dlng = spacing_m / (METERS_PER_DEGREE * math.cos(math.radians((min_lat + max_lat) / 2.0)))
+    rows = int((max_lat - min_lat) / dlat) + 1
+    cols = int((max_lng - min_lng) / dlng) + 1
+    return [(min_lat + r * dlat, min_lng + c * dlng) for r in range(rows) for c in range(cols)]
+
+
+def headings(step):
+    """0, step, 2*step, ... below 360."""
+    return [h * step for h in range(int(math.ceil(360.0 / step)))]
+
+
+def route_poses(points, heading_step, pitch=0, fov=90):
+    """Every (lat, lng, heading, pitch, fov) pose to fetch for the sample points."""
+    return [(lat, lng, heading, pitch, fov) for lat, lng in points for heading in headings(heading_step)]
@@ -0,0 +1,450 @@
+"""
+The scan pipeline, split into steps so the sync views and the async views in
+async_views.py run the same code:
+
+    parse_scan_request -> fetch_image -> lookup_cached
+        -> decode_image -> predict -> postprocess -> finish_scan
+
+Panorama scans (mode="panorama") fetch every heading around the location
+concurrently, run the frames as one batch and merge seam duplicates:
+
+    parse_scan_request -> run_panorama -> finish_panorama
+
+Fetching is network I/O, decode/predict/postprocess are CPU work, and
+finish_scan touches the disk and the database; the async views hand each step
+to the matching executor.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from django.conf import settings
+
+from .batching import QueueFull, get_scheduler
+from .dedup import get_collection_index, image_hashes
+from .imagery import StreetViewError, StreetViewUnavailable, fetch_many, fetch_streetview
+from .inference import ANNOTATE_MODES, decode_image, encode_annotated, extract_detections, label_counts, to_data_uri
+from .inventory import log_row, record_scan
+from .metrics import stage, timed
+from .backends import resolve_weights
+from .model_registry import get_model
+from .models import Scan
+from .panorama import merge_views
+from .profiles import choose_profile, get_profiles
+from .result_cache import get_result_cache, result_key
+from .routes import headings
+from .slicing import predict_sliced
+
+SCAN_MODES = ("single", "panorama")
+
+logger = logging.getLogger(__name__)
+
+
+class ScanError(Exception):
+    """A scan step failed in a way the client should hear about."""
+
+    def __init__(self, message, status=400, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Outcome:
+    """Detections and per-label counts for one frame, plus its annotated JPEGs when requested."""
+    __slots__ = ("cache_key", "detections", "counts", "annotated", "from_cache")
+
+    def __init__(self, cache_key, detections, counts, annotated, from_cache=False):
+        self.cache_key = cache_key
+        self.detections = detections
+        self.counts = counts
+        self.annotated = annotated
+        self.from_cache = from_cache
+
+
+# --- Request parsing ---
+
+def _load_json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise ScanError("Request body must be JSON")
+
+
+def _check_pose(data, require_label=False):
+    lat, lng = data.get("lat"), data.get("lng")
+    heading, pitch, fov = data.get("heading"), data.get("pitch"), data.get("fov")
+    if not all([lat, lng, heading is not None, pitch is not None, fov]):
+        raise ScanError("Missing required data")
+    try:
+        # Numeric strings ("90") are accepted; everything downstream gets floats
+        for field in ("lat", "lng", "heading", "pitch", "fov"):
+            data[field] = float(data[field])
+    except (TypeError, ValueError):
+        raise ScanError("lat, lng, heading, pitch and fov must be numbers")
+    if require_label and not data.get("label", "Unknown"):
+        raise ScanError("Missing required data")
+    return data
+
+
+def parse_pose(body, require_label=False):
+    return _check_pose(_load_json(body), require_label)
+
+
+def parse_scan_request(body):
+    data = _load_json(body)
+
+    # "single" scans the requested view; "panorama" scans 360 degrees around
+    # the location every heading_step degrees, starting at heading (default 0)
+    data.setdefault("mode", "single")
+    if data["mode"] not in SCAN_MODES:
+        raise ScanError(f"mode must be one of {', '.join(SCAN_MODES)}")
+    if data["mode"] == "panorama":
+        data.setdefault("heading", 0)
+        data.setdefault("pitch", 0)
+        data.setdefault("fov", 90)
+        try:
+            data["heading_step"] = float(data.get("heading_step", settings.PANORAMA_HEADING_STEP))
+        except (TypeError, ValueError):
+            raise ScanError("heading_step must be a number")
+        if not 15 <= data["heading_step"] <= 180:
+            raise ScanError("heading_step must be between 15 and 180 degrees")
+    _check_pose(data)
+
+    # How the annotated image comes back: "url" (written under media/scans),
+    # "inline" (base64 data URI in the JSON, no disk write) or "none"
+    data.setdefault("annotate", "url")
+    if data["annotate"] not in ANNOTATE_MODES:
+        raise ScanError(f"annotate must be one of {', '.join(ANNOTATE_MODES)}")
+
+    # Accuracy/latency tier ("fast", "accurate", ...); the server default when
+    # omitted, the fallback tier when the inference queue is over its SLO
+    requested = data.get("profile")
+    if requested is not None and requested not in get_profiles():
+        raise ScanError(f"profile must be one of {', '.join(get_profiles())}")
+    data["profile"], data["degraded"] = choose_profile(requested)
+
+    # Tiled inference for small/distant trees (slower: tiles + full frame per view)
+    data["slicing"] = bool(data.get("slicing", False))
+    return data
+
+
+# --- Pipeline steps ---
+
+def fetch_image(data):
+    """Street View JPEG for the requested pose (served from cache on repeat poses)."""
+    try:
+        with stage("fetch"):
+            return fetch_streetview(data["lat"], data["lng"], data["heading"], data["pitch"], data["fov"])
+    except StreetViewUnavailable as e:
+        raise ScanError(str(e), status=502)
+    except StreetViewError as e:
+        raise ScanError(str(e), status=400)
+
+
+def cache_params(profile, slicing=False):
+    params = profile.params()
+    if slicing:
+        params.update(slicing=[settings.SLICING_TILE, settings.SLICING_OVERLAP, settings.SLICING_IOU,
+                               settings.SLICING_MERGE])
+    return params
+
+
+def lookup_cached(content, annotate, profile, slicing=False):
+    """(cache key, Outcome or None): identical frame + weights + params reuse stored detections."""
+    # The weights actually loaded, so switching backend doesn't serve stale boxes
+    weights = resolve_weights(profile.weights)
+    cache_key = result_key(content, weights, cache_params(profile, slicing))
+    result_cache = get_result_cache()
+    cached = result_cache.get(cache_key, weights) if result_cache is not None else None
+    if cached is not None and (annotate == "none" or cached.annotated is not None):
+        return cache_key, Outcome(cache_key, cached.detections, cached.counts, cached.annotated, from_cache=True)
+    return cache_key, None
+
+
+def submit_batched(image, profile):
+    """Queues the image on the micro-batching scheduler; returns a Future."""
+    try:
+        return get_scheduler().submit(image, weights=profile.weights, **profile.params())
+    except QueueFull:
+        raise ScanError("Scanner is busy, please try again shortly.", status=429, headers={"Retry-After": "1"})
+
+
+def wait_batched(futures):
+    """Results of submitted futures; gives up (and drops the queued ones) after DETECTOR_PREDICT_TIMEOUT."""
+    deadline = time.monotonic() + settings.DETECTOR_PREDICT_TIMEOUT
+    try:
+        return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+    except FuturesTimeout:
+        for future in futures:
+            future.cancel()
+        raise ScanError("Inference timed out", status=504)
+
+
+def predict(image, profile, slicing=False):
+    """Runs YOLOv10 on one decoded frame (batched with other in-flight scans when enabled)."""
+    if slicing:
+        return predict_many([image], profile, slicing=True)
+    if settings.DETECTOR_BATCHING:
+        return wait_batched([submit_batched(image, profile)])
+    model = get_model(profile.weights)
+    return model.predict(image, verbose=False, **profile.params())
+
+
+def predict_many(images, profile, slicing=False):
+    """Runs several frames as one batch."""
+    if slicing:
+        # Tiles bypass the scheduler: a panorama's crops alone would fill its queue (429s).
+        # They run in chunks of the batch size, then merge per frame
+        return predict_sliced(
+            lambda crops: _predict_direct(crops, profile), images,
+            tile=settings.SLICING_TILE, overlap=settings.SLICING_OVERLAP,
+            iou_threshold=settings.SLICING_IOU, method=settings.SLICING_MERGE,
+        )
+    if settings.DETECTOR_BATCHING:
+        # Submitted back to back, so the scheduler gathers them into one batch
+        futures = []
+        try:
+            for image in images:
+                futures.append(submit_batched(image, profile))
+        except ScanError:
+            # Queue filled up partway: don't spend inference on a request that already failed
+            for future in futures:
+                future.cancel()
+            raise
+        return wait_batched(futures)
+    model = get_model(profile.weights)
+    return model.predict(images, verbose=False, **profile.params())
+
+
+def _predict_direct(images, profile):
+    model = get_model(profile.weights)
+    size = settings.DETECTOR_BATCH_MAX_SIZE
+    results = []
+    for start in range(0, len(images), size):
+        results.extend(model.predict(images[start:start + size], verbose=False, **profile.params()))
+    return results
+
+
+def postprocess(results, cache_key, annotate, profile):
+    model = get_model(profile.weights)
+    detections, counts = [], {}
+    with stage("postprocess"):
+        for r in results:
+            frame_detections, frame_counts = extract_detections(r, model.names)
+            detections.extend(frame_detections)
+            for label, count in frame_counts.items():
+                counts[label] = counts.get(label, 0) + count
+    with stage("annotate"):
+        annotated = [encode_annotated(r) for r in results] if annotate != "none" else None
+
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        result_cache.put(cache_key, resolve_weights(profile.weights), detections, annotated, counts)
+    return Outcome(cache_key, detections, counts, annotated)
+
+
+def run_detection(content, annotate, profile, slicing=False):
+    """All the CPU steps, for callers that are happy to block."""
+    cache_key, outcome = lookup_cached(content, annotate, profile, slicing)
+    if outcome is not None:
+        return outcome
+    image = decode_image(content)
+    with stage("predict"):
+        results = predict(image, profile, slicing)
+    return postprocess(results, cache_key, annotate, profile)
+
+
+@timed("save")
+def write_outputs(outcome, annotate):
+    """Public URLs (or data URIs) for the annotated images."""
+    output_paths = []
+    if annotate == "url":
+        scan_dir = os.path.join(settings.MEDIA_ROOT, "scans")
+        os.makedirs(scan_dir, exist_ok=True)
+
+    for i, jpeg in enumerate(outcome.annotated or []):
+        if annotate == "url":
+            # Named by the result key: identical scans share one file and
+            # concurrent scans never overwrite each other's output
+            predict_filename = f"predicted_{outcome.cache_key[:20]}_{i}.jpg"
+            predict_path = os.path.join(scan_dir, predict_filename)
+            if not os.path.exists(predict_path):
+                with open(predict_path, "wb") as f:
+                    f.write(jpeg)
+
+            # Construct public URL for the image
+            output_url = os.path.join(settings.MEDIA_URL, "scans", predict_filename).replace("\\", "/")
+            output_paths.append(output_url)
+        elif annotate == "inline":
+            output_paths.append(to_data_uri(jpeg))
+    return output_paths
+
+
+def finish_scan(data, outcome):
+    """Writes outputs, logs the scan to the inventory and builds the response payload."""
+    output_paths = write_outputs(outcome, data["annotate"])
+    detections = outcome.detections
+    total_trees = len(detections)
+    tree_counts = outcome.counts
+
+    # --- INVENTORY LOGGING: Write current scan data ---
+    new_log = None
+    new_trees = 0
+    with stage("db"):
+        if total_trees > 0:
+            try:
+                scan = record_scan(data["lat"], data["lng"], detections, heading=data["heading"],
+                                   pitch=data["pitch"], fov=data["fov"], counts=tree_counts)
+                new_log, new_trees = log_row(scan), scan.new_trees
+            except Exception:
+                logger.exception("Error writing scan log")
+        total_logs = Scan.objects.count()
+
+    return {
+        "message": "✅ Scan successful",
+        "outputs": output_paths,
+        "detections": detections,
+        "tree_counts": tree_counts,
+        "total_trees": total_trees,
+        "cached": outcome.from_cache,
+        "profile": data["profile"].name,
+        "slicing": data["slicing"],
+        # True when the requested profile was swapped for the fast tier under load
+        "degraded": data["degraded"],
+        # Detections not already known from a nearby panorama
+        "new_trees": new_trees,
+        # Only the new row: the table pages through /inventory/ instead
+        "new_log": new_log,
+        "total_logs": total_logs,
+    }
+
+
+# --- Panorama scans ---
+
+def panorama_headings(data):
+    start = float(data["heading"])
+    return [round((start + h) % 360.0, 1) for h in headings(data["heading_step"])]
+
+
+def run_panorama(data):
+    """Fetches every heading concurrently and detects on all frames in one batch.
+
+    Returns (headings, outcomes, errors); a view that could not be fetched
+    has outcome None and its error message in `errors`.
+    """
+    view_headings = panorama_headings(data)
+    poses = [(data["lat"], data["lng"], h, data["pitch"], data["fov"]) for h in view_headings]
+    with stage("fetch"):
+        contents = fetch_many(poses)
+
+    failures = [c for c in contents if isinstance(c, Exception)]
+    if len(failures) == len(contents):
+        raise ScanError(str(failures[0]), status=502 if isinstance(failures[0], StreetViewUnavailable) else 400)
+
+    outcomes = [None] * len(contents)
+    errors = [str(c) if isinstance(c, Exception) else None for c in contents]
+    pending = []
+    for i, content in enumerate(contents):
+        if errors[i] is not None:
+            continue
+        cache_key, outcome = lookup_cached(content, data["annotate"], data["profile"], data["slicing"])
+        if outcome is not None:
+            outcomes[i] = outcome
+        else:
+            pending.append((i, cache_key, decode_image(content)))
+
+    if pending:
+        with stage("predict"):
+            results = predict_many([image for _, _, image in pending], data["profile"], data["slicing"])
+        for (i, cache_key, _), result in zip(pending, results):
+            outcomes[i] = postprocess([result], cache_key, data["annotate"], data["profile"])
+    return view_headings, outcomes, errors
+
+
+def finish_panorama(data, view_headings, outcomes, errors):
+    """Merges seam duplicates, logs each view's trees and builds the response payload."""
+    per_view = []
+    views = []
+    for i, outcome in enumerate(outcomes):
+        outputs = write_outputs(outcome, data["annotate"]) if outcome is not None else []
+        views.append({
+            "heading": view_headings[i],
+            "output": outputs[0] if outputs else None,
+            "detections": len(outcome.detections) if outcome is not None else 0,
+            "error": errors[i],
+        })
+        if outcome is not None:
+            per_view.extend(dict(d, view=i) for d in outcome.detections)
+
+    merged = merge_views(per_view, view_headings, float(data["fov"]), settings.PANORAMA_MERGE_IOU)
+    tree_counts = label_counts(merged)
+
+    # --- INVENTORY LOGGING: one scan per view, with the boxes that survived the merge ---
+    new_logs = []
+    new_trees = 0
+    with stage("db"):
+        for i, heading in enumerate(view_headings):
+            kept = [d for d in merged if d["view"] == i]
+            if not kept:
+                continue
+            try:
+                scan = record_scan(data["lat"], data["lng"], kept, heading=heading,
+                                   pitch=data["pitch"], fov=data["fov"])
+                new_logs.append(log_row(scan))
+                new_trees += scan.new_trees
+            except Exception:
+                logger.exception("Error writing scan log")
+        total_logs = Scan.objects.count()
+
+    return {
+        "message": "✅ Panorama scan successful",
+        "mode": "panorama",
+        "views": views,
+        "outputs": [view["output"] for view in views if view["output"]],
+        "detections": merged,
+        "tree_counts": tree_counts,
+        "total_trees": len(merged),
+        # Boxes that were the same tree seen across a seam
+        "merged_duplicates": len(per_view) - len(merged),
+        "cached": all(o.from_cache for o in outcomes if o is not None),
+        "profile": data["profile"].name,
+        "slicing": data["slicing"],
+        "degraded": data["degraded"],
+        "new_trees": new_trees,
+        "new_logs": new_logs,
+        "total_logs": total_logs,
+    }
+
+
+def save_for_training(data, content):
+    """
+    Writes a collected frame into dataset_collection/<label>/.
+
+    Returns (path, near-duplicates already collected). With DEDUP_ACTION="reject"
+    a near-duplicate is not written and raises ScanError (409) instead.
+    """
+    label = data.get("label", "Unknown")
+    output_dir = os.path.join(settings.BASE_DIR, "dataset_collection", label)
+    filename = f"{label}_{data['lat']}_{data['lng']}_{data['heading']:.0f}.jpg"
+    filepath = os.path.join(output_dir, filename)
+
+    def write():
+        os.makedirs(output_dir, exist_ok=True)
+        with open(filepath, "wb") as f:
+            f.write(content)
+
+    if settings.DEDUP_ACTION == "off":
+        write()
+        return filepath, []
+
+    # Saving the same pose again overwrites that file, so it is not a duplicate of itself
+    duplicates, saved = get_collection_index().save_unless_duplicate(
+        filepath, image_hashes(content), settings.DEDUP_MAX_DISTANCE, write,
+        reject=settings.DEDUP_ACTION == "reject",
+    )
+    if not saved:
+        raise ScanError(f"Near-duplicate of {len(duplicates)} collected frame(s): "
+                        f"{os.path.relpath(duplicates[0], settings.BASE_DIR)}", status=409)
+    return filepath, duplicates
@@ -0,0 +1,134 @@
+"""
+Sliced (tiled) inference for small, distant trees.
+
+A 640x640 Street View frame is cut into overlapping tiles, and every tile is
+run at the model's full input size, so a 30 px tree is seen at 60 px instead
+of upscaling the whole frame. The tiles and the full frame go through the
+model as one batch. Their boxes are shifted back into frame coordinates and
+merged with class-aware NMS or a weighted box fusion (WBF) variant, both
+computed over one pairwise overlap matrix so merging stays cheap as the tile
+count grows.
+
+The merged boxes are wrapped in an ultralytics Results, so the rest of the
+pipeline (extract_detections, plot) treats them like a normal prediction.
+"""
+import numpy as np
+
+from .inference import result_arrays
+
+MERGE_METHODS = ("nms", "wbf")
+
+
+def tile_offsets(height, width, tile=320, overlap=0.25):
+    """(x0, y0) of every tile; the last row/column is aligned to the frame edge."""
+    tile_h, tile_w = min(tile, height), min(tile, width)
+    step_y = max(1, int(tile_h * (1.0 - overlap)))
+    step_x = max(1, int(tile_w * (1.0 - overlap)))
+    ys = list(range(0, height - tile_h + 1, step_y))
+    xs = list(range(0, width - tile_w + 1, step_x))
+    if ys[-1] != height - tile_h:
+        ys.append(height - tile_h)
+    if xs[-1] != width - tile_w:
+        xs.append(width - tile_w)
+    return [(x, y) for y in ys for x in xs]
+
+
+def slice_frame(image, tile=320, overlap=0.25, include_full=True):
+    """Crops of `image` plus their (x0, y0) offsets; the full frame first when included."""
+    height, width = image.shape[:2]
+    crops, offsets = [], []
+    if include_full:
+        crops.append(image)
+        offsets.append((0, 0))
+    if tile < max(height, width):
+        for x, y in tile_offsets(height, width, tile, overlap):
+            crops.append(np.ascontiguousarray(image[y:y + tile, x:x + tile]))
+            offsets.append((x, y))
+    return crops, offsets
+
+
+def _pairwise_overlap(boxes, metric="ios"):
+    """(N, N) IoU, or intersection over the smaller box ("ios"), which also
+    catches a tile's clipped half of a tree against the full-frame box."""
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if metric == "ios":
+        denominator = np.minimum(areas[:, None], areas[None, :])
+    else:
+        denominator = areas[:, None] + areas[None, :] - inter
+    return inter / np.maximum(denominator, 1e-9)
+
+
+def merge_boxes(data, iou_threshold=0.5, method="nms", metric="ios"):
+    """Merges an (N, 6) [x1, y1, x2, y2, conf, cls] array across tiles.
+
+    "nms" keeps the most confident box of every overlapping same-class group;
+    "wbf" replaces it with the confidence-weighted mean of the group.
+    """
+    if len(data) == 0:
+        return data.reshape(0, 6)
+
+    order = np.argsort(-data[:, 4], kind="stable")
+    data = data[order]
+    overlap = _pairwise_overlap(data[:, :4], metric)
+    overlap[data[:, 5][:, None] != data[:, 5][None, :]] = 0.0  # class-aware
+
+    # Greedy pass in confidence order: each box either leads a group or joins
+    # the first (most confident) leader it overlaps
+    owner = np.full(len(data), -1)
+    for i in range(len(data)):
+        if owner[i] >= 0:
+            continue
+        owner[i] = i
+        members = (owner < 0) & (overlap[i] >= iou_threshold)
+        owner[members] = i
+    leaders = np.flatnonzero(owner == np.arange(len(data)))
+
+    if method == "nms":
+        return data[leaders]
+
+    weights = data[:, 4]
+    fused = np.zeros((len(data), 4))
+    np.add.at(fused, owner, data[:, :4] * weights[:, None])
+    totals = np.bincount(owner, weights=weights, minlength=len(data))
+    merged = data[leaders].copy()
+    merged[:, :4] = fused[leaders] / totals[leaders, None]
+    return merged
+
+
+def merge_results(image, results, offsets, iou_threshold=0.5, method="nms"):
+    """One ultralytics Results for `image` from the per-crop results."""
+    import torch
+    from ultralytics.engine.results import Results
+
+    parts = []
+    for result, (x, y) in zip(results, offsets):
+        xyxy, conf, cls = result_arrays(result)
+        data = np.column_stack([xyxy, conf, cls]).astype(np.float64)
+        if len(data):
+            data[:, [0, 2]] += x
+            data[:, [1, 3]] += y
+            parts.append(data)
+    data = np.concatenate(parts) if parts else np.zeros((0, 6))
+    merged = merge_boxes(data, iou_threshold, method)
+    return Results(image, path="", names=results[0].names,
+                   boxes=torch.from_numpy(merged.astype(np.float32)))
+
+
+def predict_sliced(predict, images, tile=320, overlap=0.25, iou_threshold=0.5, method="nms"):
+    """Sliced inference for several frames, all tiles in one `predict(crops)` call."""
+    crops, spans = [], []
+    for image in images:
+        frame_crops, frame_offsets = slice_frame(image, tile, overlap)
+        spans.append((len(crops), frame_offsets))
+        crops.extend(frame_crops)
+
+    results = predict(crops)
+    return [
+        merge_results(image, results[start:start + len(offsets)], offsets, iou_threshold, method)
+        for image, (start, offsets) in zip(images, spans)
+    ]
@@ -0,0 +1,156 @@
+"""
+Ground positions and de-duplication of detected trees.
+
+Each box is projected to an approximate ground position from the camera pose
+(lat, lng, heading, pitch, fov) and where the box sits in the frame. Boxes of
+the same species landing within TREE_MERGE_RADIUS_M of an existing Tree are
+treated as another sighting of that tree, so sweeping a street no longer
+counts the same tree from every panorama.
+
+Trees are bucketed into a fixed lat/lng grid (cell_x, cell_y are indexed), so
+radius queries only touch the handful of cells around the query point.
+"""
+import math
+
+from django.conf import settings
+
+from .models import Detection, Tree
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+
+# --- Geometry ---
+
+def destination(lat, lng, bearing_deg, distance_m):
+    """Point `distance_m` away along `bearing_deg` (flat-earth, fine below ~1 km)."""
+    bearing = math.radians(bearing_deg)
+    dlat = distance_m * math.cos(bearing) / METERS_PER_DEGREE
+    dlng = distance_m * math.sin(bearing) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    return lat + dlat, lng + dlng
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Equirectangular distance in metres (accurate for the short ranges used here)."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2.0))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def box_bearing(heading, fov, x_center, width):
+    """Compass bearing of a pixel column in a rectilinear Street View frame."""
+    half = math.tan(math.radians(fov) / 2.0)
+    offset = math.degrees(math.atan((2.0 * x_center / width - 1.0) * half))
+    return (heading + offset) % 360.0
+
+
+def box_distance(pitch, fov, y_bottom, height):
+    """Range to the base of a box, from the camera height and the depression angle.
+
+    Falls back to TREE_DEFAULT_DISTANCE_M when the base is at or above the horizon.
+    """
+    half = math.tan(math.radians(fov) / 2.0)  # square frames: vertical fov == fov
+    below_center = math.degrees(math.atan((2.0 * y_bottom / height - 1.0) * half))
+    depression = below_center - (pitch or 0.0)
+    if depression <= 0.5:
+        return settings.TREE_DEFAULT_DISTANCE_M
+    distance = settings.STREETVIEW_CAMERA_HEIGHT_M / math.tan(math.radians(depression))
+    return min(max(distance, settings.TREE_MIN_DISTANCE_M), settings.TREE_MAX_DISTANCE_M)
+
+
+def estimate_position(lat, lng, heading, pitch, fov, xyxy, image_size=(640, 640)):
+    """Approximate ground (lat, lng) of a detected box."""
+    width, height = image_size
+    x1, _, x2, y2 = xyxy
+    bearing = box_bearing(heading, fov, (x1 + x2) / 2.0, width)
+    return destination(lat, lng, bearing, box_distance(pitch, fov, y2, height))
+
+
+# --- Grid index ---
+
+def cell_size_deg():
+    return settings.TREE_GRID_CELL_M / METERS_PER_DEGREE
+
+
+def cell_of(lat, lng):
+    size = cell_size_deg()
+    return math.floor(lng / size), math.floor(lat / size)
+
+
+def _cell_ranges(lat, lng, radius_m):
+    """(x range, y range) of grid cells that can contain points within radius_m."""
+    size = cell_size_deg()
+    dlat = radius_m / METERS_PER_DEGREE
+    dlng = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return (
+        (math.floor((lng - dlng) / size), math.floor((lng + dlng) / size)),
+        (math.floor((lat - dlat) / size), math.floor((lat + dlat) / size)),
+    )
+
+
+def trees_within(lat, lng, radius_m, species=None, queryset=None):
+    """Trees within radius_m of (lat, lng), nearest first, as (distance, tree) pairs."""
+    (x_lo, x_hi), (y_lo, y_hi) = _cell_ranges(lat, lng, radius_m)
+    queryset = Tree.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(cell_x__gte=x_lo, cell_x__lte=x_hi, cell_y__gte=y_lo, cell_y__lte=y_hi)
+    if species:
+        queryset = queryset.filter(species__in=[species] if isinstance(species, str) else species)
+
+    found = []
+    for tree in queryset:
+        d = distance_m(lat, lng, tree.latitude, tree.longitude)
+        if d <= radius_m:
+            found.append((d, tree))
+    found.sort(key=lambda pair: pair[0])
+    return found
+
+
+# --- De-duplication ---
+
+def assign_tree(species, lat, lng, seen_at, exclude_ids=()):
+    """Merges a sighting into the nearest same-species Tree within the merge
+    radius, or creates a new one. Returns (tree, created)."""
+    candidates = trees_within(lat, lng, settings.TREE_MERGE_RADIUS_M, species=species,
+                              queryset=Tree.objects.exclude(id__in=exclude_ids))
+    if not candidates:
+        cell_x, cell_y = cell_of(lat, lng)
+        tree = Tree.objects.create(
+            species=species, latitude=lat, longitude=lng, cell_x=cell_x, cell_y=cell_y,
+            observations=1, first_seen=seen_at, last_seen=seen_at,
+        )
+        return tree, True
+
+    _, tree = candidates[0]
+    # Running mean of all sightings refines the position over time
+    n = tree.observations
+    tree.latitude = (tree.latitude * n + lat) / (n + 1)
+    tree.longitude = (tree.longitude * n + lng) / (n + 1)
+    tree.cell_x, tree.cell_y = cell_of(tree.latitude, tree.longitude)
+    tree.observations = n + 1
+    tree.last_seen = max(tree.last_seen, seen_at)
+    tree.save(update_fields=["latitude", "longitude", "cell_x", "cell_y", "observations", "last_seen"])
+    return tree, False
+
+
+def locate_detections(scan, detections, image_size=(640, 640)):
+    """Estimates ground positions for a scan's (saved) Detection rows and links
+    each one to a Tree. Returns the number of new trees."""
+    if scan.heading is None or scan.fov is None:
+        return 0
+
+    new_trees = 0
+    matched = []  # two boxes in one frame are never the same tree
+    for detection in detections:
+        if detection.x1 is None:
+            continue
+        lat, lng = estimate_position(
+            scan.latitude, scan.longitude, scan.heading, scan.pitch, scan.fov,
+            (detection.x1, detection.y1, detection.x2, detection.y2), image_size,
+        )
+        tree, created = assign_tree(detection.species, lat, lng, scan.timestamp, exclude_ids=matched)
+        matched.append(tree.id)
+        new_trees += created
+        detection.est_latitude, detection.est_longitude, detection.tree = lat, lng, tree
+
+    Detection.objects.bulk_update(detections, ["est_latitude", "est_longitude", "tree"])
+    return new_trees
@@ -1,3 +1,1206 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import importlib.util
+import json
+import logging
+import math
+import os
+import tempfile
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+import dataset_manifest
+import shard_dataset
+import split_dataset
+
+from .async_views import detect
+from .backends import resolve_weights
+from .batching import BatchScheduler, QueueFull
+from .benchmarking import BENCH_ORIGIN, scratch_inventory
+from .dedup import CollectionIndex, HashIndex, find_leaks, image_hashes
+from .export import FIELDS, export_stream, iter_geojson
+from .fake_streetview import FakeStreetViewServer, parse_errors, start_server
+from .imagery import StreetViewCache, StreetViewClient, StreetViewError, StreetViewUnavailable
+from .inference import class_counts, decode_image, encode_annotated, extract_detections, label_counts, serialize_detections
+from .inventory import (
+    CSV_HEADER, decode_cursor, encode_cursor, filter_scans, iter_csv, page_scans, parse_counts_string, record_scan,
+)
+from .loadgen import generate_sequence, run_load
+from .management.commands.autolabel import yolo_lines
+from .metrics import Counter, Histogram
+from .middleware import JSONFormatter
+from .models import CollectedImage, Detection, Scan, Tree
+from .panorama import merge_views
+from . import model_registry
+from .model_registry import get_model
+from .profiles import Profile, choose_profile, get_profile
+from .ratelimit import TokenBucket
+from .result_cache import ResultCache, result_key
+from .routes import headings, parse_polyline, route_poses, sample_bbox, sample_polyline
+from .scanning import (
+    ScanError, cache_params, parse_scan_request, predict_many, save_for_training, wait_batched,
+)
+from .spatial import METERS_PER_DEGREE, cell_of, cell_size_deg, distance_m, trees_within
+
+
+def temp_dir(test):
+    """A scratch directory removed when `test` finishes."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
+class StubModel:
+    """Stands in for YOLO: each result is the input image back, optionally after `gate` opens."""
+
+    names = {0: "Angsana", 1: "Rain Tree"}
+
+    def __init__(self, gate=None, error=None):
+        self.gate = gate
+        self.error = error
+        self.calls = []
+
+    def predict(self, images, **params):
+        self.calls.append(list(images))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return list(images)
+
+
+class StubResult:
+    """A YOLO result reduced to what the pipeline reads: boxes.data rows of [x1, y1, x2, y2, conf, cls]."""
+
+    def __init__(self, rows, image=None):
+        self.boxes = mock.Mock(data=np.asarray(rows, dtype=np.float32).reshape(-1, 6))
+        self.orig_img = image
+
+    def plot(self):
+        return self.orig_img
+
+
+class DetectingModel(StubModel):
+    """StubModel whose results carry the same boxes for every image."""
+
+    def __init__(self, rows=((300, 200, 340, 500, 0.9, 0),), **kwargs):
+        super().__init__(**kwargs)
+        self.rows = rows
+
+    def predict(self, images, **params):
+        images = images if isinstance(images, list) else [images]
+        return [StubResult(self.rows, image) for image in super().predict(images, **params)]
+
+
+# --- Model registry ---
+
+@override_settings(DETECTOR_BACKEND="pytorch", DETECTOR_WARMUP_RUNS=2, DETECTOR_WARMUP_IMGSZ=64)
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.weights = os.path.join(temp_dir(self), "best.pt")
+        open(self.weights, "wb").close()
+        self.yolo = mock.Mock(side_effect=lambda *args, **kwargs: mock.Mock())
+        for patcher in (mock.patch.dict(sys.modules, {"ultralytics": mock.Mock(YOLO=self.yolo)}),
+                        mock.patch.object(model_registry, "_models", {}),
+                        mock.patch.object(model_registry, "_stats", {})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_loads_once_on_first_use_and_warms_up(self):
+        self.assertFalse(model_registry.is_loaded(self.weights))
+        self.yolo.assert_not_called()
+
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(get_model(self.weights))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.yolo.assert_called_once_with(self.weights, task="detect")
+        self.assertTrue(all(model is models[0] for model in models))
+        self.assertTrue(model_registry.is_loaded(self.weights))
+        warm_up = models[0].predict.call_args_list
+        self.assertEqual(len(warm_up), 2)
+        self.assertEqual(warm_up[0].args[0].shape, (64, 64, 3))
+        self.assertEqual(set(model_registry.stats()[self.weights]), {"load_seconds", "warmup_seconds"})
+
+    @override_settings(DETECTOR_WARMUP_RUNS=0)
+    def test_warm_up_can_be_turned_off(self):
+        model_registry.preload(self.weights)
+        get_model(self.weights).predict.assert_not_called()
+        self.assertEqual(model_registry.stats()[self.weights]["warmup_seconds"], 0.0)
+
+
+# --- Micro-batching scheduler ---
+
+class BatchSchedulerTests(SimpleTestCase):
+    def scheduler(self, model, **kwargs):
+        patcher = mock.patch("detector.batching.get_model", return_value=model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return BatchScheduler(**{"max_batch_size": 4, "max_wait_ms": 50, **kwargs})
+
+    def test_concurrent_submits_share_one_batch(self):
+        model = StubModel()
+        scheduler = self.scheduler(model)
+        futures = [scheduler.submit(f"image-{i}", conf=0.25) for i in range(3)]
+        self.assertEqual([f.result(timeout=5) for f in futures], ["image-0", "image-1", "image-2"])
+        self.assertEqual(len(model.calls), 1)
+        self.assertEqual(scheduler.metrics()["batches"], 1)
+
+    def test_different_params_run_separately(self):
+        model = StubModel()
+        scheduler = self.scheduler(model)
+        futures = [scheduler.submit("a", conf=0.25), scheduler.submit("b", conf=0.5)]
+        self.assertEqual([f.result(timeout=5) for f in futures], ["a", "b"])
+        self.assertEqual(len(model.calls), 2)
+
+    def test_failure_reaches_every_caller_and_worker_survives(self):
+        model = StubModel(error=RuntimeError("boom"))
+        scheduler = self.scheduler(model)
+        with self.assertRaises(RuntimeError), self.assertLogs("detector.batching", "ERROR"):
+            scheduler.submit("a").result(timeout=5)
+        model.error = None
+        self.assertEqual(scheduler.submit("b").result(timeout=5), "b")
+        self.assertEqual(scheduler.metrics()["failures"], 1)
+
+    def test_cancelled_item_is_dropped_without_killing_worker(self):
+        gate = threading.Event()
+        model = StubModel(gate=gate)
+        scheduler = self.scheduler(model, max_batch_size=1, max_wait_ms=0)
+        running = scheduler.submit("running")
+        queued = scheduler.submit("queued")
+        self.assertTrue(queued.cancel())
+        gate.set()
+        self.assertEqual(running.result(timeout=5), "running")
+        self.assertEqual(scheduler.submit("after").result(timeout=5), "after")
+        self.assertNotIn(["queued"], model.calls)
+        self.assertTrue(scheduler._thread.is_alive())
+
+    def test_resolved_future_does_not_kill_worker(self):
+        gate = threading.Event()
+        scheduler = self.scheduler(StubModel(gate=gate), max_batch_size=1, max_wait_ms=0)
+        future = scheduler.submit("a")
+        # Running futures can't be cancelled; resolve it behind the worker's back instead
+        while not future.running():
+            pass
+        future.set_result("early")
+        with self.assertLogs("detector.batching", "ERROR"):
+            gate.set()
+            self.assertEqual(scheduler.submit("b").result(timeout=5), "b")
+
+    def test_dead_worker_is_replaced(self):
+        scheduler = self.scheduler(StubModel())
+        scheduler._thread = threading.Thread(target=lambda: None)
+        scheduler._thread.start()
+        scheduler._thread.join()
+        with self.assertLogs("detector.batching", "ERROR"):
+            future = scheduler.submit("a")
+        self.assertEqual(future.result(timeout=5), "a")
+
+    def test_full_queue_rejects(self):
+        gate = threading.Event()
+        scheduler = self.scheduler(StubModel(gate=gate), max_batch_size=1, max_wait_ms=0, max_queue=1)
+        running = scheduler.submit("running")
+        while not running.running():
+            pass
+        queued = scheduler.submit("queued")
+        with self.assertRaises(QueueFull):
+            scheduler.submit("rejected")
+        gate.set()
+        self.assertEqual(queued.result(timeout=5), "queued")
+        self.assertEqual(scheduler.metrics()["rejected"], 1)
+
+    @override_settings(DETECTOR_PREDICT_TIMEOUT=0.05)
+    def test_timeout_is_504_and_cancels_pending(self):
+        pending = Future()
+        with self.assertRaises(ScanError) as raised:
+            wait_batched([pending])
+        self.assertEqual(raised.exception.status, 504)
+        self.assertTrue(pending.cancelled())
+
+
+# --- Street View client ---
+
+class StreetViewInputTests(SimpleTestCase):
+    def test_non_numeric_pose_is_a_client_error(self):
+        body = '{"lat": "north", "lng": 101.6, "heading": 0, "pitch": 0, "fov": 90}'
+        with self.assertRaises(ScanError) as raised:
+            parse_scan_request(body)
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_retry_after_is_respected_and_capped(self):
+        client = StreetViewClient(backoff=0.5, max_retry_after=30)
+        with mock.patch("detector.imagery.time.sleep") as sleep:
+            client._sleep_before_retry(0, "5")
+            client._sleep_before_retry(0, "86400")
+        first, second = (call.args[0] for call in sleep.call_args_list)
+        self.assertTrue(5 <= first <= 5.5)
+        self.assertTrue(30 <= second <= 30.5)
+
+
+def http_response(status, content_type="image/jpeg", **headers):
+    return mock.Mock(status_code=status, content=b"jpeg", headers={"Content-Type": content_type, **headers})
+
+
+class StreetViewRetryTests(SimpleTestCase):
+    def get(self, *responses, retries=3):
+        client = StreetViewClient(retries=retries, backoff=0.5, rate_per_key=0)
+        client.session.get = mock.Mock(side_effect=responses)
+        with mock.patch("detector.imagery.time.sleep") as sleep:
+            try:
+                return client.get_image(3.1, 101.6, 0, 0, 90, api_key="key")
+            finally:
+                self.sleeps = [call.args[0] for call in sleep.call_args_list]
+                self.attempts = client.session.get.call_count
+
+    def test_retries_with_backoff_then_succeeds(self):
+        image = self.get(http_response(503, "text/html", **{"Retry-After": "2"}),
+                         requests.ConnectionError("reset"), http_response(200))
+        self.assertEqual((image, self.attempts), (b"jpeg", 3))
+        self.assertTrue(2 <= self.sleeps[0] <= 2.5)  # Retry-After, jittered upwards
+        self.assertTrue(0 <= self.sleeps[1] <= 1.0)  # full jitter, second attempt
+
+    def test_gives_up_after_the_last_retry(self):
+        with self.assertLogs("detector.imagery", "WARNING"), self.assertRaises(StreetViewUnavailable):
+            self.get(*[http_response(500, "text/html")] * 3, retries=2)
+        self.assertEqual((self.attempts, len(self.sleeps)), (3, 2))
+
+    def test_non_image_answer_is_not_retried(self):
+        with self.assertRaises(StreetViewError):
+            self.get(http_response(200, "text/html"))
+        self.assertEqual((self.attempts, self.sleeps), (1, []))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_steady_rate(self):
+        clock = mock.Mock(now=0.0)
+        clock.monotonic.side_effect = lambda: clock.now
+        clock.sleep.side_effect = lambda seconds: setattr(clock, "now", clock.now + seconds)
+        with mock.patch("detector.ratelimit.time", clock):
+            bucket = TokenBucket(rate=10, burst=2)
+            for _ in range(5):
+                bucket.acquire()
+        self.assertAlmostEqual(clock.now, 0.3)  # 2 from the burst, then one every 0.1 s
+
+    def test_zero_rate_is_unlimited(self):
+        with mock.patch("detector.ratelimit.time") as clock:
+            for _ in range(100):
+                TokenBucket(rate=0).acquire()
+        clock.sleep.assert_not_called()
+
+
+@override_settings(DETECTOR_BATCHING=False, DETECTION_CACHE_ENABLED=False, DEDUP_ACTION="off")
+class NumericStringPoseTests(TestCase):
+    pose = {"lat": "3.1", "lng": "101.6", "heading": "90", "pitch": "0", "fov": "90"}
+
+    def setUp(self):
+        patcher = mock.patch("detector.scanning.fetch_streetview", return_value=jpeg_bytes(1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scan_logs_the_inventory_row(self):
+        with mock.patch("detector.scanning.get_model", return_value=DetectingModel()):
+            response = self.client.post("/streetview-scan/", dict(self.pose, annotate="none"),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["total_trees"], 1)
+        scan = Scan.objects.get()
+        self.assertEqual((scan.heading, scan.detections.get().tree.species), (90.0, "Angsana"))
+
+    def test_save_names_the_file_by_heading(self):
+        with override_settings(BASE_DIR=temp_dir(self)):
+            response = self.client.post("/streetview-save/", dict(self.pose, label="Angsana"),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()["filename"].endswith("Angsana_3.1_101.6_90.jpg"))
+
+
+# --- In-memory scan path ---
+
+@override_settings(DETECTOR_BATCHING=False, DETECTION_CACHE_ENABLED=False)
+class InMemoryScanTests(TestCase):
+    pose = {"lat": 3.1, "lng": 101.6, "heading": 0, "pitch": 0, "fov": 90}
+
+    def setUp(self):
+        self.media = temp_dir(self)
+        patcher = override_settings(MEDIA_ROOT=self.media)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        for patcher in (mock.patch("detector.scanning.fetch_streetview", return_value=jpeg_bytes(1)),
+                        mock.patch("tempfile.NamedTemporaryFile", side_effect=AssertionError("temp file")),
+                        mock.patch("tempfile.mkstemp", side_effect=AssertionError("temp file"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scan(self, annotate):
+        model = DetectingModel()
+        with mock.patch("detector.scanning.get_model", return_value=model):
+            response = self.client.post("/streetview-scan/", dict(self.pose, annotate=annotate),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return model, response.json()
+
+    def test_decode_gives_contiguous_bgr(self):
+        buffer = BytesIO()
+        Image.new("RGB", (4, 2), (255, 0, 0)).save(buffer, format="PNG")
+        image = decode_image(buffer.getvalue())
+        self.assertEqual(image.shape, (2, 4, 3))
+        self.assertTrue(image.flags["C_CONTIGUOUS"])
+        self.assertEqual(image[0, 0].tolist(), [0, 0, 255])
+
+    def test_annotated_jpeg_round_trip(self):
+        image = decode_image(jpeg_bytes(1))
+        jpeg = encode_annotated(StubResult((), image))
+        self.assertEqual(jpeg[:2], b"\xff\xd8")
+        self.assertEqual(decode_image(jpeg).shape, image.shape)
+
+    def test_inline_scan_touches_no_files(self):
+        model, payload = self.scan("inline")
+        frame = model.calls[0][0]
+        self.assertIsInstance(frame, np.ndarray)
+        self.assertEqual(frame.shape, (640, 640, 3))
+        self.assertTrue(payload["outputs"][0].startswith("data:image/jpeg;base64,"))
+        self.assertEqual(base64.b64decode(payload["outputs"][0].split(",", 1)[1])[:2], b"\xff\xd8")
+        self.assertEqual(os.listdir(self.media), [])
+
+    def test_url_and_none_outputs(self):
+        _, payload = self.scan("url")
+        self.assertEqual(len(os.listdir(os.path.join(self.media, "scans"))), 1)
+        self.assertTrue(payload["outputs"][0].endswith("_0.jpg"))
+        self.assertEqual(self.scan("none")[1]["outputs"], [])
+
+
+# --- Result and image caches ---
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.weights = os.path.join(temp_dir(self), "best.pt")
+        with open(self.weights, "wb") as f:
+            f.write(b"old weights")
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.put(key, self.weights, [])
+        cache.get("a", self.weights)
+        cache.put("c", self.weights, [])
+        self.assertIsNone(cache.get("b", self.weights))
+        self.assertIsNotNone(cache.get("a", self.weights))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_new_weights_invalidate_old_entries(self):
+        cache = ResultCache(max_entries=10)
+        old_key = result_key(b"frame", self.weights, {"conf": 0.25})
+        cache.put(old_key, self.weights, [{"label": "Angsana"}])
+        self.assertIsNotNone(cache.get(old_key, self.weights))
+
+        with open(self.weights, "wb") as f:
+            f.write(b"retrained weights")
+        new_key = result_key(b"frame", self.weights, {"conf": 0.25})
+        self.assertNotEqual(new_key, old_key)
+        self.assertIsNone(cache.get(new_key, self.weights))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+class StreetViewCacheTests(SimpleTestCase):
+    def cache(self, **kwargs):
+        return StreetViewCache(temp_dir(self), **{"max_bytes": 100, "ttl_seconds": 60, **kwargs})
+
+    def test_lru_eviction_by_size(self):
+        cache = self.cache()
+        cache.put("aa01", b"x" * 40)
+        cache.put("bb02", b"y" * 40)
+        cache.get("aa01")
+        cache.put("cc03", b"z" * 40)
+        self.assertIsNone(cache.get("bb02"))
+        self.assertEqual(cache.get("aa01"), b"x" * 40)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_expired_entries_miss(self):
+        cache = self.cache(ttl_seconds=-1)
+        cache.put("aa01", b"x")
+        self.assertIsNone(cache.get("aa01"))
+        self.assertEqual(cache.stats()["expired"], 1)
+
+
+# --- Inventory store ---
+
+class LegacyCsvImportTests(TestCase):
+    rows = [
+        ["2024-03-01 12:00:00", "3.1", "101.6", "3", "Angsana: 2, Rain Tree: 1"],
+        ["2024-03-01 12:05:00", "3.2", "101.7", "0", ""],
+    ]
+
+    def setUp(self):
+        self.path = os.path.join(temp_dir(self), "treeInventory.csv")
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows(self.rows)
+
+    def test_import_is_idempotent_and_round_trips(self):
+        call_command("import_inventory_csv", self.path, stdout=StringIO())
+        out = StringIO()
+        call_command("import_inventory_csv", self.path, stdout=out)
+        self.assertIn("Imported 0 scans (2 already present)", out.getvalue())
+
+        self.assertEqual(Scan.objects.count(), 2)
+        scan = Scan.objects.get(latitude=3.1)
+        self.assertEqual(scan.counts, {"Angsana": 2, "Rain Tree": 1})
+        self.assertEqual(sorted(Detection.objects.filter(scan=scan).values_list("species", flat=True)),
+                         ["Angsana", "Angsana", "Rain Tree"])
+        with open(self.path, newline="", encoding="utf-8") as f:
+            self.assertEqual("".join(iter_csv(Scan.objects.order_by("timestamp"))), f.read())
+
+    def test_counts_string(self):
+        self.assertEqual(parse_counts_string("Angsana: 2, Rain Tree: 1, Angsana: 1"), {"Angsana": 3, "Rain Tree": 1})
+        self.assertEqual(parse_counts_string(""), {})
+
+
+# --- Inventory API ---
+
+class InventoryPageTests(TestCase):
+    def setUp(self):
+        box = {"label": "Angsana", "class": 0, "confidence": 0.9, "xyxy": [10, 20, 110, 320]}
+        start = timezone.make_aware(timezone.datetime(2024, 3, 1, 12))
+        # Seven scans over four days, two of them sharing each timestamp
+        self.scans = [
+            record_scan(3.1 + i / 1000, 101.6, [box], timestamp=start + timezone.timedelta(days=i // 2))
+            for i in range(7)
+        ]
+
+    def walk(self, params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, limit=3, **({"cursor": cursor} if cursor else {}))
+            response = self.client.get("/inventory/", query)
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.json()["results"]]
+            cursor, pages = response.json()["next_cursor"], pages + 1
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_cover_every_scan_once_newest_first(self):
+        ids, pages = self.walk({})
+        self.assertEqual(ids, [scan.id for scan in reversed(self.scans)])
+        self.assertEqual(pages, 3)
+
+    def test_cursor_round_trip(self):
+        scan = Scan.objects.get(pk=self.scans[3].id)
+        self.assertEqual(decode_cursor(encode_cursor(scan)), (scan.timestamp, scan.id))
+        page, _ = page_scans(Scan.objects.all(), cursor=encode_cursor(scan), limit=10)
+        self.assertEqual([s.id for s in page], [s.id for s in reversed(self.scans[:3])])
+
+    def test_filters(self):
+        def ids(**params):
+            return sorted(scan.id for scan in filter_scans(params))
+        expected = [scan.id for scan in self.scans]
+        self.assertEqual(ids(since="2024-03-02", until="2024-03-03"), expected[2:6])  # dates are whole days
+        self.assertEqual(ids(since="2024-03-02T12:00:00"), expected[2:])
+        self.assertEqual(ids(bbox="101.5,3.1015,101.7,3.1045"), expected[2:5])
+        self.assertEqual(ids(bbox="101.5,3.1015,101.7,3.1045", until="2024-03-02"), expected[2:4])
+        self.assertEqual(self.walk({"since": "2024-03-02"})[0], expected[:1:-1])
+
+    def test_bad_input_is_400(self):
+        tampered = base64.urlsafe_b64encode(b"yesterday|12").decode("ascii")
+        for params in ({"cursor": "not base64!"}, {"cursor": tampered}, {"limit": "ten"},
+                       {"since": "March"}, {"bbox": "1,2,3"}):
+            response = self.client.get("/inventory/", params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+
+# --- Inventory exports ---
+
+class CsvExportTests(TestCase):
+    def test_both_csv_layouts(self):
+        box = {"label": "Angsana", "class": 0, "confidence": 0.9, "xyxy": [10, 20, 110, 320]}
+        record_scan(3.1, 101.6, [box], heading=0, pitch=0, fov=90)
+
+        legacy = "".join(iter_csv(Scan.objects.all())).splitlines()
+        self.assertEqual(legacy[0], ",".join(CSV_HEADER))
+        self.assertTrue(legacy[1].endswith(",3.1,101.6,1,Angsana: 1"))
+
+        gis = b"".join(export_stream(Scan.objects.all(), "csv")).decode("utf-8").splitlines()
+        self.assertEqual(gis[0].split(","), FIELDS[:-1] + ["Angsana"])
+        self.assertEqual(gis[1].split(",")[2:4] + gis[1].split(",")[-2:], ["3.1", "101.6", "1", "1"])
+
+
+class GisExportTests(TestCase):
+    def setUp(self):
+        box = {"label": "Angsana", "class": 0, "confidence": 0.9, "xyxy": [10, 20, 110, 320]}
+        other = dict(box, label="Rain Tree", **{"class": 1})
+        self.scans = [record_scan(3.1 + i / 1000, 101.6, [box] + [other] * i, heading=0, pitch=0, fov=90)
+                      for i in range(3)]
+
+    def test_geojson_across_batches(self):
+        collection = json.loads(b"".join(iter_geojson(Scan.objects.all(), chunk_size=2)))
+        features = collection["features"]
+        self.assertEqual([f["properties"]["id"] for f in features], [scan.id for scan in self.scans])
+        self.assertEqual(features[2]["geometry"], {"type": "Point", "coordinates": [101.6, 3.102]})
+        self.assertEqual(features[2]["properties"]["Rain Tree"], 2)
+        self.assertNotIn("Rain Tree", features[0]["properties"])
+
+    def test_gzipped_download_with_filters(self):
+        response = self.client.get("/inventory/export/", {"format": "geojson", "gzip": "1", "bbox": "101,3.1005,102,4"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("treeInventory.geojson.gz", response["Content-Disposition"])
+        collection = json.loads(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(len(collection["features"]), 2)
+        self.assertEqual(self.client.get("/inventory/export/", {"format": "xlsx"}).status_code, 400)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+    def test_parquet_columns(self):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(BytesIO(b"".join(export_stream(Scan.objects.all(), "parquet"))))
+        self.assertEqual(table.column_names, FIELDS[:-1] + ["Angsana", "Rain Tree"])
+        self.assertEqual(table.column("Rain Tree").to_pylist(), [0, 1, 2])
+        self.assertEqual(table.column("id").to_pylist(), [scan.id for scan in self.scans])
+
+
+class AsyncDetectTests(SimpleTestCase):
+    @override_settings(DETECTOR_BATCHING=True, DETECTOR_PREDICT_TIMEOUT=0.05, DETECTION_CACHE_ENABLED=False)
+    def test_timed_out_request_leaves_the_batcher_running(self):
+        gate = threading.Event()
+        scheduler = BatchScheduler(max_batch_size=1, max_wait_ms=0)
+        with mock.patch("detector.batching.get_model", return_value=StubModel(gate=gate)), \
+                mock.patch("detector.scanning.get_scheduler", return_value=scheduler), \
+                mock.patch("detector.async_views.decode_image", side_effect=lambda content: content):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(detect(b"frame", "none", get_profile()))
+            gate.set()
+            self.assertEqual(scheduler.submit("next").result(timeout=5), "next")
+            self.assertTrue(scheduler._thread.is_alive())
+
+
+# --- Detection serializing ---
+
+class DetectionSerializerTests(SimpleTestCase):
+    names = StubModel.names
+    rows = ((10, 20, 30, 40, 0.5, 1), (50, 60, 70, 80, 0.75, 0), (1, 2, 3, 4, 0.25, 1))
+
+    def test_detections_and_counts(self):
+        detections, counts = extract_detections(StubResult(self.rows), self.names)
+        self.assertEqual(detections, [
+            {"class": 1, "label": "Rain Tree", "confidence": 0.5, "xyxy": [10.0, 20.0, 30.0, 40.0]},
+            {"class": 0, "label": "Angsana", "confidence": 0.75, "xyxy": [50.0, 60.0, 70.0, 80.0]},
+            {"class": 1, "label": "Rain Tree", "confidence": 0.25, "xyxy": [1.0, 2.0, 3.0, 4.0]},
+        ])
+        self.assertEqual(list(counts.items()), [("Angsana", 1), ("Rain Tree", 2)])
+        self.assertEqual(label_counts(detections), counts)
+        self.assertEqual(json.loads(json.dumps(detections)), detections)  # plain Python types
+
+    def test_device_tensors_are_copied_once(self):
+        data = np.asarray(self.rows, dtype=np.float32)
+        tensor = mock.Mock()
+        tensor.cpu.return_value.numpy.return_value = data
+        result = mock.Mock(boxes=mock.Mock(data=tensor))
+        self.assertEqual(extract_detections(result, self.names)[1], {"Angsana": 1, "Rain Tree": 2})
+        tensor.cpu.assert_called_once_with()
+
+    def test_no_detections(self):
+        self.assertEqual(extract_detections(StubResult(()), self.names), ([], {}))
+        empty = np.zeros(0, dtype=np.intp)
+        self.assertEqual(serialize_detections(np.zeros((0, 4)), np.zeros(0), empty, self.names), [])
+        self.assertEqual(class_counts(empty, self.names), {})
+        self.assertEqual(label_counts([]), {})
+
+
+# --- Backends ---
+
+class BackendFallbackTests(SimpleTestCase):
+    def setUp(self):
+        self.weights = os.path.join(temp_dir(self), "best.pt")
+        open(self.weights, "wb").close()
+
+    @override_settings(DETECTOR_BACKEND="onnx", DETECTOR_INT8=False)
+    def test_missing_export_falls_back_to_pytorch(self):
+        with self.assertLogs("detector.backends", "WARNING"):
+            self.assertEqual(resolve_weights(self.weights), self.weights)
+        onnx = self.weights[:-3] + ".onnx"
+        open(onnx, "wb").close()
+        self.assertEqual(resolve_weights(self.weights), onnx)
+
+    @override_settings(DETECTOR_BACKEND="onnx", DETECTOR_INT8=False)
+    def test_tta_is_dropped_on_exported_backends(self):
+        profile = Profile("accurate", self.weights, augment=True)
+        with self.assertLogs("detector.backends", "WARNING"):
+            self.assertTrue(profile.params()["augment"])  # no export yet: still PyTorch
+        open(self.weights[:-3] + ".onnx", "wb").close()
+        with self.assertLogs("detector.backends", "WARNING"):
+            self.assertFalse(profile.params()["augment"])
+        self.assertFalse(cache_params(profile)["augment"])
+
+
+# --- Profiles ---
+
+@override_settings(DETECTOR_BATCHING=True, DETECTOR_SLO_MS=1000, DETECTOR_BACKEND="pytorch",
+                   DETECTOR_DEFAULT_PROFILE="accurate", DETECTOR_FALLBACK_PROFILE="fast")
+class ProfileDegradeTests(SimpleTestCase):
+    def setUp(self):
+        directory = temp_dir(self)
+        self.accurate = os.path.join(directory, "accurate.pt")
+        self.fast = os.path.join(directory, "fast.pt")
+        open(self.accurate, "wb").close()
+        self.profiles = {"accurate": {"weights": self.accurate, "augment": True},
+                         "fast": {"weights": self.fast}}
+        patcher = mock.patch("detector.profiles._missing", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def choose(self, queue_ms):
+        with override_settings(DETECTOR_PROFILES=self.profiles), \
+                mock.patch("detector.profiles.queue_latency_ms", return_value=queue_ms):
+            profile, degraded = choose_profile()
+        return profile.name, degraded
+
+    def test_over_slo_degrades_to_the_fallback(self):
+        open(self.fast, "wb").close()
+        self.assertEqual(self.choose(50), ("accurate", False))
+        self.assertEqual(self.choose(5000), ("fast", True))
+
+    def test_missing_fallback_keeps_the_requested_profile(self):
+        with self.assertLogs("detector.profiles", "WARNING"):
+            self.assertEqual(self.choose(5000), ("accurate", False))
+        with self.assertNoLogs("detector.profiles", "WARNING"):
+            self.assertEqual(self.choose(5000), ("accurate", False))
+        with self.assertRaises(FileNotFoundError):
+            get_model(self.fast)
+
+
+# --- Panorama scans ---
+
+def view_box(bearing, heading, view, label="Angsana", confidence=0.8, fov=90, width=640, half_width_deg=3):
+    """A detection in view `view` (facing `heading`) of a tree at compass `bearing`."""
+    def x(angle):
+        return (math.tan(math.radians(angle)) / math.tan(math.radians(fov / 2)) + 1) * width / 2
+    relative = (bearing - heading + 180) % 360 - 180
+    return {"view": view, "class": 0 if label == "Angsana" else 1, "label": label, "confidence": confidence,
+            "xyxy": [x(relative - half_width_deg), 200, x(relative + half_width_deg), 500]}
+
+
+class PanoramaMergeTests(SimpleTestCase):
+    def test_seam_duplicates_merge_into_the_most_confident(self):
+        headings = [0, 60]
+        merged = merge_views([view_box(40, 0, 0, confidence=0.6), view_box(40, 60, 1, confidence=0.9)], headings, 90)
+        self.assertEqual(len(merged), 1)
+        self.assertEqual((merged[0]["view"], merged[0]["confidence"]), (1, 0.9))
+        self.assertAlmostEqual(merged[0]["bearing"], 40, delta=0.2)
+
+    def test_wraps_around_north(self):
+        merged = merge_views([view_box(350, 0, 0), view_box(350, 330, 1, confidence=0.7)], [0, 330], 90)
+        self.assertEqual(len(merged), 1)
+        self.assertAlmostEqual(merged[0]["bearing"], 350, delta=0.2)
+
+    def test_distinct_trees_are_kept(self):
+        headings = [0, 60]
+        detections = [
+            view_box(40, 0, 0), view_box(40, 60, 1, label="Rain Tree"),  # other species
+            view_box(10, 0, 0), view_box(12, 0, 0),  # same view: already NMS'd by the model
+            view_box(25, 0, 0), view_box(55, 60, 1),  # different bearings
+        ]
+        self.assertEqual(len(merge_views(detections, headings, 90)), 6)
+        self.assertEqual(merge_views([], headings, 90), [])
+
+
+# --- Sliced inference ---
+
+class SlicedPredictTests(SimpleTestCase):
+    @override_settings(DETECTOR_BATCHING=True, DETECTOR_BATCH_MAX_SIZE=8, SLICING_TILE=320, SLICING_OVERLAP=0.25)
+    def test_panorama_tiles_bypass_the_queue(self):
+        model = StubModel()
+        frames = [np.zeros((640, 640, 3), dtype=np.uint8)] * 12  # heading_step=30
+        with mock.patch("detector.scanning.get_model", return_value=model), \
+                mock.patch("detector.scanning.get_scheduler", side_effect=AssertionError("queued a tile")), \
+                mock.patch("detector.slicing.merge_results", side_effect=lambda image, results, *a: len(results)):
+            merged = predict_many(frames, get_profile(), slicing=True)
+        self.assertEqual(merged, [10] * 12)  # 9 tiles + the full frame each
+        self.assertEqual(sum(len(call) for call in model.calls), 120)
+        self.assertLessEqual(max(len(call) for call in model.calls), 8)
+
+
+# --- Near-duplicate frames ---
+
+def jpeg_bytes(seed, brightness=0):
+    """A smooth random frame; the same seed with a small brightness shift is a near-duplicate."""
+    small = np.random.default_rng(seed).integers(0, 256, (8, 8, 3)).astype(np.int16) + brightness
+    image = Image.fromarray(small.clip(0, 255).astype(np.uint8)).resize((640, 640), Image.BILINEAR)
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class DedupTests(SimpleTestCase):
+    def test_query_finds_near_duplicates_only(self):
+        index = HashIndex()
+        index.add("a.jpg", image_hashes(jpeg_bytes(1)))
+        index.add("b.jpg", image_hashes(jpeg_bytes(2)))
+        found = index.query(image_hashes(jpeg_bytes(1, brightness=6)), max_distance=6)
+        self.assertEqual([path for _, path in found], ["a.jpg"])
+        self.assertEqual(index.query(image_hashes(jpeg_bytes(1)), 6, exclude="a.jpg"), [])
+
+    def test_find_leaks_across_splits(self):
+        root = temp_dir(self)
+        split_paths = {}
+        for split, seeds in (("train", [1, 2]), ("val", [3, 1]), ("test", [4])):
+            split_paths[split] = []
+            for i, seed in enumerate(seeds):
+                path = os.path.join(root, f"{split}{i}.jpg")
+                with open(path, "wb") as f:
+                    f.write(jpeg_bytes(seed, brightness=3 if split == "val" else 0))
+                split_paths[split].append(path)
+        leaks = find_leaks(split_paths, max_distance=6, workers=1)
+        self.assertEqual([(a, b) for a, _, b, _, _ in leaks], [("train", "val")])
+        self.assertEqual(leaks[0][1], split_paths["train"][0])
+        self.assertEqual(leaks[0][3], split_paths["val"][1])
+
+
+class CollectionDedupTests(TestCase):
+    def setUp(self):
+        self.base = temp_dir(self)
+        patcher = override_settings(BASE_DIR=self.base, DEDUP_MAX_DISTANCE=6)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        patcher = mock.patch("detector.dedup._index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save(self, content, heading):
+        return save_for_training({"label": "Angsana", "lat": 3.1, "lng": 101.6, "heading": heading}, content)
+
+    @override_settings(DEDUP_ACTION="flag")
+    def test_flag_saves_and_reports(self):
+        first, duplicates = self.save(jpeg_bytes(1), 0)
+        self.assertEqual(duplicates, [])
+        second, duplicates = self.save(jpeg_bytes(1, brightness=5), 90)
+        self.assertEqual(duplicates, [first])
+        self.assertTrue(os.path.exists(second))
+        # Re-saving a pose replaces its own file rather than duplicating it
+        self.assertEqual(self.save(jpeg_bytes(2), 0)[1], [])
+
+    @override_settings(DEDUP_ACTION="reject")
+    def test_reject_is_409_and_writes_nothing(self):
+        self.save(jpeg_bytes(1), 0)
+        with self.assertRaises(ScanError) as raised:
+            self.save(jpeg_bytes(1, brightness=5), 90)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(len(os.listdir(os.path.join(self.base, "dataset_collection", "Angsana"))), 1)
+
+    @override_settings(DEDUP_ACTION="flag")
+    def test_deleted_frames_stop_matching(self):
+        first, _ = self.save(jpeg_bytes(1), 0)
+        second, _ = self.save(jpeg_bytes(2), 90)
+        os.remove(first)
+        call_command("index_collection", stdout=StringIO())  # drops its row behind this process's back
+        self.assertEqual(self.save(jpeg_bytes(1, brightness=5), 180)[1], [])
+        os.remove(second)  # not re-indexed: the missing file is noticed at lookup
+        self.assertEqual(self.save(jpeg_bytes(2, brightness=5), 270)[1], [])
+        self.assertFalse(CollectedImage.objects.filter(path__in=[first, second]).exists())
+
+    @override_settings(DEDUP_ACTION="flag")
+    def test_only_the_index_command_hashes_the_folder(self):
+        copied = os.path.join(self.base, "dataset_collection", "Rain Tree", "copied.jpg")
+        os.makedirs(os.path.dirname(copied))
+        with open(copied, "wb") as f:
+            f.write(jpeg_bytes(1))
+        with mock.patch("detector.dedup.hash_files", side_effect=AssertionError("hashed on a request")):
+            self.assertEqual(self.save(jpeg_bytes(3), 0)[1], [])
+        call_command("index_collection", stdout=StringIO())
+        self.assertEqual(self.save(jpeg_bytes(1, brightness=5), 90)[1], [copied])
+
+    @override_settings(DEDUP_ACTION="reject")
+    def test_workers_see_each_others_saves(self):
+        self.save(jpeg_bytes(1), 0)
+        other_worker = CollectionIndex()
+        found = other_worker.query(image_hashes(jpeg_bytes(1, brightness=5)), 6)
+        self.assertEqual(len(found), 1)
+        self.assertEqual(CollectedImage.objects.count(), 1)
+
+
+# --- Tree de-duplication (grid index) ---
+
+class TreeMergeTests(TestCase):
+    box = {"label": "Angsana", "class": 0, "confidence": 0.9, "xyxy": [300, 200, 340, 500]}
+
+    def test_repeat_sightings_merge_into_one_tree(self):
+        first = record_scan(3.1, 101.6, [self.box], heading=0, pitch=0, fov=90)
+        # A metre or so along the street, same tree in view
+        second = record_scan(3.10001, 101.6, [self.box], heading=0, pitch=0, fov=90)
+        self.assertEqual((first.new_trees, second.new_trees), (1, 0))
+        tree = Tree.objects.get()
+        self.assertEqual(tree.observations, 2)
+        self.assertEqual((tree.cell_x, tree.cell_y), cell_of(tree.latitude, tree.longitude))
+
+    def test_other_species_and_far_trees_stay_separate(self):
+        record_scan(3.1, 101.6, [self.box], heading=0, pitch=0, fov=90)
+        other = record_scan(3.1, 101.6, [dict(self.box, label="Rain Tree")], heading=0, pitch=0, fov=90)
+        far = record_scan(3.101, 101.6, [self.box], heading=0, pitch=0, fov=90)  # ~110 m north
+        self.assertEqual((other.new_trees, far.new_trees), (1, 1))
+
+    def test_two_boxes_in_one_frame_are_two_trees(self):
+        scan = record_scan(3.1, 101.6, [self.box, dict(self.box, xyxy=[310, 200, 350, 500])],
+                           heading=0, pitch=0, fov=90)
+        self.assertEqual(scan.new_trees, 2)
+
+    def test_radius_query_crosses_cell_edges(self):
+        size = cell_size_deg()
+        lat = (math.floor(3.0 / size) + 1) * size  # just above a cell boundary
+        tree_lat = lat - size / 100  # ~0.5 m south, in the cell below
+        cell_x, cell_y = cell_of(tree_lat, 101.6)
+        self.assertNotEqual(cell_of(lat + 1e-9, 101.6), (cell_x, cell_y))
+        Tree.objects.create(species="Angsana", latitude=tree_lat, longitude=101.6, cell_x=cell_x, cell_y=cell_y,
+                            first_seen=timezone.now(), last_seen=timezone.now())
+        found = trees_within(lat + 1e-9, 101.6, 5)
+        self.assertEqual(len(found), 1)
+        self.assertLess(found[0][0], 5)
+
+        response = self.client.get("/trees/", {"lat": lat + 1e-9, "lng": 101.6, "radius": 5})
+        self.assertEqual(response.json()["count"], 1)
+        for bad in ({"lat": "nan", "lng": 101.6}, {"lat": lat, "lng": "inf"}, {"lat": lat, "lng": 101.6, "radius": "nan"}):
+            self.assertEqual(self.client.get("/trees/", bad).status_code, 400)
+
+
+# --- Route scans ---
+
+class RouteSamplingTests(SimpleTestCase):
+    def test_polyline_spacing_carries_across_corners(self):
+        north = 100 / METERS_PER_DEGREE
+        # 100 m north, then 100 m east: samples every 30 m of walked distance
+        points = [(3.1, 101.6), (3.1 + north, 101.6), (3.1 + north, 101.6 + north / math.cos(math.radians(3.1)))]
+        samples = sample_polyline(points, 30)
+        self.assertEqual(len(samples), 8)  # 0, 30, ..., 180 m and the far end
+        self.assertEqual((samples[0], samples[-1]), (points[0], points[-1]))
+        self.assertAlmostEqual(distance_m(*samples[0], *samples[3]), 90, delta=0.5)
+        self.assertAlmostEqual(distance_m(*points[1], *samples[4]), 20, delta=0.5)
+
+    def test_bbox_grid_and_headings(self):
+        step = 50 / METERS_PER_DEGREE
+        grid = sample_bbox(101.6, 3.1, 101.6 + 2.5 * step, 3.1 + 1.5 * step, 50)
+        self.assertEqual(len(grid), 2 * 3)
+        self.assertEqual(grid[0], (3.1, 101.6))
+        self.assertEqual(headings(90), [0, 90, 180, 270])
+        self.assertEqual(headings(100), [0, 100, 200, 300])
+        self.assertEqual(route_poses(grid[:2], 120, pitch=5, fov=80)[:2], [(3.1, 101.6, 0, 5, 80), (3.1, 101.6, 120, 5, 80)])
+        with self.assertRaises(ValueError):
+            parse_polyline("3.1,101.6")
+
+
+class ScanRouteResumeTests(TestCase):
+    route = "3.1,101.6;3.1003,101.6"  # ~33 m: two points at 40 m spacing
+
+    def scan(self, checkpoint, fail=()):
+        fetched = []
+
+        def fetch(*pose):
+            fetched.append(pose)
+            if pose[2] in fail:
+                raise StreetViewError("no imagery")
+            return jpeg_bytes(1)
+
+        with mock.patch("detector.management.commands.scan_route.fetch_streetview", side_effect=fetch), \
+                mock.patch("detector.management.commands.scan_route.get_model", return_value=DetectingModel()):
+            call_command("scan_route", polyline=self.route, spacing=40, heading_step=90, rps=1000, batch_size=3,
+                         checkpoint=checkpoint, stdout=StringIO(), stderr=StringIO())
+        return fetched
+
+    def test_resume_only_fetches_what_is_missing(self):
+        checkpoint = os.path.join(temp_dir(self), "job.jsonl")
+        self.assertEqual(len(self.scan(checkpoint, fail={180})), 8)
+        self.assertEqual(Scan.objects.count(), 6)
+        # A crash mid-write leaves a partial line behind
+        with open(checkpoint, "a", encoding="utf-8") as f:
+            f.write('{"done": ["')
+        retried = self.scan(checkpoint)
+        self.assertEqual(sorted(pose[2] for pose in retried), [180, 180])
+        self.assertEqual(Scan.objects.count(), 8)
+        self.assertEqual(self.scan(checkpoint), [])
+
+
+# --- Metrics and request logs ---
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("detector.metrics._registry", [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counter_and_histogram_exposition(self):
+        counter = Counter("test_total", "Things.", ["kind"])
+        counter.inc(kind='a "b"')
+        counter.inc(2, kind='a "b"')
+        histogram = Histogram("test_seconds", "Latency.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(counter.render(), ["# HELP test_total Things.", "# TYPE test_total counter",
+                                            'test_total{kind="a \\"b\\""} 3'])
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 1', 'test_seconds_bucket{le="1.0"} 3', 'test_seconds_bucket{le="+Inf"} 4',
+            "test_seconds_sum 4.05", "test_seconds_count 4",
+        ])
+
+
+class RequestLogTests(TestCase):
+    def test_request_id_is_echoed_or_generated(self):
+        with self.assertLogs("detector.requests", "INFO") as logs:
+            response = self.client.get("/trees/", {"lat": "x"}, headers={"X-Request-ID": "job-42.a"})
+            generated = self.client.get("/trees/", {"lat": "x"}, headers={"X-Request-ID": "no spaces allowed"})
+        self.assertEqual(response["X-Request-ID"], "job-42.a")
+        self.assertRegex(generated["X-Request-ID"], "^[0-9a-f]{32}$")
+        fields = logs.records[0].fields
+        self.assertEqual((fields["view"], fields["status"], fields["path"]), ("trees", 400, "/trees/"))
+
+    def test_metrics_endpoint_counts_requests_without_logging_scrapes(self):
+        with self.assertLogs("detector.requests", "INFO"):
+            self.client.get("/trees/", {"lat": "x"})
+        with self.assertNoLogs("detector.requests", "INFO"):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode("utf-8")
+        self.assertIn("# TYPE treeid_http_requests_total counter", body)
+        self.assertIn('treeid_http_requests_total{view="trees",method="GET",status="400"}', body)
+
+    def test_json_log_lines(self):
+        record = logging.LogRecord("detector.x", logging.INFO, __file__, 1, "scan %s", ("done",), None)
+        record.request_id, record.fields = "abc", {"status": 200}
+        line = json.loads(JSONFormatter().format(record))
+        self.assertEqual((line["message"], line["request_id"], line["status"]), ("scan done", "abc", 200))
+
+
+# --- Benchmarks and load tests ---
+
+class ScratchInventoryTests(TestCase):
+    def test_only_the_runs_own_scans_are_deleted(self):
+        box = {"label": "Angsana", "class": 0, "confidence": 0.9, "xyxy": [300, 200, 340, 500]}
+        lat, lng = BENCH_ORIGIN
+        earlier = record_scan(lat, lng, [box], heading=0, pitch=0, fov=90)
+        with scratch_inventory():
+            record_scan(lat + 0.01, lng, [box], heading=0, pitch=0, fov=90)
+            real = record_scan(3.1, 101.6, [box], heading=0, pitch=0, fov=90)  # a user scanning meanwhile
+        self.assertEqual(sorted(Scan.objects.values_list("id", flat=True)), [earlier.id, real.id])
+        self.assertEqual(Tree.objects.count(), 2)
+        self.assertFalse(Tree.objects.filter(detections=None).exists())  # no orphans of deleted scans
+
+
+class FakeStreetViewTests(SimpleTestCase):
+    def test_parse_errors(self):
+        self.assertEqual(parse_errors("503:0.02, 429:0.01,hang:0.005"), {"503": 0.02, "429": 0.01, "hang": 0.005})
+        self.assertEqual(parse_errors(None), {})
+        for spec in ("teapot:0.1", "503:0.6,500:0.6"):
+            with self.assertRaises(ValueError):
+                parse_errors(spec)
+
+    def test_injected_failures_are_served_and_counted(self):
+        server = start_server(errors={"503": 0.3, "not_image": 0.2}, seed=7)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        session = requests.Session()
+        self.addCleanup(session.close)
+        answers = [session.get(f"{server.base_url}?location=3.1,101.6&heading={h}", timeout=5) for h in range(40)]
+        kinds = ["not_image" if r.status_code == 200 and r.headers["Content-Type"] == "text/plain"
+                 else str(r.status_code) for r in answers]
+
+        deadline = time.monotonic() + 5  # responses are counted just after they are sent
+        while server.requests_served < 40 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(server.responses, {kind: kinds.count(kind) for kind in set(kinds)})
+        self.assertTrue(0 < server.responses["503"] < 40 and 0 < server.responses["not_image"] < 40)
+        self.assertEqual(answers[kinds.index("200")].content[:2], b"\xff\xd8")
+        # The same seed fails the same requests
+        replay = FakeStreetViewServer(("127.0.0.1", 0), errors={"503": 0.3, "not_image": 0.2}, seed=7)
+        self.addCleanup(replay.server_close)
+        self.assertEqual([replay.plan()[1] or "200" for _ in range(40)], kinds)
+
+
+class LoadgenTests(SimpleTestCase):
+    def test_generated_sequence_is_seeded_and_near_the_origin(self):
+        sequence = generate_sequence(50, sessions=3, origin=(3.1, 101.6), seed=1)
+        self.assertEqual(sequence, generate_sequence(50, sessions=3, origin=(3.1, 101.6), seed=1))
+        self.assertNotEqual(sequence, generate_sequence(50, sessions=3, origin=(3.1, 101.6), seed=2))
+        self.assertEqual(len(sequence), 50)
+        for request in sequence:
+            self.assertEqual(request["path"], "/streetview-scan/")
+            self.assertLess(distance_m(3.1, 101.6, request["body"]["lat"], request["body"]["lng"]), 2000)
+
+    def test_report_counts_statuses_and_target_errors(self):
+        statuses = iter([200, 503, 200, RuntimeError("boom"), 200])
+        lock = threading.Lock()
+
+        class Target:
+            def post(self, path, body):
+                with lock:
+                    status = next(statuses)
+                if isinstance(status, Exception):
+                    raise status
+                return status, {"degraded": True} if status == 200 else None
+
+        report = run_load(generate_sequence(5, seed=0), Target(), rps=1000, concurrency=1)
+        self.assertEqual(report["sent"], 5)
+        self.assertEqual(report["errors"], {"503": 1, "RuntimeError": 1})
+        self.assertEqual((report["latency"]["count"], report["degraded"]), (3, 3))
+        self.assertAlmostEqual(report["error_rate"], 0.4)
+
+
+# --- Dataset manifest ---
+
+class YoloDatasetTestCase(SimpleTestCase):
+    """A three-image YOLO dataset (two train, one val) under a scratch directory."""
+
+    def setUp(self):
+        self.root = temp_dir(self)
+        with open(os.path.join(self.root, "data.yaml"), "w") as f:
+            f.write("names: [Angsana, Rain Tree]\n")
+        self.write("train", "a", "0 0.5 0.5 0.2 0.4\n1 0.2 0.2 0.1 0.1\n")
+        self.write("train", "b", "1 0.5 0.5 0.2 0.4\n")
+        self.write("val", "c", "0 0.5 0.5 0.2 0.4\nnot a box\n5 0.5 0.5 0.1 0.1\n")
+
+    def write(self, split, stem, label, mtime=None):
+        image = os.path.join(self.root, "images", split, f"{stem}.jpg")
+        label_path = os.path.join(self.root, "labels", split, f"{stem}.txt")
+        for path in (image, label_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(image):
+            Image.new("RGB", (64, 48)).save(image)
+        with open(label_path, "w") as f:
+            f.write(label)
+        if mtime is not None:
+            os.utime(label_path, ns=(mtime, mtime))
+        return image
+
+
+class ManifestBuildTests(YoloDatasetTestCase):
+    def build(self):
+        with mock.patch("dataset_manifest._parse_one", wraps=dataset_manifest._parse_one) as parse:
+            manifest = dataset_manifest.build(self.root)
+        return manifest, sorted(os.path.basename(call.args[0][0]) for call in parse.call_args_list)
+
+    def test_rebuild_only_parses_changed_files(self):
+        manifest, parsed = self.build()
+        self.assertEqual(parsed, ["a.jpg", "b.jpg", "c.jpg"])
+        self.assertEqual(manifest.instance_counts("train"), {"Angsana": 1, "Rain Tree": 2})
+        self.assertEqual((manifest.width.tolist(), manifest.height.tolist()), ([64] * 3, [48] * 3))
+
+        self.write("train", "b", "0 0.5 0.5 0.2 0.4\n", mtime=os.stat(manifest.label[1]).st_mtime_ns + 10**9)
+        self.write("test", "d", "")
+        os.remove(os.path.join(self.root, "images", "val", "c.jpg"))
+        manifest, parsed = self.build()
+        self.assertEqual(parsed, ["b.jpg", "d.jpg"])
+        self.assertEqual(manifest.split.tolist(), ["train", "train", "test"])
+        self.assertEqual(manifest.instance_counts(), {"Angsana": 2, "Rain Tree": 1})
+        self.assertEqual(self.build()[1], [])
+        # Unchanged rows keep their boxes across rebuilds
+        self.assertEqual(manifest.images_with_class(1), [os.path.join(self.root, "images", "train", "a.jpg")])
+
+    def test_problems(self):
+        manifest, _ = self.build()
+        label = os.path.join(self.root, "labels", "val", "c.txt")
+        self.assertEqual(manifest.problems("val"), [(label, 2, "malformed line"),
+                                                    (label, 3, "invalid class index (class 5)")])
+        self.assertEqual(manifest.instance_counts("val"), {"Angsana": 1, "Rain Tree": 0})
+
+
+class ShardPackTests(YoloDatasetTestCase):
+    def test_pack_and_read_back(self):
+        Image.new("RGB", (30, 60), (10, 20, 30)).save(os.path.join(self.root, "images", "train", "b.jpg"))
+        self.write("train", "e", "0 0.1 0.1 0.05 0.05\n")
+        manifest = dataset_manifest.build(self.root)
+        out = os.path.join(self.root, "shards")
+
+        self.assertEqual(shard_dataset.pack_split(manifest, "train", out, imgsz=32, shard_size=2, workers=1), 3)
+        split_dir = os.path.join(out, "train")
+        index = shard_dataset.load_index(split_dir)
+        self.assertEqual(index["im_file"].tolist(), manifest.image[manifest.image_mask("train")].tolist())
+        self.assertEqual((index["shard"].tolist(), index["slot"].tolist()), ([0, 0, 1], [0, 1, 0]))
+        self.assertEqual(index["ori_shape"].tolist(), [[48, 64], [60, 30], [48, 64]])
+        self.assertEqual(index["shape"].tolist(), [[24, 32], [32, 16], [24, 32]])
+        self.assertEqual((index["box_start"].tolist(), index["box_count"].tolist()), ([0, 2, 3], [2, 1, 1]))
+        self.assertEqual(index["cls"].tolist(), [0, 1, 1, 0])
+        self.assertTrue(np.allclose(index["bboxes"][3], [0.1, 0.1, 0.05, 0.05]))
+
+        shard = np.load(shard_dataset.shard_path(split_dir, 0), mmap_mode="r")
+        expected, _ = shard_dataset.load_resized(index["im_file"][1], 32)
+        self.assertTrue(np.array_equal(shard[1, :32, :16], expected))
+        self.assertFalse(shard[1, :, 16:].any())  # padding stays black
+
+        # Re-packed only when the images or imgsz change
+        self.assertEqual(shard_dataset.pack_split(manifest, "train", out, imgsz=32, shard_size=2, workers=1), 0)
+        self.assertEqual(shard_dataset.pack_split(manifest, "train", out, imgsz=64, shard_size=2, workers=1), 3)
+
+
+# --- Dataset splits ---
+
+class StratifiedSplitTests(SimpleTestCase):
+    def counts(self):
+        rng = np.random.default_rng(7)
+        counts = rng.poisson([3.0, 2.0, 1.0, 0.05], size=(400, 4))  # the last class is rare
+        counts[:20] = 0  # background images
+        return counts
+
+    def test_same_seed_same_split(self):
+        ratios = [0.7, 0.2, 0.1]
+        first = split_dataset.stratify(self.counts(), ratios, seed=3)
+        self.assertTrue(np.array_equal(first, split_dataset.stratify(self.counts(), ratios, seed=3)))
+        self.assertFalse(np.array_equal(first, split_dataset.stratify(self.counts(), ratios, seed=4)))
+
+    def test_every_class_split_close_to_ratios(self):
+        counts = self.counts()
+        ratios = np.array([0.7, 0.2, 0.1])
+        assignment = split_dataset.stratify(counts, ratios, seed=0)
+        self.assertTrue((assignment >= 0).all())
+        per_split = np.stack([counts[assignment == s].sum(axis=0) for s in range(3)])
+        shares = per_split / counts.sum(axis=0)
+        self.assertTrue(np.abs(shares - ratios[:, None]).max() < 0.1, shares)
+        self.assertTrue((per_split[:, 3] > 0).all())  # the rare class reaches every split
+        image_shares = np.bincount(assignment, minlength=3) / len(assignment)
+        self.assertTrue(np.abs(image_shares - ratios).max() < 0.05, image_shares)
+
+
+# --- Pseudo-labelling ---
+
+class AutolabelTests(SimpleTestCase):
+    def test_yolo_lines_are_normalized_xywh(self):
+        lines = yolo_lines(np.array([[100.0, 50.0, 300.0, 250.0], [-10.0, 0.0, 50.0, 700.0]]),
+                           np.array([0.9, 0.4]), np.array([1, 0]), width=400, height=500, save_conf=True)
+        self.assertEqual(lines, ["1 0.500000 0.300000 0.500000 0.400000 0.900000\n",
+                                 "0 0.062500 0.500000 0.125000 1.000000 0.400000\n"])
+
+    def label(self, images, out, **options):
+        with mock.patch("detector.management.commands.autolabel.get_model", return_value=DetectingModel()):
+            call_command("autolabel", images=images, out=out, batch_size=2, prefetch=4,
+                         stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_resumes_after_a_truncated_summary(self):
+        images, out = temp_dir(self), temp_dir(self)
+        for i in range(5):
+            with open(os.path.join(images, f"frame{i}.jpg"), "wb") as f:
+                f.write(jpeg_bytes(i))
+        self.label(images, out, limit=3)
+        # Crash mid-write: a partial summary line and no label for frame3
+        with open(os.path.join(out, "summary.jsonl"), "a", encoding="utf-8") as f:
+            f.write('{"image": "frame3.jpg", "bo')
+        self.label(images, out)
+
+        self.assertEqual(sorted(os.listdir(out)), [f"frame{i}.txt" for i in range(5)] + ["summary.json", "summary.jsonl"])
+        with open(os.path.join(out, "frame4.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read().split()[0], "0")
+        with open(os.path.join(out, "summary.json"), encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual((summary["images"], summary["boxes"], summary["counts"]), (5, 5, {"Angsana": 5}))
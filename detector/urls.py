@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path
 from detector import views  # Import your app's views
+from detector import async_views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -12,9 +13,23 @@ urlpatterns = [
     # API Endpoints
     path('streetview-save/', views.streetview_save, name='streetview_save'),
     path('streetview-scan/', views.streetview_scan, name='streetview_scan'),
+
+    # Async variants for ASGI deployments (e.g. `uvicorn treeid.asgi:application`)
+    path('async/streetview-save/', async_views.streetview_save, name='streetview_save_async'),
+    path('async/streetview-scan/', async_views.streetview_scan, name='streetview_scan_async'),
     
-    # NEW: Download Endpoint
+    # Inventory: paged/filtered listing and full download
+    path('inventory/', views.inventory, name='inventory'),
+    path('inventory/export/', views.export_inventory, name='export_inventory'),
+    path('trees/', views.trees, name='trees'),
     path('download-inventory/', views.download_inventory_csv, name='download_inventory_csv'),
+
+    # Inference queue metrics (per worker process)
+    path('inference-metrics/', views.inference_metrics, name='inference_metrics'),
+    path('cache-metrics/', views.cache_metrics, name='cache_metrics'),
+    # Prometheus scrape target. No trailing slash on purpose: /metrics is Prometheus'
+    # default metrics_path, so scrape configs work without a redirect hop.
+    path('metrics', views.metrics, name='metrics'),
 ]
 
 # --- THIS IS THE FIX ---
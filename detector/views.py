@@ -1,22 +1,27 @@
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, FileResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.conf import settings
-from ultralytics import YOLO
-from PIL import Image
-from io import BytesIO
 from collections import Counter
-from datetime import datetime
-import requests
-import json
-import os
-import csv
-
-# --- Load Model and API Key ---
-
-# Adjust paths as necessary based on your Django project structure
-model_path = os.path.join(settings.BASE_DIR, "runs", "train_streetview", "yolov10x_640_streetview_v3", "weights", "best.pt")
-model = YOLO(model_path)
+import math
+
+from .batching import get_scheduler
+from .export import EXPORT_FORMATS, ExportError, export_filename, export_stream
+from .imagery import get_cache
+from .inventory import DEFAULT_PAGE_SIZE, filter_scans, iter_csv, log_row, page_scans
+from .metrics import render as render_metrics
+from .models import Scan
+from .profiles import stats as profile_stats
+from .result_cache import get_result_cache
+from .scanning import (
+    ScanError, fetch_image, finish_panorama, finish_scan, parse_pose, parse_scan_request, run_detection,
+    run_panorama, save_for_training,
+)
+from .spatial import trees_within
+
+# --- API Key ---
+# The YOLOv10 model is no longer loaded here: model_registry loads it lazily
+# on the first scan (or at worker startup when DETECTOR_PRELOAD is set).
 
 # Get API key from settings.py 
 API_KEY = settings.GOOGLE_API_KEY 
@@ -39,156 +44,148 @@ def data_collection(request):
 
 # --- Backend API Views ---
 
+def scan_error_response(error):
+    response = JsonResponse({"error": str(error)}, status=error.status)
+    for header, value in error.headers.items():
+        response[header] = value
+    return response
+
+
 @csrf_exempt
 def streetview_save(request):
     """Handles saving new images for training data collection."""
     if request.method != 'POST':
         return JsonResponse({"error": "Only POST method is allowed"}, status=405)
-        
-    data = json.loads(request.body)
-    lat, lng = data.get("lat"), data.get("lng")
-    heading, pitch, fov = data.get("heading"), data.get("pitch"), data.get("fov")
-    label = data.get("label", "Unknown") 
 
-    if not all([lat, lng, heading is not None, pitch is not None, fov, label]):
-        return JsonResponse({"error": "Missing required data"}, status=400)
+    try:
+        data = parse_pose(request.body, require_label=True)
+        content = fetch_image(data)
+        filepath, duplicates = save_for_training(data, content)
+    except ScanError as e:
+        return scan_error_response(e)
 
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview"
-        f"?size=640x640&location={lat},{lng}&heading={heading}&pitch={pitch}&fov={fov}&key={API_KEY}"
-    )
-
-    response = requests.get(url)
-    if "image" not in response.headers.get("Content-Type", ""):
-        return JsonResponse({"error": "Google API did not return an image. Check API key and service activation."}, status=400)
-    
-    # Save inside a specified dataset folder
-    output_dir = os.path.join(settings.BASE_DIR, "dataset_collection", label)
-    os.makedirs(output_dir, exist_ok=True)
-
-    filename = f"{label}_{lat}_{lng}_{heading:.0f}.jpg"
-    filepath = os.path.join(output_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(response.content)
-
-    return JsonResponse({"message": "Saved", "filename": filepath})
+    return JsonResponse({"message": "Saved", "filename": filepath, "near_duplicates": duplicates})
 
 
 @csrf_exempt
 def streetview_scan(request):
     """
-    Scans the current Street View image using YOLOv10, logs detections to a CSV,
-    and returns results and ALL log entries.
+    Scans the current Street View image using YOLOv10, logs detections to the
+    inventory database, and returns results plus the newly logged row.
+    With "mode": "panorama", scans every heading_step degrees around the location.
+    "profile" picks the accuracy/latency tier (see profiles.py), "slicing": true
+    runs tiled inference for small, distant trees (see slicing.py).
     """
     if request.method != 'POST':
         return JsonResponse({"error": "Only POST method is allowed"}, status=405)
-        
-    data = json.loads(request.body)
-    lat, lng = data.get("lat"), data.get("lng")
-    heading, pitch, fov = data.get("heading"), data.get("pitch"), data.get("fov")
-
-    if not all([lat, lng, heading is not None, pitch is not None, fov]):
-        return JsonResponse({"error": "Missing required data"}, status=400)
-        
-    # Request high-quality Google Street View image
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview"
-        f"?size=640x640&location={lat},{lng}"
-        f"&heading={heading}&pitch={pitch}&fov={fov}&key={API_KEY}"
-    )
-
-    response = requests.get(url)
-    if "image" not in response.headers.get("Content-Type", ""):
-        return JsonResponse({"error": "Google API did not return an image. Check API key and service activation."}, status=400)
-
-    # Prepare image for model prediction
-    image = Image.open(BytesIO(response.content))
-    scan_dir = os.path.join(settings.MEDIA_ROOT, "scans")
-    os.makedirs(scan_dir, exist_ok=True)
-    
-    raw_path = os.path.join(scan_dir, "captured_streetview.jpg")
-    image.save(raw_path)
-
-    # Run YOLOv10 detection
-    results = model.predict(raw_path, conf=0.25, imgsz=640, verbose=False, augment=True)
-
-    detections = []
-    output_paths = []
-    all_labels = [] 
-
-    for i, r in enumerate(results):
-        predict_filename = f"predicted_streetview_{i}.jpg"
-        predict_path = os.path.join(scan_dir, predict_filename)
-        r.save(filename=predict_path)
-        
-        # Construct public URL for the image
-        output_url = os.path.join(settings.MEDIA_URL, "scans", predict_filename).replace("\\", "/")
-        output_paths.append(output_url)
-
-        for box in r.boxes:
-            label_name = model.names[int(box.cls[0])] 
-            all_labels.append(label_name) 
-            detections.append({
-                "class": int(box.cls[0]),
-                "label": label_name,
-                "confidence": float(box.conf[0]),
-                "xyxy": box.xyxy[0].tolist()
-            })
-
-    total_trees = len(detections)
-    tree_counts = Counter(all_labels) 
-
-    # --- CSV LOGGING: Write current scan data ---
-    log_dir = os.path.join(settings.MEDIA_ROOT, "logs")
-    os.makedirs(log_dir, exist_ok=True)
-    log_file_path = os.path.join(log_dir, "treeInventory.csv")
-    file_exists = os.path.isfile(log_file_path)
-    
-    all_logs = [] # Changed variable name to better reflect "all" entries
-
-    if total_trees > 0:
-        try:
-            counts_str = ", ".join([f"{label}: {count}" for label, count in tree_counts.items()])
-            data_row = [
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                lat, lng, total_trees, counts_str
-            ]
-            with open(log_file_path, "a", encoding="utf-8", newline="") as f:
-                writer = csv.writer(f)
-                if not file_exists:
-                    writer.writerow(["Timestamp", "Latitude", "Longitude", "Total_Trees", "Counts"])
-                writer.writerow(data_row)
-        except Exception as e:
-            print(f"⚠️ Error writing log: {e}")
-
-    # --- CSV READING: Read ALL log entries for the frontend table ---
-    if os.path.exists(log_file_path):
-        try:
-            with open(log_file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                # Get ALL entries
-                all_logs = list(reader)
-                # Reverse the list so the newest entries are at the top of the table
-                all_logs.reverse() 
-        except Exception as e:
-            print(f"Error reading log: {e}")
 
+    try:
+        data = parse_scan_request(request.body)
+        if data["mode"] == "panorama":
+            return JsonResponse(finish_panorama(data, *run_panorama(data)))
+        content = fetch_image(data)
+        outcome = run_detection(content, data["annotate"], data["profile"], data["slicing"])
+    except ScanError as e:
+        return scan_error_response(e)
+
+    return JsonResponse(finish_scan(data, outcome))
+
+
+def inventory(request):
+    """
+    Pages through the logged scans, newest first.
+    Query params: limit, cursor, since, until, species, bbox (see inventory.filter_scans).
+    """
+    try:
+        scans = filter_scans(request.GET)
+        page, next_cursor = page_scans(
+            scans, cursor=request.GET.get("cursor"), limit=request.GET.get("limit", DEFAULT_PAGE_SIZE)
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    payload = {"results": [log_row(scan) for scan in page], "next_cursor": next_cursor}
+    if request.GET.get("count") == "1":
+        payload["count"] = scans.count()
+    return JsonResponse(payload)
+
+
+def trees(request):
+    """
+    De-duplicated trees within ?radius= metres (default 100, max 5000) of
+    ?lat=&lng=, nearest first. Optional ?species=.
+    """
+    try:
+        lat, lng = float(request.GET["lat"]), float(request.GET["lng"])
+        radius = min(float(request.GET.get("radius", 100)), 5000.0)
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "lat and lng are required numbers"}, status=400)
+    if not all(map(math.isfinite, (lat, lng, radius))):
+        return JsonResponse({"error": "lat, lng and radius must be finite"}, status=400)
+
+    found = trees_within(lat, lng, radius, species=request.GET.get("species") or None)
+    counts = Counter(tree.species for _, tree in found)
     return JsonResponse({
-        "message": "✅ Scan successful",
-        "outputs": output_paths,
-        "detections": detections,
-        "tree_counts": tree_counts,
-        "total_trees": total_trees,
-        "recent_logs": all_logs # Returning all logs under the existing key
+        "count": len(found),
+        "tree_counts": counts,
+        "trees": [
+            {
+                "id": tree.id,
+                "species": tree.species,
+                "latitude": tree.latitude,
+                "longitude": tree.longitude,
+                "distance_m": round(d, 1),
+                "observations": tree.observations,
+            }
+            for d, tree in found[:500]
+        ],
     })
 
 
+def export_inventory(request):
+    """
+    Streams the inventory as csv, geojson or parquet (?format=), optionally
+    gzipped (?gzip=1), with the same filters as the inventory endpoint.
+    """
+    fmt = request.GET.get("format", "csv")
+    gzip = request.GET.get("gzip") == "1"
+    try:
+        stream = export_stream(filter_scans(request.GET), fmt, gzip=gzip)
+    except (ValueError, ExportError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    content_type = "application/gzip" if gzip else EXPORT_FORMATS[fmt][0]
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(fmt, gzip)}"'
+    return response
+
+
 def download_inventory_csv(request):
-    """Handles downloading the complete tree inventory CSV file."""
-    log_file_path = os.path.join(settings.MEDIA_ROOT, "logs", "treeInventory.csv")
-    if os.path.exists(log_file_path):
-        # Serve the file securely
-        return FileResponse(open(log_file_path, 'rb'), as_attachment=True, filename="treeInventory.csv")
-    else:
-        return HttpResponse("No CSV file found. Run a scan first.", status=404)
\ No newline at end of file
+    """Streams the complete tree inventory as CSV, straight from the database."""
+    if not Scan.objects.exists():
+        return HttpResponse("No inventory found. Run a scan first.", status=404)
+    response = StreamingHttpResponse(iter_csv(Scan.objects.order_by("timestamp", "id")), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="treeInventory.csv"'
+    return response
+
+
+def inference_metrics(request):
+    """Returns the micro-batching queue and profile metrics for this worker process."""
+    metrics = get_scheduler().metrics()
+    metrics["profiles"] = profile_stats()
+    return JsonResponse(metrics)
+
+
+def cache_metrics(request):
+    """Returns hit/miss counters for this worker's caches."""
+    cache = get_cache()
+    result_cache = get_result_cache()
+    return JsonResponse({
+        "streetview_images": cache.stats() if cache is not None else None,
+        "detections": result_cache.stats() if result_cache is not None else None,
+    })
+
+
+def metrics(request):
+    """Prometheus scrape endpoint: stage latencies, request, cache and error counters for this worker."""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,8 @@
 import os
 from ultralytics import YOLO
 
+from sharded_dataset import ShardedDetectionTrainer, ShardedDetectionValidator
+
 # --- IMPORTANT ---
 # Specify the path to your training config file here
 CONFIG_FILE_PATH = "configs/your_config_file.yaml"
@@ -30,11 +32,13 @@ def save_accuracy_report(trainer):
         
         # Run validation on the 'val' split
         # It uses the data and imgsz from the original training arguments
+        # (and reads from the packed shards when `python shard_dataset.py` has been run)
         results = model.val(
             data=trainer.args.data,
             imgsz=trainer.args.imgsz,
             split='val',
-            verbose=False  # We'll print the summary to the file, not the console
+            verbose=False,  # We'll print the summary to the file, not the console
+            validator=ShardedDetectionValidator,
         )
         
         # Define the path for the new report
@@ -75,5 +79,6 @@ if __name__ == "__main__":
         
         print(f"Starting training with config: {CONFIG_FILE_PATH}")
         
-        # Start training
-        model.train(cfg=CONFIG_FILE_PATH)
+        # Start training; splits packed with `python shard_dataset.py` are read from
+        # their memory-mapped shards, the rest from the loose image/label files
+        model.train(cfg=CONFIG_FILE_PATH, trainer=ShardedDetectionTrainer)
@@ -0,0 +1,178 @@
+"""
+Packs the detection dataset into a few large, memory-mapped shards.
+
+Each split becomes <out>/<split>/shard-NNNNN.npy files holding images already
+decoded and resized (long side = imgsz, as the YOLO loader would), one
+imgsz x imgsz x 3 BGR slot per image, plus an index.npz with each image's
+shard, slot, sizes and labels (taken from the dataset manifest). Training then
+reads slices of a few open memory maps instead of opening, reading and
+decoding thousands of small JPEG and .txt files per epoch; see
+sharded_dataset.py for the Ultralytics hook.
+
+A split is only re-packed when its images changed since the last run.
+
+    python shard_dataset.py                       # pack train/val/test at 640
+    python shard_dataset.py --benchmark --limit 200
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import dataset_manifest
+
+DEFAULT_OUT = os.path.join(dataset_manifest.DATASET_DIR, "shards")
+DEFAULT_IMGSZ = 640
+DEFAULT_SHARD_SIZE = 1000  # images per shard, about 1.2 GB at 640
+_CHUNK = 64  # images per worker task
+
+
+def shard_path(split_dir, shard):
+    return os.path.join(split_dir, f"shard-{shard:05d}.npy")
+
+
+def load_resized(path, imgsz=DEFAULT_IMGSZ):
+    """(BGR array with long side imgsz, original (h, w)), like the YOLO loader's rect mode."""
+    with Image.open(path) as image:
+        w0, h0 = image.size
+        r = imgsz / max(h0, w0)
+        w, h = min(int(np.ceil(w0 * r)), imgsz), min(int(np.ceil(h0 * r)), imgsz)
+        image.draft("RGB", (w, h))  # JPEGs decode straight to a smaller size
+        image = image.convert("RGB")
+        if image.size != (w, h):
+            image = image.resize((w, h), Image.BILINEAR)
+        return np.asarray(image)[:, :, ::-1], (h0, w0)
+
+
+def _pack_chunk(task):
+    path, start, images, imgsz = task
+    shard = np.load(path, mmap_mode="r+")
+    sizes = []
+    for offset, image_path in enumerate(images):
+        array, (h0, w0) = load_resized(image_path, imgsz)
+        h, w = array.shape[:2]
+        shard[start + offset, :h, :w] = array
+        sizes.append((h0, w0, h, w))
+    shard.flush()
+    return sizes
+
+
+def load_index(split_dir):
+    with np.load(os.path.join(split_dir, "index.npz"), allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def pack_split(manifest, split, out=DEFAULT_OUT, imgsz=DEFAULT_IMGSZ, shard_size=DEFAULT_SHARD_SIZE,
+               workers=None, force=False):
+    """Packs one split; returns the number of images packed (0 when already up to date)."""
+    rows = np.flatnonzero(manifest.image_mask(split) & (manifest.width > 0))
+    if not len(rows):
+        return 0
+    split_dir = os.path.join(out, split)
+    images = manifest.image[rows]
+    mtimes = manifest.image_mtime[rows]
+    label_mtimes = manifest.label_mtime[rows]
+    if not force and os.path.exists(os.path.join(split_dir, "index.npz")):
+        index = load_index(split_dir)
+        if (int(index["imgsz"]) == imgsz and np.array_equal(index["im_file"], images)
+                and np.array_equal(index["image_mtime"], mtimes) and np.array_equal(index["label_mtime"], label_mtimes)):
+            return 0
+
+    os.makedirs(split_dir, exist_ok=True)
+    for name in os.listdir(split_dir):
+        if name.startswith("shard-"):
+            os.remove(os.path.join(split_dir, name))
+
+    n = len(images)
+    shard_ids, slots = np.arange(n) // shard_size, np.arange(n) % shard_size
+    tasks = []
+    for shard in range(int(shard_ids[-1]) + 1):
+        count = int((shard_ids == shard).sum())
+        path = shard_path(split_dir, shard)
+        np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(count, imgsz, imgsz, 3)).flush()
+        first = shard * shard_size
+        for start in range(0, count, _CHUNK):
+            stop = min(start + _CHUNK, count)
+            tasks.append((path, start, images[first + start:first + stop].tolist(), imgsz))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sizes = np.array([size for chunk in pool.map(_pack_chunk, tasks) for size in chunk], dtype=np.int32)
+
+    box_mask = manifest.box_mask(split) & np.isin(manifest.box_image, rows)
+    box_image = manifest.box_image[box_mask]
+    position = np.searchsorted(rows, box_image)  # manifest row -> position in this split
+    counts = np.bincount(position, minlength=n)
+    np.savez(
+        os.path.join(split_dir, "index.npz"),
+        imgsz=np.int32(imgsz),
+        im_file=images,
+        image_mtime=mtimes,
+        label_mtime=label_mtimes,
+        shard=shard_ids.astype(np.int32),
+        slot=slots.astype(np.int32),
+        ori_shape=sizes[:, :2],
+        shape=sizes[:, 2:],
+        box_start=np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64),
+        box_count=counts.astype(np.int32),
+        cls=manifest.box_cls[box_mask].astype(np.int32),
+        bboxes=manifest.box_xywh[box_mask].astype(np.float32),
+    )
+    return n
+
+
+def benchmark_read(split, out=DEFAULT_OUT, limit=200):
+    """Images/sec reading `limit` images of a split from loose JPEGs vs. from the shards (single CPU core)."""
+    index = load_index(os.path.join(out, split))
+    imgsz = int(index["imgsz"])
+    order = np.random.default_rng(0).permutation(len(index["im_file"]))[:limit]
+
+    started = time.perf_counter()
+    for i in order:
+        load_resized(index["im_file"][i], imgsz)
+        label = dataset_manifest.label_path_for(index["im_file"][i])
+        if label.exists():
+            dataset_manifest.parse_label_file(label)
+    loose = len(order) / (time.perf_counter() - started)
+
+    shards = {}
+    started = time.perf_counter()
+    for i in order:
+        shard = int(index["shard"][i])
+        if shard not in shards:
+            shards[shard] = np.load(shard_path(os.path.join(out, split), shard), mmap_mode="r")
+        h, w = index["shape"][i]
+        np.ascontiguousarray(shards[shard][index["slot"][i], :h, :w])
+        start = index["box_start"][i]
+        index["bboxes"][start:start + index["box_count"][i]].copy()
+    sharded = len(order) / (time.perf_counter() - started)
+    return {"images": len(order), "loose_images_per_sec": loose, "sharded_images_per_sec": sharded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=dataset_manifest.DATASET_DIR)
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--splits", default=",".join(dataset_manifest.SPLITS))
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ, help="Must match the training imgsz")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Images per shard")
+    parser.add_argument("--workers", type=int, help="Decoding processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Re-pack even if nothing changed")
+    parser.add_argument("--benchmark", action="store_true", help="Compare read speed with the loose files")
+    parser.add_argument("--limit", type=int, default=200, help="Images read per benchmark")
+    args = parser.parse_args()
+
+    manifest = dataset_manifest.build(args.dataset)
+    for split in args.splits.split(","):
+        packed = pack_split(manifest, split, args.out, args.imgsz, args.shard_size, args.workers, args.force)
+        print(f"📦 {split}: {packed} images packed" if packed else f"📦 {split}: up to date")
+        if args.benchmark and os.path.exists(os.path.join(args.out, split, "index.npz")):
+            result = benchmark_read(split, args.out, args.limit)
+            print(f"⏱️ {split}: loose {result['loose_images_per_sec']:.0f} img/s, "
+                  f"sharded {result['sharded_images_per_sec']:.0f} img/s")
+    print(f"✅ Shards in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Ultralytics hook that reads training/validation data from shard_dataset.py shards.
+
+ShardedYOLODataset is a YOLODataset whose labels come from a split's
+index.npz and whose images are slices of memory-mapped shards, so no image or
+label file is opened during an epoch. The trainer and validator below build it
+for any split that has been packed (at the training imgsz) and fall back to the
+loose files otherwise:
+
+    model.train(cfg=..., trainer=ShardedDetectionTrainer)
+    model.val(data=..., validator=ShardedDetectionValidator)
+
+Shards are looked up in SHARD_DIR (default dataset_detection/shards), under the
+name of the split's image directory (images/train -> shards/train).
+"""
+import os
+from copy import copy
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.data.build import build_yolo_dataset
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+import shard_dataset
+
+SHARD_DIR = os.getenv("SHARD_DIR", shard_dataset.DEFAULT_OUT)
+
+
+def shard_dir_for(img_path, imgsz):
+    """The packed split for `img_path` at `imgsz`, or None to use the loose files."""
+    if not isinstance(img_path, (str, Path)):
+        return None
+    split_dir = os.path.join(SHARD_DIR, Path(img_path).name)
+    if not os.path.exists(os.path.join(split_dir, "index.npz")):
+        return None
+    index = shard_dataset.load_index(split_dir)
+    # Packed from a different directory (e.g. a linked split): the contents may differ
+    if os.path.abspath(os.path.dirname(str(index["im_file"][0]))) != os.path.abspath(img_path):
+        return None
+    packed = int(index["imgsz"])
+    if packed != imgsz:
+        LOGGER.warning(f"Shards in {split_dir} were packed at {packed}, not {imgsz}; reading loose files")
+        return None
+    return split_dir
+
+
+class ShardedYOLODataset(YOLODataset):
+    """YOLODataset over memory-mapped shards instead of image and label files."""
+
+    def __init__(self, *args, shard_dir, **kwargs):
+        self.shard_dir = shard_dir
+        self.index = shard_dataset.load_index(shard_dir)
+        self._row = {path: i for i, path in enumerate(self.index["im_file"].tolist())}
+        self._shards = {}
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        im_files = self.index["im_file"].tolist()
+        if self.fraction < 1:
+            im_files = im_files[: round(len(im_files) * self.fraction)]
+        return im_files
+
+    def get_labels(self):
+        index = self.index
+        labels = []
+        for path in self.im_files:
+            i = self._row[path]
+            start, count = index["box_start"][i], index["box_count"][i]
+            labels.append({
+                "im_file": path,
+                "shape": tuple(int(v) for v in index["ori_shape"][i]),
+                "cls": index["cls"][start:start + count].astype(np.float32).reshape(-1, 1),
+                "bboxes": index["bboxes"][start:start + count].copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def _shard(self, shard):
+        # Opened lazily, so each DataLoader worker maps the files itself
+        if shard not in self._shards:
+            self._shards[shard] = np.load(shard_dataset.shard_path(self.shard_dir, shard), mmap_mode="r")
+        return self._shards[shard]
+
+    def load_image(self, i, rect_mode=True):
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+        row = self._row[self.im_files[i]]
+        h, w = (int(v) for v in self.index["shape"][row])
+        h0, w0 = (int(v) for v in self.index["ori_shape"][row])
+        im = np.ascontiguousarray(self._shard(int(self.index["shard"][row]))[self.index["slot"][row], :h, :w])
+        if not rect_mode and not (h == w == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        # Same mosaic buffer bookkeeping as BaseDataset.load_image
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != "ram":
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, (h0, w0), im.shape[:2]
+
+    def cache_images_to_disk(self, i):
+        pass  # the shards already are the on-disk cache
+
+    def check_cache_disk(self, safety_margin=0.5):
+        return False
+
+    def check_cache_ram(self, safety_margin=0.5):
+        import psutil  # installed with ultralytics
+
+        needed = sum(int(h) * int(w) * 3 for h, w in self.index["shape"]) * (1 + safety_margin)
+        return needed < psutil.virtual_memory().available
+
+    def __getstate__(self):
+        # Memory maps do not pickle (spawned DataLoader workers); reopen them on demand
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+
+def build_sharded_dataset(cfg, img_path, batch, data, mode="train", rect=False, stride=32):
+    """build_yolo_dataset, reading from shards when `img_path` has been packed."""
+    shard_dir = shard_dir_for(img_path, cfg.imgsz)
+    if shard_dir is None:
+        return build_yolo_dataset(cfg, img_path, batch, data, mode=mode, rect=rect, stride=stride)
+    LOGGER.info(f"{colorstr(f'{mode}: ')}reading {img_path} from shards in {shard_dir}")
+    return ShardedYOLODataset(
+        shard_dir=shard_dir,
+        img_path=img_path,
+        imgsz=cfg.imgsz,
+        batch_size=batch,
+        augment=mode == "train",
+        hyp=cfg,
+        rect=cfg.rect or rect,
+        cache=cfg.cache or None,
+        single_cls=cfg.single_cls or False,
+        stride=int(stride),
+        pad=0.0 if mode == "train" else 0.5,
+        prefix=colorstr(f"{mode}: "),
+        task=cfg.task,
+        classes=cfg.classes,
+        data=data,
+        fraction=cfg.fraction if mode == "train" else 1.0,
+    )
+
+
+class ShardedDetectionValidator(DetectionValidator):
+    def build_dataset(self, img_path, mode="val", batch=None):
+        return build_sharded_dataset(self.args, img_path, batch, self.data, mode=mode, stride=self.stride)
+
+
+class ShardedDetectionTrainer(DetectionTrainer):
+    def build_dataset(self, img_path, mode="train", batch=None):
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return build_sharded_dataset(self.args, img_path, batch, self.data, mode=mode, rect=mode == "val", stride=gs)
+
+    def get_validator(self):
+        self.loss_names = "box_loss", "cls_loss", "dfl_loss"
+        return ShardedDetectionValidator(
+            self.test_loader, save_dir=self.save_dir, args=copy(self.args), _callbacks=self.callbacks
+        )
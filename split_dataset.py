@@ -0,0 +1,212 @@
+"""
+Seeded, stratified train/val/test splitting of the detection dataset.
+
+Images are assigned with iterative stratification over their per-class box
+counts (Sechidis et al., 2011): the rarest class is placed first, each of its
+images going to the split that still needs the most of that class, so every
+split gets close to its share of each species' instances - Royal Palms
+included - without hand-moving files. The same pool, ratios and seed always
+give the same assignment.
+
+The split is then materialized without copying any bytes:
+
+    move      rename files between dataset_detection/{images,labels}/<split> in place
+              (dataset_detection/data.yaml keeps working)
+    hardlink  / symlink: link the files into <out>/{images,labels}/<split>, with <out>/data.yaml
+    list      write <out>/<split>.txt image lists and <out>/data.yaml pointing at them
+
+File operations run on a thread pool and are idempotent: files already in the
+right place are left alone and stale links from an earlier split are removed.
+Links and lists point at the files where they are now, so re-run them after a
+`move` split.
+
+    python split_dataset.py --ratios 0.7,0.2,0.1 --seed 0 --mode move
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+import dataset_manifest
+
+MODES = ("move", "hardlink", "symlink", "list")
+DEFAULT_RATIOS = {"train": 0.7, "val": 0.2, "test": 0.1}
+DEFAULT_OUT = os.path.join(dataset_manifest.DATASET_DIR, "split")
+
+
+def stratify(counts, ratios, seed=0):
+    """Split index (into `ratios`) for every row of an (images, classes) count matrix."""
+    counts = np.asarray(counts, dtype=np.int64)
+    ratios = np.asarray(ratios, dtype=np.float64) / np.sum(ratios)
+    n_images = counts.shape[0]
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n_images)  # seeded tie-breaking between equal images
+
+    wanted_per_class = np.outer(ratios, counts.sum(axis=0)).astype(np.float64)
+    wanted_images = ratios * n_images
+    assignment = np.full(n_images, -1, dtype=np.int64)
+    remaining = counts.copy()
+
+    def place(image, column=None):
+        need = wanted_per_class[:, column] if column is not None else wanted_images
+        # Most-needed split for this class, then most-needed overall, then the earliest split
+        best = np.lexsort((np.arange(len(ratios)), -wanted_images, -need))[0]
+        assignment[image] = best
+        wanted_per_class[best] -= counts[image]
+        wanted_images[best] -= 1
+        remaining[image] = 0
+
+    while True:
+        left = remaining.sum(axis=0)
+        if not left.any():
+            break
+        column = int(np.flatnonzero(left)[np.argmin(left[left > 0])])
+        for image in order[remaining[order, column] > 0]:
+            place(image, column)
+
+    for image in order[assignment[order] < 0]:  # images without boxes
+        place(image)
+    return assignment
+
+
+def plan(manifest, ratios=DEFAULT_RATIOS, seed=0, pool=None):
+    """{image path: target split} for the images of the `pool` splits (default: all)."""
+    pool = pool or dataset_manifest.SPLITS
+    mask = np.isin(manifest.split, pool)
+    images = manifest.image[mask]
+    names = np.array([os.path.basename(path) for path in images])
+    if len(set(names)) != len(names):
+        duplicates = sorted({n for n in names.tolist() if (names == n).sum() > 1})
+        raise ValueError(f"The same file name is in more than one split: {', '.join(duplicates[:5])}")
+    # Order by file name, not by path, so the result does not depend on where files currently are
+    by_name = np.argsort(names, kind="stable")
+    counts = manifest.image_class_matrix()[mask][by_name]
+    assignment = stratify(counts, list(ratios.values()), seed)
+    splits = list(ratios)
+    return {str(images[i]): splits[s] for i, s in zip(by_name, assignment)}
+
+
+def _operations(assignment, mode, out):
+    """(source, destination) pairs for every image and label."""
+    pairs = []
+    for image, split in assignment.items():
+        label = dataset_manifest.label_path_for(image)
+        root = Path(image).parents[2] if mode == "move" else Path(out)
+        pairs.append((image, root / "images" / split / Path(image).name))
+        if label.exists():
+            pairs.append((str(label), root / "labels" / split / label.name))
+    return pairs
+
+
+def _place(source, destination, mode):
+    """Moves or links one file; returns True if anything changed."""
+    destination = Path(destination)
+    if mode == "move":
+        if Path(source) == destination:
+            return False
+        os.replace(source, destination)
+        return True
+    if destination.is_symlink() or destination.exists():
+        if destination.exists() and os.path.samefile(source, destination):
+            return False
+        destination.unlink()
+    if mode == "hardlink":
+        os.link(source, destination)
+    else:
+        os.symlink(os.path.abspath(source), destination)
+    return True
+
+
+def materialize(assignment, mode="move", out=DEFAULT_OUT, names=None, workers=16):
+    """Puts the files where `assignment` says; returns how many files changed."""
+    splits = sorted(set(assignment.values()))
+    if mode == "list":
+        os.makedirs(out, exist_ok=True)
+        for split in splits:
+            with open(os.path.join(out, f"{split}.txt"), "w") as f:
+                f.writelines(f"{os.path.abspath(image)}\n" for image, s in sorted(assignment.items()) if s == split)
+        _write_data_yaml(out, {split: f"{split}.txt" for split in splits}, names)
+        return len(assignment)
+
+    pairs = _operations(assignment, mode, out)
+    for directory in {destination.parent for _, destination in pairs}:
+        directory.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        changed = sum(pool.map(lambda pair: _place(*pair, mode), pairs))
+
+    if mode != "move":
+        # Drop links left over from an earlier split
+        wanted = {str(destination) for _, destination in pairs}
+        for kind in ("images", "labels"):
+            for directory in (d for d in Path(out, kind).glob("*") if d.is_dir()):
+                for path in directory.iterdir():
+                    if str(path) not in wanted:
+                        path.unlink()
+                        changed += 1
+        _write_data_yaml(out, {split: f"images/{split}" for split in splits}, names)
+    return changed
+
+
+def _write_data_yaml(out, entries, names):
+    data = {"path": os.path.abspath(out), **entries, "nc": len(names or []), "names": list(names or [])}
+    with open(os.path.join(out, "data.yaml"), "w") as f:
+        yaml.safe_dump(data, f, sort_keys=False)
+
+
+def split(ratios=DEFAULT_RATIOS, seed=0, mode="move", pool=None, out=DEFAULT_OUT,
+          dataset_dir=dataset_manifest.DATASET_DIR, workers=16, dry_run=False):
+    """Plans and materializes a split; returns (assignment, the manifest after it)."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; choose one of {', '.join(MODES)}")
+    manifest = dataset_manifest.build(dataset_dir)
+    assignment = plan(manifest, ratios, seed, pool)
+    if dry_run:
+        return assignment, manifest
+    changed = materialize(assignment, mode, out, manifest.names, workers)
+    print(f"🔀 {len(assignment)} images split ({mode}), {changed} files changed")
+    if mode == "move":
+        manifest = dataset_manifest.build(dataset_dir)
+    return assignment, manifest
+
+
+def report(assignment, manifest):
+    """Images and instances per split and class, as planned."""
+    row = {path: i for i, path in enumerate(manifest.image.tolist())}
+    matrix = manifest.image_class_matrix()
+    summary = {}
+    for split in sorted(set(assignment.values())):
+        rows = [row[path] for path, s in assignment.items() if s == split and path in row]
+        summary[split] = (len(rows), dict(zip(manifest.names, matrix[rows].sum(axis=0).tolist())))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratios", default="0.7,0.2,0.1", help="train,val,test fractions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=MODES, default="move")
+    parser.add_argument("--pool", default=",".join(dataset_manifest.SPLITS),
+                        help="Splits whose images are re-split (others are left alone)")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Output directory for hardlink/symlink/list")
+    parser.add_argument("--dataset", default=dataset_manifest.DATASET_DIR)
+    parser.add_argument("--workers", type=int, default=16, help="Threads for file operations")
+    parser.add_argument("--dry-run", action="store_true", help="Print the planned split only")
+    args = parser.parse_args()
+
+    ratios = dict(zip(dataset_manifest.SPLITS, (float(r) for r in args.ratios.split(","))))
+    assignment, manifest = split(ratios, args.seed, args.mode, args.pool.split(","), args.out,
+                                 args.dataset, args.workers, args.dry_run)
+    if args.mode == "move" and not args.dry_run:
+        for name in ratios:
+            print(f"📁 {name}: {int(manifest.image_mask(name).sum())} images, {manifest.instance_counts(name)}")
+    else:
+        for name, (images, instances) in report(assignment, manifest).items():
+            print(f"📁 {name}: {images} images, {instances}")
+    print("✅ Dataset split complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
-import glob
+import dataset_manifest
 
-classes = ["Angsana", "Coconut Palm", "Rain Tree", "Royal Palm"]
+# Checks the label files (dataset_detection/labels/<split>/*.txt) of every split,
+# using the manifest instead of re-reading each file
+manifest = dataset_manifest.build()
 
-for file in glob.glob("dataset_detection/images/train/*.txt"):
-    with open(file, "r") as f:
-        for i, line in enumerate(f, start=1):
-            parts = line.strip().split()
-            if not parts:
-                continue
-            cls_id = int(parts[0])
-            if cls_id >= len(classes):
-                print(f"❌ Invalid class index {cls_id} in {file}, line {i}")
+problems = manifest.problems()
+for path, line, reason in problems:
+    print(f"❌ {reason} in {path}, line {line}")
+
+if not problems:
+    print(f"✅ All {len(manifest.box_cls)} labels in {len(manifest)} images are valid")
@@ -3,6 +3,9 @@ ASGI config for treeid project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI (e.g. `uvicorn treeid.asgi:application`) lets the async
+scan/save endpoints under /async/ handle many concurrent scans per process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -20,6 +20,99 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# --- Street View imagery ---
+# Point STREETVIEW_API_URL at `manage.py fake_streetview` to work offline.
+STREETVIEW_API_URL = os.getenv("STREETVIEW_API_URL", "https://maps.googleapis.com/maps/api/streetview")
+STREETVIEW_CACHE_ENABLED = os.getenv("STREETVIEW_CACHE_ENABLED", "1") == "1"
+STREETVIEW_CACHE_DIR = os.getenv("STREETVIEW_CACHE_DIR", str(BASE_DIR / "cache" / "streetview"))
+STREETVIEW_CACHE_MAX_MB = int(os.getenv("STREETVIEW_CACHE_MAX_MB", "512"))
+STREETVIEW_CACHE_TTL = int(os.getenv("STREETVIEW_CACHE_TTL", str(24 * 3600)))  # seconds
+STREETVIEW_CACHE_COORD_DECIMALS = int(os.getenv("STREETVIEW_CACHE_COORD_DECIMALS", "5"))  # ~1 m
+STREETVIEW_CONNECT_TIMEOUT = float(os.getenv("STREETVIEW_CONNECT_TIMEOUT", "3.05"))  # seconds
+STREETVIEW_READ_TIMEOUT = float(os.getenv("STREETVIEW_READ_TIMEOUT", "10"))
+STREETVIEW_RETRIES = int(os.getenv("STREETVIEW_RETRIES", "3"))
+STREETVIEW_BACKOFF = float(os.getenv("STREETVIEW_BACKOFF", "0.5"))  # base delay, doubled per retry (jittered)
+STREETVIEW_MAX_RETRY_AFTER = float(os.getenv("STREETVIEW_MAX_RETRY_AFTER", "30"))  # cap on a server's Retry-After
+STREETVIEW_RATE_LIMIT = float(os.getenv("STREETVIEW_RATE_LIMIT", "50"))  # requests/second per API key
+STREETVIEW_POOL_SIZE = int(os.getenv("STREETVIEW_POOL_SIZE", "16"))  # keep-alive connections
+STREETVIEW_FETCH_WORKERS = int(os.getenv("STREETVIEW_FETCH_WORKERS", "8"))  # concurrent multi-pose fetches
+
+# --- Detector model ---
+# Weights are loaded lazily on the first scan (see detector/model_registry.py).
+# Set DETECTOR_PRELOAD=1 for web workers to load + warm up at startup instead.
+DETECTOR_WEIGHTS = os.getenv(
+    "DETECTOR_WEIGHTS",
+    str(BASE_DIR / "runs" / "train_streetview" / "yolov10x_640_streetview_v3" / "weights" / "best.pt"),
+)
+DETECTOR_PRELOAD = os.getenv("DETECTOR_PRELOAD", "0") == "1"
+DETECTOR_WARMUP_RUNS = int(os.getenv("DETECTOR_WARMUP_RUNS", "1"))  # 0 disables warm-up
+DETECTOR_WARMUP_IMGSZ = int(os.getenv("DETECTOR_WARMUP_IMGSZ", "640"))
+# Runtime for the weights: pytorch (best.pt as-is), onnx, openvino or torchscript.
+# Exports live next to best.pt; create them with `manage.py export_detector`.
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "pytorch")
+DETECTOR_INT8 = os.getenv("DETECTOR_INT8", "0") == "1"  # use the INT8-quantized export (onnx/openvino)
+
+# Inference profiles: accuracy/latency tiers a scan can ask for with "profile"
+# (see detector/profiles.py). "fast" is the YOLOv10m model trained with
+# configs/train_with_aug_10m.yaml, without test-time augmentation.
+DETECTOR_PROFILES = {
+    "fast": {
+        "weights": os.getenv(
+            "DETECTOR_FAST_WEIGHTS",
+            str(BASE_DIR / "runs" / "train_streetview" / "yolov10m_640_balanced" / "weights" / "best.pt"),
+        ),
+        "imgsz": 640,
+        "conf": 0.25,
+        "augment": False,
+    },
+    "accurate": {
+        "weights": DETECTOR_WEIGHTS,
+        "imgsz": 640,
+        "conf": 0.25,
+        "augment": True,
+    },
+}
+DETECTOR_DEFAULT_PROFILE = os.getenv("DETECTOR_DEFAULT_PROFILE", "accurate")
+# When the batching queue wait goes over the SLO, scans are served with the
+# fallback profile instead (0 disables degrading)
+DETECTOR_SLO_MS = float(os.getenv("DETECTOR_SLO_MS", "1000"))
+DETECTOR_FALLBACK_PROFILE = os.getenv("DETECTOR_FALLBACK_PROFILE", "fast")
+
+# Micro-batching of concurrent scans (see detector/batching.py)
+DETECTOR_BATCHING = os.getenv("DETECTOR_BATCHING", "1") == "1"
+DETECTOR_BATCH_MAX_SIZE = int(os.getenv("DETECTOR_BATCH_MAX_SIZE", "8"))
+DETECTOR_BATCH_MAX_WAIT_MS = float(os.getenv("DETECTOR_BATCH_MAX_WAIT_MS", "25"))
+DETECTOR_QUEUE_DEPTH = int(os.getenv("DETECTOR_QUEUE_DEPTH", "64"))  # beyond this scans get HTTP 429
+DETECTOR_PREDICT_TIMEOUT = float(os.getenv("DETECTOR_PREDICT_TIMEOUT", "120"))
+# Threads for CPU-bound scan steps in the async views (detector/async_views.py)
+DETECTOR_INFERENCE_WORKERS = int(os.getenv("DETECTOR_INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+
+# Sliced inference ("slicing": true on the scan API, see detector/slicing.py)
+SLICING_TILE = int(os.getenv("SLICING_TILE", "320"))  # px; each tile is run at the profile's imgsz
+SLICING_OVERLAP = float(os.getenv("SLICING_OVERLAP", "0.25"))
+SLICING_IOU = float(os.getenv("SLICING_IOU", "0.5"))  # overlap at which boxes across tiles merge
+SLICING_MERGE = os.getenv("SLICING_MERGE", "nms")  # nms or wbf
+
+# Re-scans of an identical frame reuse stored detections (see detector/result_cache.py)
+DETECTION_CACHE_ENABLED = os.getenv("DETECTION_CACHE_ENABLED", "1") == "1"
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "256"))  # entries
+
+# Panorama scans (mode="panorama" on the scan API)
+PANORAMA_HEADING_STEP = float(os.getenv("PANORAMA_HEADING_STEP", "60"))  # degrees between views
+PANORAMA_MERGE_IOU = float(os.getenv("PANORAMA_MERGE_IOU", "0.3"))  # bearing overlap to merge seam boxes
+
+# --- Near-duplicate frames in dataset_collection/ (see detector/dedup.py) ---
+DEDUP_ACTION = os.getenv("DEDUP_ACTION", "flag")  # "flag" (save and report), "reject" (409) or "off"
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "6"))  # bits out of 64 on both pHash and dHash
+
+# --- Tree de-duplication (see detector/spatial.py) ---
+TREE_MERGE_RADIUS_M = float(os.getenv("TREE_MERGE_RADIUS_M", "8"))
+TREE_GRID_CELL_M = float(os.getenv("TREE_GRID_CELL_M", "50"))
+STREETVIEW_CAMERA_HEIGHT_M = 2.5
+TREE_DEFAULT_DISTANCE_M = 15.0  # used when a box's base is at/above the horizon
+TREE_MIN_DISTANCE_M = 2.0
+TREE_MAX_DISTANCE_M = 60.0
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -47,6 +140,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'detector.middleware.RequestIDMiddleware',  # first, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,3 +226,33 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+
+# Logging
+# The detector logs one JSON object per line, tagged with the request ID
+# (see detector/middleware.py); per-stage metrics are served on /metrics.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'detector.middleware.RequestIDFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'detector.middleware.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'detector': {
+            'handlers': ['console'],
+            'level': os.getenv('DETECTOR_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}